@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the services of the visual container, used by the benchmarks.
+
+  - FakeGrafana: /api/health, /api/search, /api/dashboards/uid/<uid>,
+    /api/datasources (GET/POST) and /api/dashboards/db (POST)
+  - FakeInfluxDB: /health and /api/v2/write (gzip or plain line protocol)
+  - Mosquitto: started from the 'mosquitto' binary if it is installed
+
+The HTTP stand-ins run in a separate process so that they do not compete with
+the code under test for the GIL. GET /stats returns their request counters.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import multiprocessing
+import subprocess
+import shutil
+import socket
+import gzip
+import json
+import time
+
+
+def make_dashboard(index, panels):
+    """Synthetic dashboard in the format returned by GET /api/dashboards/uid/<uid>."""
+    uid = f"bench{index:06d}"
+    return {
+        "meta": {"version": 1, "updated": "2025-01-01T00:00:00Z"},
+        "dashboard": {
+            "uid": uid,
+            "title": f"Benchmark dashboard {index}",
+            "version": 1,
+            "panels": [{
+                "id": p,
+                "type": "timeseries",
+                "title": f"Panel {p}",
+                "datasource": {"type": "influxdb", "uid": "bench-influx"},
+                "targets": [{
+                    "refId": "A",
+                    "datasource": {"type": "influxdb", "uid": "bench-influx"},
+                    "query": f'from(bucket: "default") |> range(start: v.timeRangeStart) '
+                             f'|> filter(fn: (r) => r._measurement == "m{p}") '
+                             f'|> aggregateWindow(every: v.windowPeriod, fn: mean)',
+                }],
+                "gridPos": {"x": 0, "y": p * 8, "w": 24, "h": 8},
+            } for p in range(panels)],
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid delayed-ACK stalls on keep-alive connections.
+    disable_nagle_algorithm = True
+    state = None
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, code=200, content_type="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, obj, code=200):
+        self.send_body(json.dumps(obj).encode(), code)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def count(self, key, n=1):
+        self.state[key] = self.state.get(key, 0) + n
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeGrafana(_Handler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            return self.send_json({k: v for k, v in self.state.items() if not k.startswith("_")})
+        if path == "/api/health":
+            return self.send_json({"database": "ok"})
+        self.delay()
+        self.count("get")
+        if path == "/api/search":
+            return self.send_body(self.state["_search"])
+        if path.startswith("/api/dashboards/uid/"):
+            body = self.state["_dashboards"].get(path.rsplit("/", 1)[1])
+            return self.send_body(body) if body else self.send_json({"message": "not found"}, 404)
+        if path == "/api/datasources":
+            return self.send_json(self.state["_datasources"])
+        self.send_json({"message": "not found"}, 404)
+
+    def do_POST(self):
+        body = self.read_body()
+        self.delay()
+        self.count("post")
+        self.count("bytes_received", len(body))
+        if self.path == "/api/datasources":
+            ds = json.loads(body)
+            ds["id"] = len(self.state["_datasources"]) + 1
+            self.state["_datasources"].append(ds)
+            return self.send_json({"id": ds["id"], "datasource": ds, "message": "Datasource added"})
+        if self.path == "/api/dashboards/db":
+            return self.send_json({"status": "success", "uid": f"r{self.state['post']}"})
+        self.send_json({"message": "not found"}, 404)
+
+
+class FakeInfluxDB(_Handler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            return self.send_json(self.state)
+        if path == "/health":
+            return self.send_json({"status": "pass"})
+        self.send_json({"message": "not found"}, 404)
+
+    def do_POST(self):
+        body = self.read_body()
+        self.delay()
+        if self.path.startswith("/api/v2/write"):
+            self.count("bytes_received", len(body))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            self.count("writes")
+            self.count("points", body.count(b"\n") + 1 if body else 0)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_json({"message": "not found"}, 404)
+
+
+def _serve(handler, state, latency, port_queue):
+    handler = type(handler.__name__, (handler,), {"state": state, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+class Service:
+    """A stand-in running in its own process; use as a context manager."""
+
+    def __init__(self, handler, state=None, latency_ms=0.0):
+        self.handler = handler
+        self.state = state or {}
+        self.latency = latency_ms / 1000.0
+        self.process = None
+        self.port = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        ports = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(self.handler, self.state, self.latency, ports),
+                                               daemon=True)
+        self.process.start()
+        self.port = ports.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+        return False
+
+    def stats(self):
+        import requests
+        return requests.get(f"{self.url}/stats").json()
+
+
+def fake_grafana(dashboards=0, panels=10, latency_ms=0.0):
+    """Fake Grafana holding `dashboards` synthetic dashboards (pre-serialized)."""
+    docs = {f"bench{i:06d}": json.dumps(make_dashboard(i, panels)).encode() for i in range(dashboards)}
+    search = json.dumps([{"uid": uid, "title": uid, "type": "dash-db", "version": 1} for uid in docs]).encode()
+    datasources = [{"id": 1, "uid": "bench-influx", "name": "influxdb", "type": "influxdb"}]
+    return Service(FakeGrafana, {"_dashboards": docs, "_search": search, "_datasources": datasources}, latency_ms)
+
+
+def fake_influxdb(latency_ms=0.0):
+    return Service(FakeInfluxDB, {}, latency_ms)
+
+
+class Mosquitto:
+    """Local Mosquitto broker on a free port (None from start() if the binary is not installed)."""
+
+    def __init__(self):
+        self.process = None
+        self.port = None
+
+    @staticmethod
+    def available():
+        return shutil.which("mosquitto") is not None
+
+    def __enter__(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.process = subprocess.Popen(["mosquitto", "-p", str(self.port)],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("mosquitto did not start")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+        return False
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the observability scripts against local stand-ins.
+
+Measures, at synthetic scales:
+  - backup:      grafana_backup.fetch_dashboards (serial and concurrent)
+  - restore:     grafana_restore.restore_dashboards
+  - datasources: grafana_influxdb_datasource.create_influxdb_datasource
+  - ingest:      mqtt_influx_bridge.Bridge at offered loads (points/s), directly
+                 and, if mosquitto and paho-mqtt are installed, through a local broker
+
+Results are written as JSON (one file per run) so they can be compared run to run:
+    python3 run_benchmarks.py --dashboards 10,100,1000 --rates 1000,10000,100000,1000000
+"""
+import argparse
+import platform
+import json
+import sys
+import os
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# The scripts chdir to sys.path[0] and read config_data.json from there.
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "python_config"))
+
+import grafana_backup
+import grafana_restore
+import grafana_influxdb_datasource
+import mqtt_influx_bridge
+from http_session import make_session
+from fake_services import fake_grafana, fake_influxdb, Mosquitto
+
+AUTH = ("admin", "admin")
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_backup(count, panels, concurrency, latency_ms, workdir):
+    results = []
+    with fake_grafana(count, panels, latency_ms) as grafana:
+        for workers in sorted({1, concurrency}):
+            output = os.path.join(workdir, f"bench-dashboards-{count}.jsonl")
+            session = make_session(AUTH, pool_size=workers)
+            elapsed = timed(grafana_backup.fetch_dashboards, grafana.url, AUTH, output,
+                            session=session, concurrency=workers)
+            results.append({"benchmark": "backup", "dashboards": count, "panels": panels, "concurrency": workers,
+                            "latency_ms": latency_ms, "seconds": elapsed, "dashboards_per_s": count / elapsed,
+                            "file_bytes": os.path.getsize(output)})
+    return results
+
+
+def bench_restore(count, concurrency, latency_ms, workdir):
+    backup = os.path.join(workdir, f"bench-dashboards-{count}.jsonl")
+    with fake_grafana(0, 0, latency_ms) as grafana:
+        session = make_session(AUTH, pool_size=concurrency)
+        resolver = grafana_restore.DatasourceResolver({"influxdb"}, {"bench-influx": "influxdb"}, {}, "")
+        elapsed = timed(grafana_restore.restore_dashboards, grafana.url, AUTH, resolver, backup,
+                        session=session, concurrency=concurrency, rate_limit=0, journal_file=None)
+        posted = grafana.stats().get("post", 0)
+    return [{"benchmark": "restore", "dashboards": count, "concurrency": concurrency, "latency_ms": latency_ms,
+             "seconds": elapsed, "dashboards_per_s": posted / elapsed, "posted": posted}]
+
+
+def bench_datasources(count, latency_ms):
+    with fake_grafana(0, 0, latency_ms) as grafana:
+        grafana_influxdb_datasource.GRAFANA_URL = grafana.url
+        session = make_session()
+        start = time.perf_counter()
+        latencies = []
+        for i in range(count):
+            t = time.perf_counter()
+            grafana_influxdb_datasource.create_influxdb_datasource(session, name=f"bench-{i}")
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return [{"benchmark": "datasources", "count": count, "latency_ms": latency_ms, "seconds": elapsed,
+             "per_s": count / elapsed, "p50_ms": latencies[len(latencies) // 2] * 1000,
+             "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if count >= 100 else latencies[-1] * 1000}]
+
+
+def sample_payloads(n=1000):
+    return [json.dumps({"rtt_ms": 1.5 + i * 0.001, "seq": i, "ok": True}).encode() for i in range(n)]
+
+
+def offer_load(submit, rate, duration):
+    """Call submit(i) at `rate` per second for `duration` seconds (paced in 10 ms slices); returns count."""
+    sent, start = 0, time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return sent
+        target = int(min(elapsed + 0.01, duration) * rate)
+        while sent < target:
+            submit(sent)
+            sent += 1
+        sleep = start + (sent / rate) - time.perf_counter()
+        if sleep > 0:
+            time.sleep(sleep)
+
+
+def bench_ingest(rate, duration, workdir):
+    payloads = sample_payloads()
+    with fake_influxdb() as influx:
+        spool = mqtt_influx_bridge.Spool(os.path.join(workdir, "bench-spool"), 16, 64 * 1024 * 1024)
+        bridge = mqtt_influx_bridge.Bridge(influx_url=influx.url, spool=spool).start()
+        start = time.perf_counter()
+        sent = offer_load(lambda i: bridge.submit("bench/ue1", payloads[i % len(payloads)]), rate, duration)
+        offered_s = time.perf_counter() - start
+        bridge.stop()
+        elapsed = time.perf_counter() - start
+        stats = influx.stats()
+    return [{"benchmark": "ingest", "path": "direct", "offered_points_per_s": rate, "sent": sent,
+             "offered_seconds": offered_s, "drain_seconds": elapsed - offered_s,
+             "achieved_points_per_s": stats.get("points", 0) / elapsed, "points_written": stats.get("points", 0),
+             "bytes_written": stats.get("bytes_received", 0), "last_batch_lag_ms": bridge.stats["lag_ms"]}]
+
+
+def bench_ingest_mqtt(rate, duration, workdir):
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        return [{"benchmark": "ingest", "path": "mqtt", "offered_points_per_s": rate, "skipped": "paho-mqtt not installed"}]
+    if not Mosquitto.available():
+        return [{"benchmark": "ingest", "path": "mqtt", "offered_points_per_s": rate, "skipped": "mosquitto not installed"}]
+
+    def client(name):
+        try:
+            return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=name)
+        except AttributeError:
+            return mqtt.Client(client_id=name)
+
+    payloads = sample_payloads()
+    with Mosquitto() as broker, fake_influxdb() as influx:
+        spool = mqtt_influx_bridge.Spool(os.path.join(workdir, "bench-spool"), 16, 64 * 1024 * 1024)
+        bridge = mqtt_influx_bridge.Bridge(influx_url=influx.url, spool=spool).start()
+        subscriber = client("bench-bridge")
+        subscriber.on_message = lambda c, u, msg: bridge.submit(msg.topic, msg.payload)
+        subscriber.connect("127.0.0.1", broker.port)
+        subscriber.subscribe("bench/#")
+        subscriber.loop_start()
+        publisher = client("bench-publisher")
+        publisher.connect("127.0.0.1", broker.port)
+        publisher.loop_start()
+        time.sleep(0.5)
+        start = time.perf_counter()
+        sent = offer_load(lambda i: publisher.publish("bench/ue1", payloads[i % len(payloads)]), rate, duration)
+        offered_s = time.perf_counter() - start
+        # Wait for the broker to deliver what it accepted.
+        deadline = time.monotonic() + 10
+        while bridge.stats["received"] < sent and time.monotonic() < deadline:
+            time.sleep(0.05)
+        publisher.loop_stop()
+        subscriber.loop_stop()
+        bridge.stop()
+        elapsed = time.perf_counter() - start
+        stats = influx.stats()
+    return [{"benchmark": "ingest", "path": "mqtt", "offered_points_per_s": rate, "sent": sent,
+             "offered_seconds": offered_s, "received": bridge.stats["received"],
+             "achieved_points_per_s": stats.get("points", 0) / elapsed, "points_written": stats.get("points", 0),
+             "last_batch_lag_ms": bridge.stats["lag_ms"]}]
+
+
+def parse_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dashboards", default="10,100,1000", help="dashboard counts (comma separated)")
+    parser.add_argument("--panels", type=int, default=10, help="panels per synthetic dashboard")
+    parser.add_argument("--concurrency", type=int, default=8, help="worker count for backup/restore")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="added server latency per Grafana request")
+    parser.add_argument("--datasources", type=int, default=100, help="datasources to create")
+    parser.add_argument("--rates", default="1000,10000,100000,1000000", help="offered ingest loads in points/s")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per ingest load")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results"), help="results directory")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    workdir = os.path.join(args.output, "work")
+    os.makedirs(workdir, exist_ok=True)
+
+    results = []
+    for count in parse_list(args.dashboards):
+        print(f"\n### backup/restore with {count} dashboards")
+        results += bench_backup(count, args.panels, args.concurrency, args.latency_ms, workdir)
+        results += bench_restore(count, args.concurrency, args.latency_ms, workdir)
+    print(f"\n### creating {args.datasources} datasources")
+    results += bench_datasources(args.datasources, args.latency_ms)
+    for rate in parse_list(args.rates):
+        print(f"\n### ingest at {rate} points/s")
+        results += bench_ingest(rate, args.duration, workdir)
+        results += bench_ingest_mqtt(rate, args.duration, workdir)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    path = os.path.join(args.output, time.strftime("benchmark-%Y%m%d-%H%M%S.json"))
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to '{path}':")
+    for r in results:
+        print("  " + ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
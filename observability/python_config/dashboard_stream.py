@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Streaming read/write of Grafana dashboard backups.
+
+Supported layouts, selected by the file name:
+  - 'dashboards.json'             legacy format, one JSON list of dashboards
+  - 'dashboards.jsonl'            JSON Lines, one dashboard per line
+  - 'dashboards.jsonl.gz'/'.zst'  compressed JSON Lines ('.zst' needs the 'zstandard' package)
+  - a directory                   incremental backup ('<uid>.json' files and 'manifest.json')
+
+Writing is done one dashboard at a time for every file format. Reading is
+one dashboard at a time for JSON Lines and directories; the legacy format
+has to be parsed as a whole.
+
+Run as a script to convert an existing backup, e.g.:
+    python3 dashboard_stream.py dashboards.json dashboards.jsonl.gz
+"""
+import gzip
+import io
+import json
+import os
+import sys
+
+
+def compression_of(path):
+    """Return the compression extension ('.gz', '.zst') of a backup path, or ''."""
+    for ext in (".gz", ".zst"):
+        if path.endswith(ext):
+            return ext
+    return ""
+
+
+def open_backup(path, mode, compression=None):
+    """
+    Open a backup file in text mode ('r' or 'w'). The compression is taken
+    from the file extension unless given explicitly.
+    """
+    if compression is None:
+        compression = compression_of(path)
+    if compression == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            print("Error: the 'zstandard' package is required for '.zst' backups (pip install zstandard).")
+            sys.exit(1)
+        if mode == "r":
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def is_jsonl(path):
+    """True if the path names a JSON Lines backup (optionally compressed)."""
+    compression = compression_of(path)
+    if compression:
+        path = path[:-len(compression)]
+    return path.endswith(".jsonl")
+
+
+class DashboardWriter:
+    """
+    Write dashboards to a backup file one at a time.
+
+        with DashboardWriter("dashboards.jsonl.gz") as writer:
+            writer.write(dashboard_json)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = is_jsonl(path)
+        self.count = 0
+        self._tmp_path = path + ".tmp"
+        self._file = None
+
+    def __enter__(self):
+        # Write next to the target and move into place on success, so an
+        # interrupted backup never truncates the previous snapshot.
+        self._file = open_backup(self._tmp_path, "w", compression_of(self.path))
+        if not self.jsonl:
+            self._file.write("[")
+        return self
+
+    def write(self, dashboard_json):
+        if self.jsonl:
+            self._file.write(json.dumps(dashboard_json, separators=(",", ":")))
+            self._file.write("\n")
+        else:
+            self._file.write(",\n" if self.count else "\n")
+            self._file.write(json.dumps(dashboard_json, indent=2))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.jsonl:
+            self._file.write("\n]\n")
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+        return False
+
+
+def iter_dashboards(path):
+    """Yield the dashboards stored in a backup file or incremental backup directory."""
+    if os.path.isdir(path):
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        for uid in manifest:
+            with open(os.path.join(path, f"{uid}.json"), "r") as f:
+                yield json.load(f)
+    elif is_jsonl(path):
+        with open_backup(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open_backup(path, "r") as f:
+            dashboards = json.load(f)
+        yield from dashboards
+
+
+def convert_backup(input_path, output_path):
+    """Convert a dashboard backup between any two of the supported formats."""
+    with DashboardWriter(output_path) as writer:
+        for dashboard_json in iter_dashboards(input_path):
+            writer.write(dashboard_json)
+    print(f"✔ Converted {writer.count} dashboards from '{input_path}' to '{output_path}'.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} <input backup> <output backup>")
+        sys.exit(1)
+    convert_backup(sys.argv[1], sys.argv[2])
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Performance linter and rewriter for the Flux queries of Grafana dashboards.
+
+Checks every Flux target of every panel for the patterns that overload the
+InfluxDB of the visual container:
+
+  no-range      from() without range(); the whole retention period is read
+  fixed-range   range() with a literal start instead of v.timeRangeStart
+  no-window     raw points returned, without aggregateWindow(every: v.windowPeriod)
+  fixed-window  aggregateWindow() with a literal period instead of v.windowPeriod
+  ungrouped     group() of all raw rows into one table before any aggregation
+  refresh       dashboard refresh interval below the minimum
+
+and estimates the cost of each panel: the raw points scanned and the points
+returned per series on every refresh, and the points scanned per hour at the
+dashboard's refresh rate. The estimate assumes `raw_rate` points per second
+per series.
+
+With rewrite=True the queries are made bounded and windowed:
+  - a missing range() becomes range(start: v.timeRangeStart, stop: v.timeRangeStop);
+    a literal relative range (e.g. -7d) is replaced the same way and moved to the
+    panel's relative time ("timeFrom"), so the panel still shows the same period
+  - time series panels without aggregation get aggregateWindow(every:
+    v.windowPeriod, fn: mean, createEmpty: false) right after their
+    range()/filter() calls, i.e. also before an ungrouping group()
+  - a literal aggregateWindow() period becomes v.windowPeriod and is kept as
+    the panel's minimum interval, so the resolution never gets finer than before
+  - the dashboard refresh (and the refresh choices of the time picker) are
+    raised to the minimum refresh interval
+Anything else (absolute ranges, group() after a custom aggregation) is only
+reported.
+
+Run as a script on a dashboard backup, e.g.:
+    python3 flux_lint.py dashboards.json
+    python3 flux_lint.py dashboards.json --rewrite dashboards-fixed.jsonl.gz
+"""
+from dashboard_stream import DashboardWriter, iter_dashboards
+import argparse
+import re
+
+# Panel types whose queries can be windowed without changing what they show.
+TIMESERIES_PANELS = {"timeseries", "graph"}
+# Calls that already reduce the raw points of a series.
+AGGREGATES = {"aggregateWindow", "window", "mean", "median", "min", "max", "sum", "count", "first", "last",
+              "quantile", "reduce", "histogram", "distinct", "unique", "top", "bottom", "sample", "limit", "tail",
+              "spread", "stddev", "integral", "derivative", "difference", "movingAverage", "timedMovingAverage",
+              "increase", "elapsed", "cumulativeSum", "holtWinters"}
+# Calls that may stay in front of an inserted aggregateWindow().
+PREFILTERS = {"range", "filter", "keep", "drop"}
+
+DEFAULT_RANGE = "6h"
+DEFAULT_MAX_POINTS = 1000
+WINDOW = "\n  |> aggregateWindow(every: v.windowPeriod, fn: mean, createEmpty: false)"
+BOUNDED_RANGE = "range(start: v.timeRangeStart, stop: v.timeRangeStop)"
+
+UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600, "d": 86400,
+         "w": 604800, "mo": 2592000, "M": 2592000, "y": 31536000}
+DURATION = re.compile(r"(\d+(?:\.\d+)?)(ns|us|µs|ms|mo|s|m|h|d|w|M|y)")
+
+
+def parse_duration(text):
+    """Seconds of a Flux or Grafana duration ("30s", "1h30m", "7d"), or None."""
+    text = (text or "").strip()
+    if not text or DURATION.sub("", text):
+        return None
+    return sum(float(n) * UNITS[unit] for n, unit in DURATION.findall(text))
+
+
+def grafana_range(time_from):
+    """Seconds of a relative Grafana time range start ("now-6h", "now-7d/d"), or None."""
+    match = re.fullmatch(r"now-([^/]+)(/\w)?", (time_from or "").strip())
+    return parse_duration(match.group(1)) if match else None
+
+
+def _call_end(text, start):
+    """Index just after the parenthesis that closes the one at text[start]."""
+    depth, i, quote = 0, start, None
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '"':
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(text)
+
+
+def pipeline_calls(segment):
+    """(name, start, end, arguments) of every `|> name(...)` call of a pipeline, in order."""
+    calls = []
+    for match in re.finditer(r"\|>\s*([A-Za-z_][\w.]*)\s*\(", segment):
+        if calls and match.start() < calls[-1][2]:
+            continue                         # inside the arguments of the previous call
+        end = _call_end(segment, match.end() - 1)
+        calls.append((match.group(1).split(".")[-1], match.start(), end, segment[match.end():end - 1]))
+    return calls
+
+
+def _argument(arguments, name):
+    match = re.search(rf"\b{name}\s*:\s*([^,)]+)", arguments)
+    return match.group(1).strip() if match else None
+
+
+def lint_pipeline(segment, panel_type):
+    """
+    Findings of one from() pipeline, as (code, detail) pairs, plus a dict with
+    the literal range and window it uses.
+    """
+    calls = pipeline_calls(segment)
+    names = [name for name, *_ in calls]
+    ranges = [args for name, _, _, args in calls if name == "range"]
+    findings = []
+    info = {"bounded": bool(ranges), "range": None, "window": None, "windowed": False, "aggregated": False}
+    if not ranges:
+        findings.append(("no-range", ""))
+    elif "v.timeRangeStart" not in ranges[0]:
+        start = _argument(ranges[0], "start") or ""
+        findings.append(("fixed-range", start))
+        if start.startswith("-"):
+            info["range"] = start[1:]
+
+    first_aggregate = next((i for i, name in enumerate(names) if name in AGGREGATES), None)
+    info["aggregated"] = first_aggregate is not None
+    for name, _, _, args in calls:
+        if name == "aggregateWindow":
+            every = _argument(args, "every") or ""
+            info["windowed"] = True
+            if every != "v.windowPeriod":
+                findings.append(("fixed-window", every))
+                info["window"] = every
+    if first_aggregate is None and panel_type in TIMESERIES_PANELS:
+        findings.append(("no-window", ""))
+    for i, (name, _, _, args) in enumerate(calls):
+        if name == "group" and not args.strip() and (first_aggregate is None or i < first_aggregate):
+            findings.append(("ungrouped", ""))
+    return findings, info
+
+
+def rewrite_pipeline(segment, panel, findings, info):
+    """Rewrite one from() pipeline for its findings. Returns the new text."""
+    codes = {code for code, _ in findings}
+    if "fixed-range" in codes and info["range"] and parse_duration(info["range"]):
+        calls = pipeline_calls(segment)
+        _, start, end, _ = next(c for c in calls if c[0] == "range")
+        segment = segment[:start] + "|> " + BOUNDED_RANGE + segment[end:]
+        panel.setdefault("timeFrom", info["range"])
+    elif "no-range" in codes:
+        match = re.match(r"from\s*\(", segment)
+        end = _call_end(segment, match.end() - 1)
+        segment = segment[:end] + "\n  |> " + BOUNDED_RANGE + segment[end:]
+    if "fixed-window" in codes and parse_duration(info["window"]):
+        segment = re.sub(r"(aggregateWindow\s*\([^)]*?\bevery\s*:\s*)[^,)]+", r"\1v.windowPeriod", segment)
+        panel.setdefault("interval", info["window"])
+    if "no-window" in codes:
+        end = re.match(r"from\s*\(", segment).end() - 1
+        end = _call_end(segment, end)
+        for name, _, call_end, _ in pipeline_calls(segment):
+            if name not in PREFILTERS:
+                break
+            end = call_end
+        segment = segment[:end] + WINDOW + segment[end:]
+    return segment
+
+
+def lint_query(query, panel, rewrite=False):
+    """Findings of a Flux query, its range/window info, and the (rewritten) query."""
+    # Every from() starts a pipeline that runs up to the next from().
+    starts = [m.start() for m in re.finditer(r"\bfrom\s*\(\s*bucket\b", query)]
+    if not starts:
+        return [], [], query
+    parts, findings, infos = [query[:starts[0]]], [], []
+    for start, end in zip(starts, starts[1:] + [len(query)]):
+        segment = query[start:end]
+        found, info = lint_pipeline(segment, panel.get("type"))
+        findings += found
+        infos.append(info)
+        parts.append(rewrite_pipeline(segment, panel, found, info) if rewrite and found else segment)
+    return findings, infos, "".join(parts)
+
+
+def estimate_cost(infos, panel, dashboard_range, unbounded, raw_rate):
+    """(points scanned, points returned) per series for one refresh of one query."""
+    scanned = returned = 0
+    panel_range = parse_duration(panel.get("timeFrom")) or dashboard_range
+    for info in infos:
+        period = parse_duration(info["range"]) or panel_range if info["bounded"] else unbounded
+        rows = period * raw_rate
+        if info["windowed"] and not info["window"]:
+            out = min(rows, panel.get("maxDataPoints") or DEFAULT_MAX_POINTS)
+        elif info["window"]:
+            out = min(rows, period / (parse_duration(info["window"]) or period))
+        elif info["aggregated"]:
+            out = 1
+        else:
+            out = rows
+        scanned += rows
+        returned += out
+    return scanned, returned
+
+
+def iter_panels(dashboard):
+    """All panels of a dashboard, including the ones nested in rows."""
+    panels = list(dashboard.get("panels") or [])
+    for row in dashboard.get("rows") or []:
+        if isinstance(row, dict):
+            panels.extend(row.get("panels") or [])
+    while panels:
+        panel = panels.pop(0)
+        if isinstance(panel, dict):
+            yield panel
+            panels.extend(panel.get("panels") or [])
+
+
+def lint_dashboard(dashboard, rewrite=False, min_refresh="10s", raw_rate=10.0, unbounded="14d"):
+    """
+    Lint (and with rewrite=True fix, in place) the Flux queries and the refresh
+    interval of one dashboard. Returns one record per panel with findings:
+    {"panel", "findings": [(code, detail)], "scanned", "returned", "per_hour"}.
+    """
+    dashboard_range = grafana_range((dashboard.get("time") or {}).get("from")) or parse_duration(DEFAULT_RANGE)
+    refresh = parse_duration(dashboard.get("refresh") or "")
+    minimum = parse_duration(min_refresh) or 0
+    unbounded_s = parse_duration(unbounded) or dashboard_range
+    reports = []
+
+    for panel in iter_panels(dashboard):
+        findings, scanned, returned = [], 0, 0
+        for target in panel.get("targets") or []:
+            query = target.get("query") if isinstance(target, dict) else None
+            if not isinstance(query, str):
+                continue
+            found, infos, rewritten = lint_query(query, panel, rewrite)
+            s, r = estimate_cost(infos, panel, dashboard_range, unbounded_s, raw_rate)
+            findings += found
+            scanned += s
+            returned += r
+            if rewrite and rewritten != query:
+                target["query"] = rewritten
+        if findings:
+            reports.append({"panel": panel.get("title") or f"#{panel.get('id', '?')}", "findings": findings,
+                            "scanned": scanned, "returned": returned,
+                            "per_hour": scanned * (3600 / refresh if refresh else 1)})
+
+    if refresh and refresh < minimum:
+        reports.append({"panel": "(dashboard)", "findings": [("refresh", dashboard["refresh"])],
+                        "scanned": 0, "returned": 0, "per_hour": 0})
+        if rewrite:
+            dashboard["refresh"] = min_refresh
+    if rewrite:
+        picker = dashboard.get("timepicker") or {}
+        choices = picker.get("refresh_intervals")
+        if choices:
+            kept = [c for c in choices if (parse_duration(c) or minimum) >= minimum]
+            picker["refresh_intervals"] = kept or [min_refresh]
+    return reports
+
+
+def _count(n):
+    for unit, size in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+        if n >= size:
+            return f"{n / size:.1f}{unit}"
+    return f"{n:.0f}"
+
+
+def format_report(title, reports):
+    """Lines describing the findings of one dashboard, most expensive panel first."""
+    lines = []
+    for report in sorted(reports, key=lambda r: -r["per_hour"]):
+        issues = ", ".join(f"{code}({detail})" if detail else code for code, detail in report["findings"])
+        cost = (f"; scans ~{_count(report['scanned'])}, returns ~{_count(report['returned'])} points per series"
+                f" and refresh, ~{_count(report['per_hour'])} scanned/h") if report["scanned"] else ""
+        lines.append(f"  '{title}' / '{report['panel']}': {issues}{cost}")
+    return lines
+
+
+def lint_backup(input_path, output_path=None, **options):
+    """Lint every dashboard of a backup; with output_path, write the rewritten dashboards there."""
+    total = 0
+
+    def lint_all(writer=None):
+        nonlocal total
+        for dashboard_data in iter_dashboards(input_path):
+            dashboard = dashboard_data.get("dashboard") or {}
+            reports = lint_dashboard(dashboard, rewrite=writer is not None, **options)
+            total += sum(len(r["findings"]) for r in reports)
+            for line in format_report(dashboard.get("title", "Unknown Title"), reports):
+                print(line)
+            if writer is not None:
+                writer.write(dashboard_data)
+
+    if output_path:
+        with DashboardWriter(output_path) as writer:
+            lint_all(writer)
+        print(f"✔ {total} findings; rewritten dashboards written to '{output_path}'.")
+    else:
+        lint_all()
+        print(f"{total} findings.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lint the Flux queries of a Grafana dashboard backup.")
+    parser.add_argument("input", help="dashboard backup (file or incremental backup directory)")
+    parser.add_argument("--rewrite", metavar="OUTPUT", help="write the rewritten dashboards to this backup file")
+    parser.add_argument("--min-refresh", default="10s", help="minimum dashboard refresh interval")
+    parser.add_argument("--raw-rate", type=float, default=10.0, help="assumed raw points per second per series")
+    parser.add_argument("--unbounded", default="14d", help="period read by queries without range() (retention)")
+    args = parser.parse_args()
+    lint_backup(args.input, args.rewrite, min_refresh=args.min_refresh, raw_rate=args.raw_rate,
+                unbounded=args.unbounded)
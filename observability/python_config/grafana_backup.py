@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from dashboard_stream import DashboardWriter
+from http_session import make_session
+from readiness import wait_for_grafana
+import hashlib
 import json
 import sys
 import os
+import time
 
 # Ensure we run in the script's own directory:
 os.chdir(sys.path[0])
@@ -20,6 +27,22 @@ GRAFANA_URL = "http://" + config["address"] + ":3000"
 USERNAME = "admin"
 PASSWORD = config["grafana_psw"]
 
+# Number of dashboards fetched in parallel (1 = serial export).
+CONCURRENCY = max(1, int(config.get("grafana_backup_concurrency", 8)))
+# Retries (with exponential backoff) for failed or throttled requests.
+RETRIES = int(config.get("grafana_http_retries", 3))
+# Incremental mode keeps one file per dashboard UID plus a manifest in BACKUP_DIR
+# and only re-fetches dashboards whose version changed since the last run.
+INCREMENTAL = bool(config.get("grafana_backup_incremental", False))
+BACKUP_DIR = config.get("grafana_backup_dir", "dashboards")
+MANIFEST_FILE = "manifest.json"
+# Full backup file; '.jsonl', '.jsonl.gz' and '.jsonl.zst' are written as a stream.
+DASHBOARDS_FILE = config.get("grafana_dashboards_file", "dashboards.json")
+# Also write a Grafana provisioning bundle of the backup (see grafana_provision.py).
+PROVISIONING = bool(config.get("grafana_backup_provisioning", False))
+# Seconds to wait for Grafana to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
+
 def update_datasource_references(dashboard):
     """
     Recursively updates datasource references in the dashboard JSON.
@@ -49,11 +72,12 @@ def update_datasource_references(dashboard):
                     update_panel(panel)
     return dashboard
 
-def fetch_datasources(base_url, auth, output_file="datasources.json"):
+def fetch_datasources(base_url, auth, output_file="datasources.json", session=None):
     """Backup Grafana datasources."""
+    http = session or requests
     datasources_url = f"{base_url}/api/datasources"
     print("Fetching datasources...")
-    response = requests.get(datasources_url, auth=auth, verify=False)
+    response = http.get(datasources_url, auth=auth, verify=False)
     if response.status_code != 200:
         print(f"Error fetching datasources (status {response.status_code}): {response.text}")
         sys.exit(1)
@@ -65,37 +89,192 @@ def fetch_datasources(base_url, auth, output_file="datasources.json"):
         json.dump(datasources, ds_file, indent=2)
     print(f"✔ Saved {len(datasources)} datasources to '{output_file}'.")
 
-def fetch_dashboards(base_url, auth, output_file="dashboards.json"):
-    """Backup Grafana dashboards."""
+def fetch_dashboard(http, base_url, auth, uid):
+    """
+    Fetch a single dashboard by UID.
+    Returns (dashboard_json or None, number of bytes received).
+    """
+    dashboard_url = f"{base_url}/api/dashboards/uid/{uid}"
+    try:
+        resp = http.get(dashboard_url, auth=auth, verify=False)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠ Warning: Could not fetch dashboard {uid} ({e}). Skipping.")
+        return None, 0
+    if resp.status_code != 200:
+        print(f"⚠ Warning: Could not fetch dashboard {uid} (status {resp.status_code}). Skipping.")
+        return None, len(resp.content)
+    dashboard_json = resp.json()
+    # Update datasource references so that only the datasource name is used.
+    if "dashboard" in dashboard_json:
+        dashboard_json["dashboard"] = update_datasource_references(dashboard_json["dashboard"])
+    return dashboard_json, len(resp.content)
+
+def fetch_in_order(fetch, items, concurrency):
+    """
+    Yield fetch(item) for every item, in order. With concurrency > 1 the
+    calls run in a thread pool with a bounded number of results in flight,
+    so memory use does not grow with the number of items.
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield fetch(item)
+        return
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fetch, item))
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def fetch_dashboards(base_url, auth, output_file=DASHBOARDS_FILE, session=None, concurrency=1):
+    """
+    Backup Grafana dashboards.
+    With concurrency > 1 the dashboards are fetched by a bounded thread pool;
+    the output keeps the order of the search results either way. Dashboards
+    are written to the output file as they arrive.
+    """
+    http = session or requests
     search_url = f"{base_url}/api/search?query=&type=dash-db"
     print("Fetching dashboard list...")
-    response = requests.get(search_url, auth=auth, verify=False)
+    response = http.get(search_url, auth=auth, verify=False)
     if response.status_code != 200:
         print(f"Error fetching dashboard list (status {response.status_code}): {response.text}")
         sys.exit(1)
     # Extract dashboard UIDs from the search results.
     dashboard_uids = [item['uid'] for item in response.json() if 'uid' in item]
     print(f"Found {len(dashboard_uids)} dashboards.")
-    dashboards = []
-    for uid in dashboard_uids:
-        dashboard_url = f"{base_url}/api/dashboards/uid/{uid}"
-        resp = requests.get(dashboard_url, auth=auth, verify=False)
-        if resp.status_code == 200:
-            dashboard_json = resp.json()
-            # Update datasource references so that only the datasource name is used.
-            if "dashboard" in dashboard_json:
-                dashboard_json["dashboard"] = update_datasource_references(dashboard_json["dashboard"])
-            dashboards.append(dashboard_json)
-        else:
-            print(f"⚠ Warning: Could not fetch dashboard {uid} (status {resp.status_code}). Skipping.")
-    with open(output_file, "w") as db_file:
-        json.dump(dashboards, db_file, indent=2)
-    print(f"✔ Saved {len(dashboards)} dashboards to '{output_file}'.")
+
+    start = time.perf_counter()
+    fetch = lambda uid: fetch_dashboard(http, base_url, auth, uid)
+    bytes_fetched = 0
+    with DashboardWriter(output_file) as writer:
+        for dashboard_json, size in fetch_in_order(fetch, dashboard_uids, concurrency):
+            bytes_fetched += size
+            if dashboard_json is not None:
+                writer.write(dashboard_json)
+    elapsed = time.perf_counter() - start
+
+    print(f"✔ Saved {writer.count} dashboards to '{output_file}'.")
+    print_timing_summary(writer.count, bytes_fetched, elapsed, concurrency)
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and move it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_manifest(output_dir):
+    """Load the incremental backup manifest (uid -> version, updated, sha256, title)."""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def dashboard_hash(dashboard_json):
+    """Content hash of a (datasource-rewritten) dashboard model."""
+    data = json.dumps(dashboard_json.get("dashboard", dashboard_json), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def is_unchanged(item, entry, output_dir):
+    """
+    Decide from the search hit alone whether a dashboard can be skipped.
+    Grafana versions that do not report version/updated in /api/search
+    always need a fetch; the content hash then avoids rewriting the file.
+    """
+    if entry is None or not os.path.exists(os.path.join(output_dir, f"{item['uid']}.json")):
+        return False
+    if "version" in item:
+        return item["version"] == entry.get("version")
+    if "updated" in item:
+        return item["updated"] == entry.get("updated")
+    return False
+
+def fetch_dashboards_incremental(base_url, auth, output_dir=BACKUP_DIR, session=None, concurrency=1):
+    """
+    Incrementally backup Grafana dashboards into output_dir, one '<uid>.json'
+    file per dashboard. Only dashboards whose version changed are downloaded,
+    and files are only rewritten when their content hash changed.
+    """
+    http = session or requests
+    os.makedirs(output_dir, exist_ok=True)
+    old_manifest = load_manifest(output_dir)
+
+    search_url = f"{base_url}/api/search?query=&type=dash-db"
+    print("Fetching dashboard list...")
+    response = http.get(search_url, auth=auth, verify=False)
+    if response.status_code != 200:
+        print(f"Error fetching dashboard list (status {response.status_code}): {response.text}")
+        sys.exit(1)
+    items = [item for item in response.json() if 'uid' in item]
+    stale = [item for item in items if not is_unchanged(item, old_manifest.get(item['uid']), output_dir)]
+    print(f"Found {len(items)} dashboards, {len(stale)} to check for changes.")
+
+    start = time.perf_counter()
+    fetch = lambda item: fetch_dashboard(http, base_url, auth, item['uid'])
+    results = list(fetch_in_order(fetch, stale, concurrency))
+    elapsed = time.perf_counter() - start
+
+    # Start from the previous entries so that unchanged and failed dashboards are kept.
+    manifest = {}
+    fetched = {item['uid']: result for item, result in zip(stale, results)}
+    written = 0
+    for item in items:
+        uid = item['uid']
+        entry = old_manifest.get(uid)
+        dashboard_json, _ = fetched.get(uid, (None, 0))
+        if dashboard_json is not None:
+            digest = dashboard_hash(dashboard_json)
+            if entry is None or entry.get("sha256") != digest:
+                write_json_atomic(os.path.join(output_dir, f"{uid}.json"), dashboard_json)
+                written += 1
+            meta = dashboard_json.get("meta", {})
+            entry = {
+                "title": item.get("title", ""),
+                "version": item.get("version", meta.get("version")),
+                "updated": item.get("updated", meta.get("updated")),
+                "sha256": digest,
+            }
+        if entry is not None:
+            manifest[uid] = entry
+
+    # Drop dashboards that were deleted in Grafana since the last run.
+    removed = [uid for uid in old_manifest if uid not in manifest]
+    for uid in removed:
+        path = os.path.join(output_dir, f"{uid}.json")
+        if os.path.exists(path):
+            os.remove(path)
+    write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), manifest)
+
+    print(f"✔ Incremental backup in '{output_dir}': {written} updated, "
+          f"{len(manifest) - written} unchanged, {len(removed)} removed.")
+    fetched_count = sum(1 for dashboard, _ in results if dashboard is not None)
+    bytes_fetched = sum(size for _, size in results)
+    print_timing_summary(fetched_count, bytes_fetched, elapsed, concurrency)
+
+def print_timing_summary(count, bytes_fetched, elapsed, concurrency):
+    """Print throughput figures for a dashboard export."""
+    rate = count / elapsed if elapsed > 0 else float("inf")
+    mode = f"concurrent ({concurrency} workers)" if concurrency > 1 else "serial"
+    print(f"Fetched {count} dashboards ({bytes_fetched / 1e6:.2f} MB) in {elapsed:.2f}s "
+          f"[{mode}]: {rate:.1f} dashboards/s")
 
 def main():
     auth = (USERNAME, PASSWORD)
-    fetch_datasources(GRAFANA_URL, auth)
-    fetch_dashboards(GRAFANA_URL, auth)
+    session = make_session(auth, pool_size=CONCURRENCY, retries=RETRIES)
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
+    fetch_datasources(GRAFANA_URL, auth, session=session)
+    if INCREMENTAL:
+        fetch_dashboards_incremental(GRAFANA_URL, auth, session=session, concurrency=CONCURRENCY)
+    else:
+        fetch_dashboards(GRAFANA_URL, auth, session=session, concurrency=CONCURRENCY)
+    if PROVISIONING:
+        # Imported only here: it loads the datasource, restore and lint modules.
+        import grafana_provision
+        grafana_provision.write_bundle(BACKUP_DIR if INCREMENTAL else DASHBOARDS_FILE)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import requests
+from readiness import wait_for_grafana, wait_for_influxdb
+from influxdb_init import ROLLUPS, rollup_bucket
 import json
 import sys
 import os
@@ -22,52 +24,73 @@ GRAFANA_USER = "admin"
 GRAFANA_PASS = config["grafana_psw"]
 
 INFLUXDB_URL = "http://" + config["address"] + ":8086"  # InfluxDB 2.x base URL
+# URL Grafana queries: the caching proxy (influxdb_proxy.py) if one is configured.
+DATASOURCE_URL = config.get("influxdb_proxy_url") or INFLUXDB_URL
 INFLUXDB_ORG = config["influxdb_org"]
 INFLUXDB_BUCKET = config["influxdb_bucket"]
 INFLUXDB_TOKEN = config["influxdb_token"]              # All-access or read/write token
 
 DATASOURCE_NAME = config["influxdb_datasource"]
 
+# Seconds to wait for Grafana/InfluxDB to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
+
 # ------------------------------------------------------------------------------
 # STEP 1: CREATE OR UPDATE THE DATASOURCE
 # ------------------------------------------------------------------------------
-def create_influxdb_datasource():
+def influxdb_datasource_payload(name=DATASOURCE_NAME, org=INFLUXDB_ORG, bucket=INFLUXDB_BUCKET,
+                                token=INFLUXDB_TOKEN, time_interval=None):
     """
-    Creates a new Grafana data source for InfluxDB 2.x (Flux).
-    Returns the parsed JSON response from Grafana if successful.
+    Grafana datasource definition for InfluxDB 2.x (Flux), as posted to
+    /api/datasources and written to the provisioning files.
+    time_interval sets the smallest $__interval Grafana uses with it (e.g. "1m").
     """
     datasource_payload = {
-        "name": DATASOURCE_NAME,
+        "name": name,
         "type": "influxdb",
-        "url": INFLUXDB_URL,
+        "url": DATASOURCE_URL,
         "access": "proxy",
         "basicAuth": False,
         "jsonData": {
             "version": "Flux",
-            "organization": INFLUXDB_ORG,
-            "defaultBucket": INFLUXDB_BUCKET,
+            "organization": org,
+            "defaultBucket": bucket,
         },
         "secureJsonData": {
-            "token": INFLUXDB_TOKEN
+            "token": token
         },
         "isDefault": False  # Ensure this datasource is not set as default
     }
+    if time_interval:
+        datasource_payload["jsonData"]["timeInterval"] = time_interval
+    return datasource_payload
 
 
+def create_influxdb_datasource(session=None, name=DATASOURCE_NAME, org=INFLUXDB_ORG,
+                               bucket=INFLUXDB_BUCKET, token=INFLUXDB_TOKEN, time_interval=None):
+    """
+    Creates a new Grafana data source for InfluxDB 2.x (Flux).
+    Returns the parsed JSON response from Grafana if successful.
+    An existing requests session can be passed to reuse its connections.
+    The name/org/bucket/token default to the values in the config file.
+    """
+    http = session or requests
+    datasource_payload = influxdb_datasource_payload(name, org, bucket, token, time_interval)
+
     headers = {
         "Content-Type": "application/json"
     }
     url = f"{GRAFANA_URL}/api/datasources"
 
     try:
-        response = requests.post(
+        response = http.post(
             url,
             auth=(GRAFANA_USER, GRAFANA_PASS),
             headers=headers,
             data=json.dumps(datasource_payload)
         )
         response.raise_for_status()
-        print(f"Data source '{DATASOURCE_NAME}' created successfully.")
+        print(f"Data source '{name}' created successfully.")
         return response.json()
     except requests.exceptions.HTTPError as err:
         print("Failed to create data source.")
@@ -81,18 +104,19 @@ def create_influxdb_datasource():
 # ------------------------------------------------------------------------------
 # STEP 2: HEALTH CHECK (UNDOCUMENTED ENDPOINT)
 # ------------------------------------------------------------------------------
-def check_datasource_health(datasource_id):
+def check_datasource_health(datasource_id, session=None):
     """
     Calls the undocumented 'health check' endpoint for the new data source,
     which mimics the 'Save & test' behavior in the Grafana UI.
 
     Endpoint: GET /api/datasources/proxy/{id}/health
     """
+    http = session or requests
     url = f"{GRAFANA_URL}/api/datasources/proxy/{datasource_id}/health"
     print(f"Performing health check on data source ID {datasource_id}...")
 
     try:
-        response = requests.get(
+        response = http.get(
             url,
             auth=(GRAFANA_USER, GRAFANA_PASS)
         )
@@ -107,13 +131,42 @@ def check_datasource_health(datasource_id):
     except requests.exceptions.RequestException as e:
         print("An error occurred while checking data source health:", str(e))
 
+# ------------------------------------------------------------------------------
+# STEP 3: ONE DATASOURCE PER ROLLUP BUCKET
+# ------------------------------------------------------------------------------
+def rollup_datasource_payloads(rollups=ROLLUPS):
+    """Datasource definitions "<datasource>_<every>" of the rollup buckets."""
+    return [influxdb_datasource_payload(f"{DATASOURCE_NAME}_{rollup['every']}", bucket=rollup_bucket(rollup["every"]),
+                                        time_interval=rollup["every"])
+            for rollup in rollups]
+
+
+def create_rollup_datasources(session=None, rollups=ROLLUPS):
+    """
+    Creates a datasource "<datasource>_<every>" for each rollup bucket made by
+    influxdb_init.py, with its resolution as minimum interval, so that panels
+    over long ranges can query the downsampled fields (<field>_mean, ...).
+    Datasources that already exist are left alone.
+    """
+    http = session or requests
+    response = http.get(f"{GRAFANA_URL}/api/datasources", auth=(GRAFANA_USER, GRAFANA_PASS))
+    existing = {ds.get("name") for ds in response.json()} if response.status_code == 200 else set()
+    for payload in rollup_datasource_payloads(rollups):
+        if payload["name"] in existing:
+            print(f"Data source '{payload['name']}' exists.")
+            continue
+        create_influxdb_datasource(session, name=payload["name"], bucket=payload["jsonData"]["defaultBucket"],
+                                   time_interval=payload["jsonData"]["timeInterval"])
+
 # ------------------------------------------------------------------------------
 # MAIN
 # ------------------------------------------------------------------------------
-if __name__ == "__main__":
+def main(session=None):
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
+    wait_for_influxdb(INFLUXDB_URL, READY_TIMEOUT)
 
     # 1. Create the data source
-    ds_response = create_influxdb_datasource()
+    ds_response = create_influxdb_datasource(session)
     
     # 2. Parse out the ID from the creation response
     # Grafana's response may look like:
@@ -140,9 +193,17 @@ if __name__ == "__main__":
     if not datasource_id:
         print("Warning: Could not find 'id' of new data source in Grafana response.")
         print("Response was:", ds_response)
-        sys.exit(0)
+        return
 
     print(f"Got data source ID: {datasource_id}")
 
     # 3. Perform a health check on the newly created data source
-    check_datasource_health(datasource_id)
+    check_datasource_health(datasource_id, session)
+
+    # 4. Datasources for the downsampled buckets, if any
+    if ROLLUPS:
+        create_rollup_datasources(session)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import requests
+from readiness import wait_for_grafana
 import json
 import sys
 import os
@@ -25,10 +26,13 @@ OLD_ADMIN_PASS = "admin"             # The old admin password
 # Desired new password
 NEW_ADMIN_PASS = config["grafana_psw"]
 
+# Seconds to wait for Grafana to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
+
 # ------------------------------------------------------------------------------
 # CHANGE ADMIN'S OWN PASSWORD
 # ------------------------------------------------------------------------------
-def change_own_admin_password():
+def change_own_admin_password(session=None):
     """
     Changes the currently authenticated user's password via:
     PUT /api/user/password
@@ -38,7 +42,10 @@ def change_own_admin_password():
         "oldPassword": "<old_pass>",
         "newPassword": "<new_pass>"
       }
+    An existing requests session can be passed to reuse its connections.
     """
+    http = session or requests
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
     url = f"{GRAFANA_URL}/api/user/password"
 
     payload = {
@@ -47,7 +54,7 @@ def change_own_admin_password():
     }
 
     print(f"Changing password for user '{ADMIN_USER}' (yourself) ...")
-    resp = requests.put(url, auth=(ADMIN_USER, OLD_ADMIN_PASS), json=payload)
+    resp = http.put(url, auth=(ADMIN_USER, OLD_ADMIN_PASS), json=payload)
 
     if resp.status_code == 200:
         print("Password changed successfully!")
@@ -57,10 +64,14 @@ def change_own_admin_password():
         sys.exit(1)
 
 
-if __name__ == "__main__":
+def main(session=None):
     # Attempt to change the admin's own password
-    change_own_admin_password()
+    change_own_admin_password(session)
 
     print(f"\nDone! You can now log in as user '{ADMIN_USER}' with the new password:")
     print(f"  username: {ADMIN_USER}")
     print(f"  password: {NEW_ADMIN_PASS}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import requests
+from readiness import wait_for_grafana, wait_for_tcp
 import json
 import sys
 import os
@@ -30,19 +31,18 @@ MQTT_QOS       = 0
 # Datasource name as provided in the configuration file.
 DATASOURCE_NAME = config["mqtt_datasource"]
 
+# Seconds to wait for Grafana/Mosquitto to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
+
 # ------------------------------------------------------------------------------
 # STEP 1: CREATE OR UPDATE THE MQTT DATASOURCE
 # ------------------------------------------------------------------------------
-def create_mqtt_datasource():
+def mqtt_datasource_payload():
     """
-    Creates a new Grafana datasource for MQTT using the grafana-mqtt-datasource plugin.
-    Returns the parsed JSON response from Grafana if successful.
+    Grafana datasource definition for the grafana-mqtt-datasource plugin, as
+    posted to /api/datasources and written to the provisioning files.
     """
-    # print(MQTT_URL, type(MQTT_URL))
-    # print(config["mqtt_psw"], type(config["mqtt_psw"]))
-    # exit()
-
-    datasource_payload = {
+    return {
         "name": DATASOURCE_NAME,
         "type": "grafana-mqtt-datasource",  # This must match the plugin's type ID.
         "access": "proxy",                 # Let Grafana route the connection via its backend.
@@ -61,11 +61,24 @@ def create_mqtt_datasource():
     }
 
 
+def create_mqtt_datasource(session=None):
+    """
+    Creates a new Grafana datasource for MQTT using the grafana-mqtt-datasource plugin.
+    Returns the parsed JSON response from Grafana if successful.
+    An existing requests session can be passed to reuse its connections.
+    """
+    http = session or requests
+    # print(MQTT_URL, type(MQTT_URL))
+    # print(config["mqtt_psw"], type(config["mqtt_psw"]))
+    # exit()
+
+    datasource_payload = mqtt_datasource_payload()
+
     headers = {"Content-Type": "application/json"}
     url = f"{GRAFANA_URL}/api/datasources"
 
     try:
-        response = requests.post(url,
+        response = http.post(url,
                                  auth=(GRAFANA_USER, GRAFANA_PASS),
                                  headers=headers,
                                  data=json.dumps(datasource_payload))
@@ -84,17 +97,18 @@ def create_mqtt_datasource():
 # ------------------------------------------------------------------------------
 # STEP 2: HEALTH CHECK (UNDOCUMENTED ENDPOINT)
 # ------------------------------------------------------------------------------
-def check_datasource_health(datasource_id):
+def check_datasource_health(datasource_id, session=None):
     """
     Calls the undocumented 'health check' endpoint for the new datasource,
     which mimics the 'Save & test' behavior in the Grafana UI.
     Endpoint: GET /api/datasources/proxy/{id}/health
     """
+    http = session or requests
     url = f"{GRAFANA_URL}/api/datasources/proxy/{datasource_id}/health"
     print(f"Performing health check on datasource ID {datasource_id}...")
 
     try:
-        response = requests.get(url, auth=(GRAFANA_USER, GRAFANA_PASS))
+        response = http.get(url, auth=(GRAFANA_USER, GRAFANA_PASS))
         if response.status_code == 200:
             print("Health check passed. Datasource is working!")
             print("Health response:", response.text)
@@ -107,10 +121,12 @@ def check_datasource_health(datasource_id):
 # ------------------------------------------------------------------------------
 # MAIN
 # ------------------------------------------------------------------------------
-if __name__ == "__main__":
+def main(session=None):
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
+    wait_for_tcp(config["address"], 9001, "Mosquitto (websocket)", READY_TIMEOUT)
 
     # 1. Create the MQTT datasource
-    ds_response = create_mqtt_datasource()
+    ds_response = create_mqtt_datasource(session)
     
     # 2. Parse out the ID from the creation response.
     # Grafana's response may have the datasource's ID in "datasource.id" or at the top level as "id".
@@ -123,9 +139,13 @@ if __name__ == "__main__":
     if not datasource_id:
         print("Warning: Could not find 'id' of new datasource in Grafana response.")
         print("Response was:", ds_response)
-        sys.exit(0)
+        return
 
     print(f"Got datasource ID: {datasource_id}")
 
     # 3. Perform a health check on the newly created datasource
-    # check_datasource_health(datasource_id)
+    # check_datasource_health(datasource_id, session)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Grafana file provisioning bundle.
+
+Writes the datasources of the setup scripts and the dashboards of a backup
+as Grafana provisioning files, so that a fresh container starts with them
+and no HTTP restore is needed:
+
+    grafana_provisioning/
+      provisioning/datasources/expeca.yaml   the InfluxDB (and rollup) and MQTT datasources
+      provisioning/dashboards/expeca.yaml    a file provider for /var/lib/grafana/dashboards
+      dashboards/<folder>/<uid>.json         one dashboard model per file
+
+Mount (or copy) the two directories into the container before Grafana starts:
+
+    -v $PWD/grafana_provisioning/provisioning:/etc/grafana/provisioning
+    -v $PWD/grafana_provisioning/dashboards:/var/lib/grafana/dashboards
+
+The datasource definitions are the payloads of grafana_influxdb_datasource.py
+and grafana_mqtt_datasource.py, with a fixed uid derived from the name.
+Datasource references in the dashboards are resolved like grafana_restore.py
+does (backup names, datasourceMapping, defaultDatasource) and replaced by
+{"type", "uid"} references to the provisioned datasources; the Flux linter runs
+with the grafana_restore_lint mode. The YAML files are written as JSON, which
+Grafana reads as YAML. They contain the InfluxDB token and the MQTT password.
+
+Run as a script to build the bundle from the configured backup, e.g.:
+    python3 grafana_provision.py [dashboards.json]
+"""
+from dashboard_stream import iter_dashboards
+from flux_lint import format_report, iter_panels, lint_dashboard
+import grafana_influxdb_datasource
+import grafana_mqtt_datasource
+import grafana_restore
+import json
+import os
+import re
+import sys
+
+# Ensure we run in the script's own directory:
+os.chdir(sys.path[0])
+configfname = "config_data.json"
+try:
+    with open(configfname, 'r') as f:
+        config = json.load(f)
+except Exception as e:
+    print("Cannot read config data file:", e)
+    sys.exit(1)
+
+# Output directory of the bundle.
+PROVISIONING_DIR = config.get("grafana_provisioning_dir", "grafana_provisioning")
+# Where the dashboards directory is mounted in the container.
+CONTAINER_DASHBOARDS_DIR = "/var/lib/grafana/dashboards"
+PROVIDER_NAME = "expeca"
+# Datasource references that are not datasources.
+SPECIAL_DATASOURCES = {"", "-- Grafana --", "-- Mixed --", "-- Dashboard --"}
+
+
+def datasource_uid(name):
+    """Fixed uid of a provisioned datasource (Grafana allows at most 40 characters)."""
+    return re.sub(r"[^A-Za-z0-9_-]", "-", name)[:40]
+
+
+def provisioned_datasources():
+    """The datasource definitions of the setup scripts, with fixed uids."""
+    datasources = [grafana_influxdb_datasource.influxdb_datasource_payload()]
+    datasources += grafana_influxdb_datasource.rollup_datasource_payloads()
+    datasources.append(grafana_mqtt_datasource.mqtt_datasource_payload())
+    for ds in datasources:
+        ds["uid"] = datasource_uid(ds["name"])
+        ds["editable"] = True
+    return datasources
+
+
+def resolve_references(dashboard, resolver, datasources):
+    """
+    Replace the datasource references of a dashboard (objects of the source
+    instance, or names) by {"type", "uid"} references to provisioned datasources.
+    References that cannot be resolved are left as they are.
+    """
+    by_name = {ds["name"]: ds for ds in datasources}
+
+    def update(node):
+        ds = node.get("datasource")
+        if isinstance(ds, dict):
+            name = resolver.resolve(ds)
+        elif isinstance(ds, str) and ds not in SPECIAL_DATASOURCES and not ds.startswith("$"):
+            name = resolver.resolve_name(ds)
+        else:
+            return
+        target = by_name.get(name)
+        if target is not None:
+            node["datasource"] = {"type": target["type"], "uid": target["uid"]}
+        elif name:
+            node["datasource"] = name
+
+    for panel in iter_panels(dashboard):
+        update(panel)
+        for target in panel.get("targets") or []:
+            if isinstance(target, dict):
+                update(target)
+    for section in ("templating", "annotations"):
+        for entry in (dashboard.get(section) or {}).get("list") or []:
+            if isinstance(entry, dict):
+                update(entry)
+
+
+def folder_dir(dashboard_data):
+    """Sub-directory of a dashboard: its folder title, or '' for the General folder."""
+    folder = (dashboard_data.get("meta") or {}).get("folderTitle") or ""
+    if folder == "General":
+        return ""
+    return re.sub(r"[^\w .-]", "_", folder).strip()
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and move it into place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_bundle(input_path=grafana_restore.DASHBOARDS_INPUT, output_dir=PROVISIONING_DIR,
+                 lint_mode=grafana_restore.LINT_MODE):
+    """Write the provisioning bundle for the dashboards of a backup. Returns the number of dashboards."""
+    if not os.path.exists(input_path):
+        print(f"Error: '{input_path}' not found. Cannot build the provisioning bundle.")
+        sys.exit(1)
+    datasources = provisioned_datasources()
+    resolver = grafana_restore.DatasourceResolver(
+        {ds["name"] for ds in datasources}, grafana_restore.load_backup_ds_mapping("datasources.json"),
+        grafana_restore.DS_MAPPING_CONFIG, grafana_restore.DEFAULT_DS)
+
+    write_json_atomic(os.path.join(output_dir, "provisioning", "datasources", f"{PROVIDER_NAME}.yaml"),
+                      {"apiVersion": 1, "datasources": datasources})
+    write_json_atomic(os.path.join(output_dir, "provisioning", "dashboards", f"{PROVIDER_NAME}.yaml"), {
+        "apiVersion": 1,
+        "providers": [{
+            "name": PROVIDER_NAME,
+            "type": "file",
+            "disableDeletion": False,
+            "allowUiUpdates": True,
+            "options": {"path": CONTAINER_DASHBOARDS_DIR, "foldersFromFilesStructure": True},
+        }],
+    })
+
+    dashboards_dir = os.path.join(output_dir, "dashboards")
+    written = set()
+    for dashboard_data in iter_dashboards(input_path):
+        dashboard = dashboard_data.get("dashboard")
+        if not dashboard:
+            print("⚠ Skipping invalid dashboard JSON structure.")
+            continue
+        title = dashboard.get("title", "Unknown Title")
+        resolve_references(dashboard, resolver, datasources)
+        if lint_mode in ("report", "rewrite"):
+            for line in format_report(title, lint_dashboard(dashboard, rewrite=lint_mode == "rewrite",
+                                                            **grafana_restore.LINT_OPTIONS)):
+                print(line)
+        dashboard.pop("id", None)
+        dashboard["uid"] = dashboard.get("uid") or datasource_uid(title.lower())
+        path = os.path.join(dashboards_dir, folder_dir(dashboard_data), f"{dashboard['uid']}.json")
+        write_json_atomic(path, dashboard)
+        written.add(path)
+
+    # Dashboards of a previous bundle that are no longer in the backup.
+    for root, _, files in os.walk(dashboards_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".json") and path not in written:
+                os.remove(path)
+
+    resolver.print_warnings()
+    print(f"✔ Provisioning bundle in '{output_dir}': {len(datasources)} datasources, {len(written)} dashboards.")
+    return len(written)
+
+
+if __name__ == "__main__":
+    write_bundle(sys.argv[1] if len(sys.argv) > 1 else grafana_restore.DASHBOARDS_INPUT)
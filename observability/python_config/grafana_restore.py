@@ -1,8 +1,18 @@
 #!/usr/bin/env python3
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from dashboard_stream import iter_dashboards
+from flux_lint import format_report, lint_dashboard
+from http_session import make_session
+from readiness import wait_for_grafana
+import threading
+import hashlib
 import json
+import math
 import sys
 import os
+import time
 
 # Ensure we run in the script's own directory:
 os.chdir(sys.path[0])
@@ -24,6 +34,30 @@ AUTH = (USERNAME, PASSWORD)
 DS_MAPPING_CONFIG = config.get("datasourceMapping", {})  
 # Optional default datasource to use if no match is found.
 DEFAULT_DS = config.get("defaultDatasource", "")
+# Restore from the per-dashboard directory written by an incremental backup.
+if config.get("grafana_backup_incremental", False):
+    DASHBOARDS_INPUT = config.get("grafana_backup_dir", "dashboards")
+else:
+    DASHBOARDS_INPUT = config.get("grafana_dashboards_file", "dashboards.json")
+
+# Number of dashboards rewritten and posted in parallel.
+CONCURRENCY = max(1, int(config.get("grafana_restore_concurrency", 4)))
+# Upper bound on dashboard POSTs per second (0 = unlimited).
+RATE_LIMIT = float(config.get("grafana_restore_rps", 10))
+# Journal of restored dashboards; an interrupted restore resumes from it. Entries
+# only count for the same Grafana URL and backup content, and the journal is
+# removed once a restore completes without failures.
+JOURNAL_FILE = config.get("grafana_restore_journal", "restore_journal.jsonl")
+# Flux query linting of the restored dashboards (see flux_lint.py):
+# "report" prints expensive queries, "rewrite" also fixes them, "off" skips it.
+LINT_MODE = config.get("grafana_restore_lint", "report")
+LINT_OPTIONS = {
+    "min_refresh": config.get("grafana_min_refresh", "10s"),
+    "raw_rate": float(config.get("flux_lint_raw_rate", 10.0)),     # assumed raw points/s per series
+    "unbounded": f"{config.get('influxdb_retention_days', 14)}d",
+}
+# Seconds to wait for Grafana to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
 
 def load_backup_ds_mapping(input_file="datasources.json"):
     """
@@ -40,12 +74,13 @@ def load_backup_ds_mapping(input_file="datasources.json"):
              mapping[ds["uid"].strip()] = ds["name"].strip()
     return mapping
 
-def fetch_target_datasources(base_url, auth):
+def fetch_target_datasources(base_url, auth, session=None):
     """
     Fetch datasources from the target Grafana instance and return a set of datasource names.
     """
+    http = session or requests
     ds_url = f"{base_url}/api/datasources"
-    response = requests.get(ds_url, auth=auth, verify=False)
+    response = http.get(ds_url, auth=auth, verify=False)
     if response.status_code != 200:
         print(f"Error fetching target datasources: {response.text}")
         sys.exit(1)
@@ -56,55 +91,99 @@ def fetch_target_datasources(base_url, auth):
             ds_names.add(ds["name"].strip())
     return ds_names
 
-def update_datasource_references_target(item, target_ds_names, backup_ds_mapping, mapping_config, default_ds):
+class DatasourceResolver:
     """
-    Recursively update datasource references in the JSON object.
-
-    For each "datasource" key holding an object:
-      - If the object's UID is "-- Grafana --", leave it unchanged.
-      - Otherwise, try to obtain a name:
-          (1) Use the "name" field if present.
-          (2) If missing, use the UID to look up the backup datasource name.
-          (3) If still missing, fall back to using the "type" field.
-      - Then, if that name is in the target datasources, use it.
-      - Else, if mapping_config provides a mapping, use that.
-      - Otherwise, use default_ds.
-      
-    If the "datasource" key holds a string (even empty), it is left unchanged.
+    Resolution table from backup datasource references to target datasource names,
+    built once per restore run and shared by all dashboards (and worker threads).
+
+    For a datasource object:
+      - If the object's UID is "-- Grafana --", it resolves to "-- Grafana --".
+      - Otherwise, a backup name is obtained from:
+          (1) the "name" field if present,
+          (2) else the backup datasource name looked up by UID,
+          (3) else the "type" field.
+      - If that name is in the target datasources, it is used.
+      - Else, if mapping_config provides a mapping to a target datasource, that is used.
+      - Otherwise, default_ds is used and the miss is counted for a single summary warning.
     """
-    if isinstance(item, dict):
-        for key, value in item.items():
-            if key == "datasource":
-                if isinstance(value, dict):
-                    # Special case: built-in Grafana datasource remains unchanged.
-                    if value.get("uid", "").strip() == "-- Grafana --":
-                        item[key] = "-- Grafana --"
-                        continue
-                    # Try to resolve a datasource name.
-                    backup_ds_name = value.get("name", "").strip()
-                    if not backup_ds_name and "uid" in value:
-                        backup_ds_name = backup_ds_mapping.get(value["uid"].strip(), "").strip()
-                    if not backup_ds_name and "type" in value:
-                        backup_ds_name = value["type"].strip()
-                    
-                    if backup_ds_name in target_ds_names:
-                        item[key] = backup_ds_name
-                    elif backup_ds_name in mapping_config:
-                        mapped = mapping_config[backup_ds_name].strip()
-                        if mapped in target_ds_names:
-                            item[key] = mapped
-                        else:
-                            print(f"Warning: Mapped target datasource '{mapped}' for backup '{backup_ds_name}' not found in target. Using default.")
-                            item[key] = default_ds
-                    else:
-                        print(f"Warning: Datasource '{backup_ds_name}' not found in target and no mapping provided. Using default.")
-                        item[key] = default_ds
-                # Otherwise, if not a dict, leave as is.
+
+    def __init__(self, target_ds_names, backup_ds_mapping, mapping_config, default_ds):
+        self.target_ds_names = target_ds_names
+        self.backup_ds_mapping = {uid.strip(): name.strip() for uid, name in backup_ds_mapping.items()}
+        self.mapping_config = {name: mapped.strip() for name, mapped in mapping_config.items()}
+        self.default_ds = default_ds
+        self.cache = {}
+        self.unresolved = {}
+        self.lock = threading.Lock()
+
+    def resolve_name(self, backup_ds_name):
+        """Final target name for a backup datasource name; records misses."""
+        if backup_ds_name in self.target_ds_names:
+            return backup_ds_name
+        mapped = self.mapping_config.get(backup_ds_name)
+        if mapped is not None and mapped in self.target_ds_names:
+            return mapped
+        with self.lock:
+            self.unresolved[(backup_ds_name, mapped)] = self.unresolved.get((backup_ds_name, mapped), 0) + 1
+        return self.default_ds
+
+    def resolve(self, ds):
+        """Target datasource name for a backup datasource object."""
+        key = (ds.get("uid"), ds.get("name"), ds.get("type"))
+        backup_ds_name = self.cache.get(key)
+        if backup_ds_name is None:
+            uid = (ds.get("uid") or "").strip()
+            if uid == "-- Grafana --":
+                return "-- Grafana --"
+            backup_ds_name = (ds.get("name") or "").strip()
+            if not backup_ds_name and uid:
+                backup_ds_name = self.backup_ds_mapping.get(uid, "")
+            if not backup_ds_name and "type" in ds:
+                backup_ds_name = ds["type"].strip()
+            self.cache[key] = backup_ds_name
+        return self.resolve_name(backup_ds_name)
+
+    def print_warnings(self):
+        """Print one warning per unresolved backup datasource, with its number of references."""
+        for (backup_ds_name, mapped), count in sorted(self.unresolved.items(), key=lambda kv: -kv[1]):
+            if mapped is not None:
+                print(f"Warning: Mapped target datasource '{mapped}' for backup '{backup_ds_name}' not found in target. "
+                      f"Used default for {count} references.")
             else:
-                update_datasource_references_target(value, target_ds_names, backup_ds_mapping, mapping_config, default_ds)
-    elif isinstance(item, list):
-        for elem in item:
-            update_datasource_references_target(elem, target_ds_names, backup_ds_mapping, mapping_config, default_ds)
+                print(f"Warning: Datasource '{backup_ds_name}' not found in target and no mapping provided. "
+                      f"Used default for {count} references.")
+
+def update_datasource_references_target(dashboard, resolver):
+    """
+    Update datasource references in a dashboard using a DatasourceResolver.
+
+    Only the places Grafana stores datasource references are visited: panels
+    (including nested and row panels) and their targets, templating variables
+    and annotations. Object references are replaced by the resolved name; if the
+    "datasource" key holds a string (even empty), it is left unchanged.
+    """
+    def update(node):
+        ds = node.get("datasource")
+        if isinstance(ds, dict):
+            node["datasource"] = resolver.resolve(ds)
+
+    panels = list(dashboard.get("panels") or [])
+    for row in dashboard.get("rows") or []:
+        if isinstance(row, dict):
+            panels.extend(row.get("panels") or [])
+    while panels:
+        panel = panels.pop()
+        if not isinstance(panel, dict):
+            continue
+        update(panel)
+        for target in panel.get("targets") or []:
+            if isinstance(target, dict):
+                update(target)
+        panels.extend(panel.get("panels") or [])
+    for section in ("templating", "annotations"):
+        for entry in (dashboard.get(section) or {}).get("list") or []:
+            if isinstance(entry, dict):
+                update(entry)
 
 def fix_panel_datasource(panel):
     """
@@ -139,51 +218,203 @@ def restore_datasources(base_url, auth, input_file="datasources.json"):
         else:
             print(f"⚠ Failed to restore datasource '{ds.get('name')}': {resp.text}")
 
-def restore_dashboards(base_url, auth, backup_ds_mapping, target_ds_names, mapping_config, default_ds, input_file="dashboards.json"):
-    """Restore Grafana dashboards from backup after updating datasource references."""
+class RateLimiter:
+    """Thread-safe limiter spacing calls at most `rate` per second apart (rate <= 0 disables it)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def backup_digest(input_file):
+    """Content hash of a backup file, or of the manifest of an incremental backup directory."""
+    if os.path.isdir(input_file):
+        input_file = os.path.join(input_file, "manifest.json")
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class RestoreJournal:
+    """
+    Append-only record of restored dashboards, one JSON line per dashboard
+    ({"scope": ..., "key": ..., "title": ...}). The key is the backup UID, or
+    the title for dashboards without one. The scope identifies the target
+    Grafana and the backup content; entries of other scopes are ignored.
+    """
+
+    def __init__(self, path, scope=""):
+        self.path = path
+        self.scope = scope
+        self.done = set()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get("scope", "") == scope:
+                            self.done.add(entry["key"])
+
+    def record(self, key, title):
+        with self.lock:
+            self.done.add(key)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"scope": self.scope, "key": key, "title": title}) + "\n")
+
+    def remove(self):
+        """Delete the journal file (after a complete restore)."""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+def dashboard_key(dashboard):
+    """Journal key of a backup dashboard."""
+    return dashboard.get("uid") or dashboard.get("title", "")
+
+def prepare_dashboard(dashboard, resolver, lint_mode="off"):
+    """Rewrite datasource references and build the POST payload for one dashboard."""
+    # Update datasource references in the dashboard.
+    update_datasource_references_target(dashboard, resolver)
+    # Report (and optionally rewrite) expensive Flux queries.
+    if lint_mode in ("report", "rewrite"):
+        reports = lint_dashboard(dashboard, rewrite=lint_mode == "rewrite", **LINT_OPTIONS)
+        if reports:
+            action = " (rewritten where possible)" if lint_mode == "rewrite" else ""
+            print("\n".join([f"Flux lint: {sum(len(r['findings']) for r in reports)} issues{action} in "
+                              f"'{dashboard.get('title', 'Unknown Title')}':"]
+                             + format_report(dashboard.get("title", "Unknown Title"), reports)))
+    # Now fix panel-level datasource if empty by using the first target's datasource.
+    if "panels" in dashboard and isinstance(dashboard["panels"], list):
+        for panel in dashboard["panels"]:
+            fix_panel_datasource(panel)
+    # Remove internal id and uid so that Grafana assigns new ones.
+    dashboard.pop("id", None)
+    dashboard.pop("uid", None)
+    dashboard["version"] = 0
+    return {
+        "dashboard": dashboard,
+        "folderId": 0,       # Change if you wish to restore into a specific folder.
+        "overwrite": False   # Set to True if you wish to overwrite dashboards with the same title.
+    }
+
+def restore_dashboard(http, base_url, auth, payload, limiter):
+    """POST one dashboard. Returns (success, latency in seconds, response text)."""
+    limiter.wait()
+    start = time.perf_counter()
+    try:
+        resp = http.post(f"{base_url}/api/dashboards/db", auth=auth, json=payload, verify=False)
+    except requests.exceptions.RequestException as e:
+        return False, time.perf_counter() - start, str(e)
+    return resp.status_code in [200, 201], time.perf_counter() - start, resp.text
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def print_latency_summary(latencies, elapsed):
+    """Print per-dashboard POST latency percentiles and overall throughput."""
+    if not latencies:
+        return
+    latencies = sorted(latencies)
+    ms = lambda q: percentile(latencies, q) * 1000
+    print(f"Restore latency over {len(latencies)} dashboards: p50 {ms(50):.0f} ms, p90 {ms(90):.0f} ms, "
+          f"p99 {ms(99):.0f} ms, max {latencies[-1] * 1000:.0f} ms; "
+          f"{len(latencies) / elapsed:.1f} dashboards/s overall")
+
+def restore_dashboards(base_url, auth, resolver, input_file="dashboards.json", session=None, concurrency=1, rate_limit=0,
+                       journal_file=None, lint_mode="off"):
+    """
+    Restore Grafana dashboards from backup after updating datasource references.
+    Dashboards are rewritten and posted by a pool of `concurrency` workers, at
+    most `rate_limit` POSTs per second. Restored dashboards are recorded in
+    `journal_file` and skipped when the restore is run again. `lint_mode`
+    ("off", "report" or "rewrite") runs the Flux linter on every dashboard.
+    """
     if not os.path.exists(input_file):
         print(f"Error: '{input_file}' not found. Cannot restore dashboards.")
         sys.exit(1)
-    with open(input_file, "r") as f:
-        dashboards = json.load(f)
-    for dashboard_data in dashboards:
-        dashboard = dashboard_data.get("dashboard")
-        if not dashboard:
-            print("⚠ Skipping invalid dashboard JSON structure.")
-            continue
-        print(f"Restoring dashboard: {dashboard.get('title', 'Unknown Title')}...")
-        # Update datasource references in the dashboard.
-        update_datasource_references_target(dashboard, target_ds_names, backup_ds_mapping, mapping_config, default_ds)
-        # Now fix panel-level datasource if empty by using the first target's datasource.
-        if "panels" in dashboard and isinstance(dashboard["panels"], list):
-            for panel in dashboard["panels"]:
-                fix_panel_datasource(panel)
-        # Remove internal id and uid so that Grafana assigns new ones.
-        dashboard.pop("id", None)
-        dashboard.pop("uid", None)
-        dashboard["version"] = 0
-        payload = {
-            "dashboard": dashboard,
-            "folderId": 0,       # Change if you wish to restore into a specific folder.
-            "overwrite": False   # Set to True if you wish to overwrite dashboards with the same title.
-        }
-        resp = requests.post(f"{GRAFANA_URL}/api/dashboards/db", auth=auth, json=payload, verify=False)
-        if resp.status_code in [200, 201]:
-            print(f"✔ Dashboard '{dashboard.get('title')}' restored successfully!")
+    http = session or requests
+    limiter = RateLimiter(rate_limit)
+    journal = RestoreJournal(journal_file, f"{base_url} {os.path.abspath(input_file)} {backup_digest(input_file)}")
+    if journal.done:
+        print(f"Resuming: {len(journal.done)} dashboards already restored according to '{journal_file}'.")
+
+    def work(dashboard):
+        key = dashboard_key(dashboard)
+        title = dashboard.get('title', 'Unknown Title')
+        payload = prepare_dashboard(dashboard, resolver, lint_mode)
+        ok, latency, text = restore_dashboard(http, base_url, auth, payload, limiter)
+        if ok:
+            journal.record(key, title)
+        return title, ok, latency, text
+
+    def report(result):
+        title, ok, latency, text = result
+        if ok:
+            print(f"✔ Dashboard '{title}' restored successfully!")
+            latencies.append(latency)
         else:
-            print(f"⚠ Failed to restore dashboard '{dashboard.get('title')}': {resp.text}")
+            print(f"⚠ Failed to restore dashboard '{title}': {text}")
+            failed.append(title)
+
+    latencies, failed, skipped = [], [], 0
+    start = time.perf_counter()
+    # Dashboards are read one at a time, so posting starts before the whole backup
+    # is parsed; at most 2 * concurrency dashboards are held in memory.
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        for dashboard_data in iter_dashboards(input_file):
+            dashboard = dashboard_data.get("dashboard")
+            if not dashboard:
+                print("⚠ Skipping invalid dashboard JSON structure.")
+                continue
+            if dashboard_key(dashboard) in journal.done:
+                skipped += 1
+                continue
+            print(f"Restoring dashboard: {dashboard.get('title', 'Unknown Title')}...")
+            pending.append(pool.submit(work, dashboard))
+            if len(pending) >= 2 * concurrency:
+                report(pending.popleft().result())
+        while pending:
+            report(pending.popleft().result())
+    elapsed = time.perf_counter() - start
+
+    resolver.print_warnings()
+    print(f"Restored {len(latencies)} dashboards, {len(failed)} failed, {skipped} skipped (already restored).")
+    if not failed:
+        journal.remove()
+    print_latency_summary(latencies, elapsed)
 
-def main():
+def main(session=None):
     # Build mapping from backup datasource UIDs to names.
     backup_ds_mapping = load_backup_ds_mapping("datasources.json")
     print("Backup datasource mapping:", backup_ds_mapping)
     # Fetch the target instance datasource names.
-    target_ds_names = fetch_target_datasources(GRAFANA_URL, AUTH)
+    session = session or make_session(AUTH, pool_size=CONCURRENCY)
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
+    target_ds_names = fetch_target_datasources(GRAFANA_URL, AUTH, session)
     print("Target instance datasources:", target_ds_names)
     # Restore datasources from backup.
     # restore_datasources(GRAFANA_URL, AUTH)
     # Restore dashboards, updating datasource references.
-    restore_dashboards(GRAFANA_URL, AUTH, backup_ds_mapping, target_ds_names, DS_MAPPING_CONFIG, DEFAULT_DS)
+    resolver = DatasourceResolver(target_ds_names, backup_ds_mapping, DS_MAPPING_CONFIG, DEFAULT_DS)
+    restore_dashboards(GRAFANA_URL, AUTH, resolver, DASHBOARDS_INPUT, session=session, concurrency=CONCURRENCY, rate_limit=RATE_LIMIT,
+                       journal_file=JOURNAL_FILE, lint_mode=LINT_MODE)
 
 if __name__ == "__main__":
     main()
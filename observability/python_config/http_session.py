@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP session helper for the setup/backup scripts.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def make_session(auth=None, pool_size=10, retries=3, headers=None):
+    """
+    Create a keep-alive HTTP session to be shared by all requests to one service.
+    Connection errors are retried with exponential backoff, and so are
+    429/5xx responses to idempotent requests (POSTs are not re-sent).
+    """
+    session = requests.Session()
+    session.auth = auth
+    session.verify = False
+    if headers:
+        session.headers.update(headers)
+    retry = Retry(total=retries, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import ThreadPoolExecutor
+from http_session import make_session
+from readiness import wait_for_grafana, wait_for_influxdb
+import grafana_influxdb_datasource
+import threading
+import json
+import sys
+import os
+
+# Ensure we run in the script's own directory:
+os.chdir(sys.path[0])
+configfname = "config_data.json"
+
+try:
+    with open(configfname, 'r') as f:
+        config = json.load(f)
+except Exception as e:
+    print("Cannot read config data file:", e)
+    sys.exit(1)
+
+# -------------------------------
+# Configuration Variables
+# -------------------------------
+INFLUXDB_URL = "http://" + config["address"] + ":8086"
+ADMIN_TOKEN = config["influxdb_token"]           # All-access token created by influxdb_init.py
+GRAFANA_URL = "http://" + config["address"] + ":3000"
+GRAFANA_AUTH = ("admin", config["grafana_psw"])
+
+# Bucket/org/token specs, see influxdb_bulk.json for an example.
+SPEC_FILE = config.get("influxdb_bulk_file", "influxdb_bulk.json")
+# Created tokens are written here (keep this file private).
+TOKENS_FILE = config.get("influxdb_bulk_tokens_file", "influxdb_bulk_tokens.json")
+CONCURRENCY = max(1, int(config.get("influxdb_bulk_concurrency", 8)))
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
+
+
+class InfluxProvisioner:
+    """
+    Idempotent creation of InfluxDB v2 organizations, buckets and bucket-scoped
+    tokens over one pooled session. Existing objects are looked up and reused.
+    """
+
+    def __init__(self, session, base_url=INFLUXDB_URL):
+        self.http = session
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.org_ids = {}
+        self.authorizations = {}     # orgID -> {description: token}
+
+    def request(self, method, path, **kwargs):
+        resp = self.http.request(method, f"{self.base_url}{path}", **kwargs)
+        if resp.status_code >= 400 and resp.status_code != 404:
+            raise RuntimeError(f"{method} {path} failed ({resp.status_code}): {resp.text}")
+        return resp
+
+    def ensure_org(self, name):
+        """Return the ID of organization `name`, creating it if needed."""
+        with self.lock:
+            if name in self.org_ids:
+                return self.org_ids[name]
+            resp = self.request("GET", "/api/v2/orgs", params={"org": name})
+            orgs = resp.json().get("orgs", []) if resp.status_code == 200 else []
+            if orgs:
+                print(f"Organization '{name}' exists.")
+            else:
+                orgs = [self.request("POST", "/api/v2/orgs", json={"name": name}).json()]
+                print(f"✔ Created organization '{name}'.")
+            self.org_ids[name] = orgs[0]["id"]
+            # One listing per organization instead of one per token.
+            resp = self.request("GET", "/api/v2/authorizations", params={"orgID": orgs[0]["id"]})
+            self.authorizations[orgs[0]["id"]] = {
+                a.get("description", ""): a.get("token")
+                for a in resp.json().get("authorizations", [])
+            } if resp.status_code == 200 else {}
+            return self.org_ids[name]
+
+    def ensure_bucket(self, org_id, name, retention_days):
+        """Return the ID of bucket `name` in the organization, creating it if needed."""
+        resp = self.request("GET", "/api/v2/buckets", params={"orgID": org_id, "name": name})
+        buckets = resp.json().get("buckets", []) if resp.status_code == 200 else []
+        if buckets:
+            print(f"Bucket '{name}' exists.")
+            return buckets[0]["id"]
+        # A retention of 0 days keeps data forever.
+        rules = [{"type": "expire", "everySeconds": int(retention_days * 24 * 60 * 60)}] if retention_days else []
+        bucket = self.request("POST", "/api/v2/buckets",
+                              json={"orgID": org_id, "name": name, "retentionRules": rules}).json()
+        retention = f"{retention_days}d" if retention_days else "infinite"
+        print(f"✔ Created bucket '{name}' (retention {retention}).")
+        return bucket["id"]
+
+    def ensure_token(self, org_id, bucket_id, bucket_name, actions):
+        """Return a token with the given actions ('read'/'write') on one bucket, creating it if needed."""
+        description = f"bulk:{bucket_name}:{'+'.join(actions)}"
+        with self.lock:
+            token = self.authorizations[org_id].get(description)
+        if token:
+            print(f"Token '{description}' exists.")
+            return token
+        permissions = [{"action": action, "resource": {"type": "buckets", "id": bucket_id, "orgID": org_id}}
+                       for action in actions]
+        auth = self.request("POST", "/api/v2/authorizations",
+                            json={"orgID": org_id, "description": description, "permissions": permissions}).json()
+        with self.lock:
+            self.authorizations[org_id][description] = auth["token"]
+        print(f"✔ Created token '{description}'.")
+        return auth["token"]
+
+    def provision(self, spec):
+        """Create the org, bucket and tokens of one spec. Returns a result record."""
+        org = spec.get("org", config["influxdb_org"])
+        org_id = self.ensure_org(org)
+        bucket_id = self.ensure_bucket(org_id, spec["bucket"], spec.get("retention_days", config["influxdb_retention_days"]))
+        tokens = {}
+        for name, actions in spec.get("tokens", {"read": ["read"], "write": ["write"]}).items():
+            tokens[name] = self.ensure_token(org_id, bucket_id, spec["bucket"], actions)
+        return {"org": org, "bucket": spec["bucket"], "bucket_id": bucket_id, "tokens": tokens}
+
+
+def fetch_grafana_datasource_names(session):
+    """Names of the datasources that already exist in Grafana."""
+    resp = session.get(f"{GRAFANA_URL}/api/datasources", auth=GRAFANA_AUTH)
+    if resp.status_code != 200:
+        print(f"Error fetching Grafana datasources: {resp.text}")
+        sys.exit(1)
+    return {ds["name"] for ds in resp.json() if "name" in ds}
+
+
+def run_parallel(func, items, concurrency):
+    """Apply func to every item in a thread pool; returns (results, number of failures)."""
+    def guarded(item):
+        try:
+            return func(item)
+        except (Exception, SystemExit) as e:
+            print(f"⚠ Failed for {item}: {e}")
+            return None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(guarded, items))
+    return results, sum(1 for r in results if r is None)
+
+
+def main(spec_file=SPEC_FILE):
+    try:
+        with open(spec_file, 'r') as f:
+            specs = json.load(f)["buckets"]
+    except Exception as e:
+        print(f"Cannot read bulk provisioning file '{spec_file}':", e)
+        sys.exit(1)
+
+    wait_for_influxdb(INFLUXDB_URL, READY_TIMEOUT)
+    influx = make_session(pool_size=CONCURRENCY, headers={"Authorization": f"Token {ADMIN_TOKEN}"})
+    provisioner = InfluxProvisioner(influx)
+    # Organizations first (serially, few of them), then buckets and tokens concurrently.
+    for org in sorted({spec.get("org", config["influxdb_org"]) for spec in specs}):
+        try:
+            provisioner.ensure_org(org)
+        except Exception as e:
+            print(f"⚠ Cannot set up organization '{org}': {e}")
+            sys.exit(1)
+    results, failed = run_parallel(provisioner.provision, specs, CONCURRENCY)
+    print(f"InfluxDB: provisioned {len(specs) - failed} of {len(specs)} buckets.")
+
+    with open(TOKENS_FILE, "w") as f:
+        json.dump([r for r in results if r], f, indent=2)
+    print(f"Tokens written to '{TOKENS_FILE}'.")
+
+    # Matching Grafana datasources for the specs that ask for one.
+    wanted = [(spec, result) for spec, result in zip(specs, results) if result and spec.get("datasource")]
+    if wanted:
+        failed += create_datasources(wanted)
+    if failed:
+        print(f"⚠ {failed} bucket(s) or datasource(s) could not be provisioned.")
+        sys.exit(1)
+
+
+def create_datasources(wanted):
+    """Create the Grafana datasources of (spec, result) pairs that do not exist yet; returns the failures."""
+    wait_for_grafana(GRAFANA_URL, READY_TIMEOUT)
+    grafana = make_session(pool_size=CONCURRENCY)
+    existing = fetch_grafana_datasource_names(grafana)
+    todo = [(spec, result) for spec, result in wanted if spec["datasource"] not in existing]
+    print(f"Grafana: {len(wanted) - len(todo)} datasources exist, creating {len(todo)}.")
+
+    def create(item):
+        spec, result = item
+        token = result["tokens"].get("read") or next(iter(result["tokens"].values()), ADMIN_TOKEN)
+        return grafana_influxdb_datasource.create_influxdb_datasource(
+            grafana, name=spec["datasource"], org=result["org"], bucket=result["bucket"], token=token)
+    _, failed = run_parallel(create, todo, CONCURRENCY)
+    print(f"Grafana: created {len(todo) - failed} of {len(todo)} datasources.")
+    return failed
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else SPEC_FILE)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import requests
+from readiness import wait_for_influxdb
 import json
 import sys
 import os
@@ -30,12 +31,27 @@ RETENTION_DAYS = config["influxdb_retention_days"]              # Retention in d
 # Choose a specific token instead of letting InfluxDB generate one
 CUSTOM_TOKEN = config["influxdb_token"]
 
+# Seconds to wait for InfluxDB to come up before giving up.
+READY_TIMEOUT = config.get("readiness_timeout_s", 120)
 
-def setup_influxdb_noauth():
+# Optional downsampled copies of the bucket, e.g.
+#   [{"every": "10s", "retention_days": 30}, {"every": "1h", "retention_days": 0}]
+# Each rollup gets its own bucket "<bucket>_<every>" (retention 0 = infinite)
+# and a task that writes <field>_mean/_min/_max/_p<N> of the raw data to it.
+ROLLUPS = config.get("influxdb_rollups", [])
+ROLLUP_PERCENTILES = config.get("influxdb_rollup_percentiles", [95])
+# Delay before a rollup task runs, so that late points of the window are included.
+ROLLUP_OFFSET = config.get("influxdb_rollup_offset", "10s")
+
+
+def setup_influxdb_noauth(session=None):
     """
     Perform initial setup via the /api/v2/setup endpoint, and specify a custom token.
     Even if auth is disabled, you must supply username/password/bucket/org in the payload.
+    An existing requests session can be passed to reuse its connections.
     """
+    http = session or requests
+    wait_for_influxdb(f"http://{INFLUXDB_HOST}:{INFLUXDB_PORT}", READY_TIMEOUT)
 
     setup_url = f"http://{INFLUXDB_HOST}:{INFLUXDB_PORT}/api/v2/setup"
 
@@ -53,7 +69,7 @@ def setup_influxdb_noauth():
     }
 
     try:
-        response = requests.post(setup_url, json=payload)
+        response = http.post(setup_url, json=payload)
         if response.status_code == 201:
             data = response.json()
             print("InfluxDB setup completed successfully!")
@@ -67,6 +83,8 @@ def setup_influxdb_noauth():
             if data['auth']['token'] != CUSTOM_TOKEN:
                 print("Note: The returned token may differ if InfluxDB overrides it,")
                 print("but typically it will match your specified CUSTOM_TOKEN.")
+            if ROLLUPS:
+                setup_rollups(session)
         else:
             print(f"Setup failed with status code: {response.status_code}")
             print(f"Response: {response.text}")
@@ -76,6 +94,93 @@ def setup_influxdb_noauth():
         sys.exit(1)
 
 
+def rollup_bucket(every, bucket=BUCKET_NAME):
+    """Name of the rollup bucket with resolution `every` (e.g. "1m")."""
+    return f"{bucket}_{every}"
+
+
+def rollup_flux(every, bucket=BUCKET_NAME, org=ORG_NAME, percentiles=ROLLUP_PERCENTILES, offset=ROLLUP_OFFSET):
+    """
+    Flux task that aggregates the numeric fields of the raw bucket over windows
+    of `every` into <field>_mean, _min, _max and _p<N> of the rollup bucket,
+    all as floats.
+    """
+    aggregates = [("mean", "mean"), ("min", "min"), ("max", "max")]
+    aggregates += [(f"p{p:g}".replace(".", "_"),
+                    f"(column, tables=<-) => tables |> quantile(q: {p / 100:g}, column: column)")
+                   for p in percentiles]
+    streams = "\n".join(
+        f'{suffix}_stream = data\n'
+        f'    |> aggregateWindow(every: task.every, fn: {fn}, createEmpty: false)\n'
+        f'    |> map(fn: (r) => ({{r with _field: r._field + "_{suffix}"}}))'
+        for suffix, fn in aggregates)
+    return (
+        'import "types"\n\n'
+        f'option task = {{name: "{rollup_bucket(every, bucket)}", every: {every}, offset: {offset}}}\n\n'
+        f'data = from(bucket: "{bucket}")\n'
+        '    |> range(start: -task.every)\n'
+        '    |> filter(fn: (r) => types.isNumeric(v: r._value))\n'
+        '    |> toFloat()\n\n'
+        f'{streams}\n\n'
+        f'union(tables: [{", ".join(suffix + "_stream" for suffix, _ in aggregates)}])\n'
+        f'    |> to(bucket: "{rollup_bucket(every, bucket)}", org: "{org}")\n'
+    )
+
+
+def setup_rollups(session=None, rollups=ROLLUPS):
+    """
+    Create the rollup buckets and their downsampling tasks. Existing buckets
+    and tasks are updated in place, so this can be run again after changing
+    the rollups in the config file. Tasks only process data written after
+    they are created.
+    """
+    http = session or requests
+    base_url = f"http://{INFLUXDB_HOST}:{INFLUXDB_PORT}"
+    headers = {"Authorization": f"Token {CUSTOM_TOKEN}"}
+
+    def call(method, path, **kwargs):
+        response = http.request(method, base_url + path, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            print(f"{method} {path} failed with status code: {response.status_code}")
+            print(f"Response: {response.text}")
+            sys.exit(1)
+        return response.json() if response.content else {}
+
+    try:
+        orgs = call("GET", "/api/v2/orgs", params={"org": ORG_NAME}).get("orgs", [])
+        if not orgs:
+            print(f"Organization '{ORG_NAME}' not found.")
+            sys.exit(1)
+        org_id = orgs[0]["id"]
+        for rollup in rollups:
+            every = rollup["every"]
+            name = rollup_bucket(every)
+            days = rollup.get("retention_days", RETENTION_DAYS)
+            rules = [{"type": "expire", "everySeconds": int(days * 24 * 60 * 60)}] if days else []
+            buckets = call("GET", "/api/v2/buckets", params={"orgID": org_id, "name": name}).get("buckets", [])
+            if buckets:
+                call("PATCH", f"/api/v2/buckets/{buckets[0]['id']}", json={"retentionRules": rules})
+            else:
+                call("POST", "/api/v2/buckets", json={"orgID": org_id, "name": name, "retentionRules": rules})
+
+            flux = rollup_flux(every, percentiles=rollup.get("percentiles", ROLLUP_PERCENTILES))
+            tasks = call("GET", "/api/v2/tasks", params={"orgID": org_id, "name": name}).get("tasks", [])
+            if not tasks:
+                call("POST", "/api/v2/tasks", json={"orgID": org_id, "flux": flux, "status": "active"})
+            elif tasks[0].get("flux") != flux:
+                call("PATCH", f"/api/v2/tasks/{tasks[0]['id']}", json={"flux": flux, "status": "active"})
+            retention = f"{days}d" if days else "infinite"
+            print(f"✔ Rollup '{name}' every {every}, retention {retention}.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error connecting to InfluxDB at {base_url}: {str(e)}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     # pip install requests if needed
-    setup_influxdb_noauth()
+    if sys.argv[1:] == ["rollups"]:
+        # Only (re)create the rollups of an InfluxDB that is already set up.
+        wait_for_influxdb(f"http://{INFLUXDB_HOST}:{INFLUXDB_PORT}", READY_TIMEOUT)
+        setup_rollups()
+    else:
+        setup_influxdb_noauth()
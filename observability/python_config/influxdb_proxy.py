@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Caching query proxy between Grafana and InfluxDB.
+
+When many viewers open the same dashboards, every refresh runs the same Flux
+queries again. The proxy listens on `influxdb_proxy_port` and forwards
+everything to InfluxDB; POST /api/v2/query responses are cached:
+
+  - the absolute times Grafana puts into a query (v.timeRangeStart/Stop) are
+    rounded to a time bucket of `influxdb_proxy_resolution` times the query range
+    (between `influxdb_proxy_min_ttl_s` and `influxdb_proxy_max_ttl_s`), the start
+    down and the stop up, so viewers refreshing within the same bucket send the
+    same query and still get their whole range
+  - concurrent identical queries are coalesced into one upstream request
+  - results are kept in an LRU cache (`influxdb_proxy_cache_mb`) for one bucket,
+    or for `influxdb_proxy_max_ttl_s` when the range lies entirely in the past
+
+The cache key includes the token, so viewers only get results their token may
+read. Errors are not cached. Set `influxdb_proxy_url` to the address Grafana
+reaches the proxy at, and grafana_influxdb_datasource.py / grafana_provision.py
+point the datasource there instead of port 8086.
+
+Run as a script:
+    python3 influxdb_proxy.py
+"""
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http_session import make_session
+import calendar
+import threading
+import requests
+import hashlib
+import json
+import re
+import sys
+import os
+import time
+
+# Ensure we run in the script's own directory:
+os.chdir(sys.path[0])
+configfname = "config_data.json"
+
+try:
+    with open(configfname, 'r') as f:
+        config = json.load(f)
+except Exception as e:
+    print("Cannot read config data file:", e)
+    sys.exit(1)
+
+# -------------------------------
+# Configuration Variables
+# -------------------------------
+UPSTREAM_URL = config.get("influxdb_proxy_upstream", "http://" + config["address"] + ":8086")
+LISTEN_HOST = config.get("influxdb_proxy_host", "0.0.0.0")
+LISTEN_PORT = config.get("influxdb_proxy_port", 8087)
+RESOLUTION = config.get("influxdb_proxy_resolution", 0.01)    # time bucket as a fraction of the query range
+MIN_TTL = config.get("influxdb_proxy_min_ttl_s", 5)
+MAX_TTL = config.get("influxdb_proxy_max_ttl_s", 300)
+CACHE_MB = config.get("influxdb_proxy_cache_mb", 256)
+POOL_SIZE = config.get("influxdb_proxy_pool_size", 16)
+STATS_INTERVAL = config.get("influxdb_proxy_stats_interval_s", 60)
+
+# Headers that are not forwarded in either direction.
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding", "host",
+               "accept-encoding", "proxy-connection", "te", "upgrade"}
+TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z")
+
+
+# ------------------------------------------------------------------------------
+# QUERY NORMALIZATION
+# ------------------------------------------------------------------------------
+def parse_timestamp(text):
+    """Seconds since the epoch of an RFC 3339 UTC timestamp (fractions are dropped)."""
+    return calendar.timegm(time.strptime(text[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+def format_timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+def normalize_query(query, now=None, resolution=RESOLUTION, min_ttl=MIN_TTL, max_ttl=MAX_TTL):
+    """
+    Round the absolute times of a Flux query to its time bucket: the latest
+    (the range stop) up, all others down, so the rounded range still covers
+    the requested one. A single time is a start (with stop now()) and is
+    rounded down. Returns (normalized query, seconds its result may be cached).
+    """
+    now = time.time() if now is None else now
+    query = query.strip()
+    times = [parse_timestamp(t) for t in TIMESTAMP.findall(query)]
+    if not times:
+        # Relative ranges (e.g. -1h) change with every request: cache only briefly.
+        return query, min_ttl
+    stop = max(times)
+    span = stop - min(times)
+    bucket = max(1, int(min(max(span * resolution, min_ttl), max_ttl)))
+
+    def rounded(match):
+        text = match.group()
+        seconds = parse_timestamp(text)
+        if seconds == stop and span:
+            fraction = text[19:-1].strip(".0")
+            return format_timestamp(-((-seconds - bool(fraction)) // bucket) * bucket)
+        return format_timestamp(seconds // bucket * bucket)
+
+    query = TIMESTAMP.sub(rounded, query)
+    if max(times) < now - bucket:
+        return query, max_ttl                # the range is in the past, its data no longer changes
+    return query, bucket
+
+
+def normalize_request(path, params, headers, body):
+    """
+    Cache key, upstream body and TTL of a query request. The body is either
+    the JSON query object or plain Flux (application/vnd.flux).
+    """
+    content_type = headers.get("Content-Type", "")
+    if "json" in content_type:
+        request = json.loads(body or b"{}")
+        request["query"], ttl = normalize_query(request.get("query", ""))
+        body = json.dumps(request, sort_keys=True).encode()
+    else:
+        query, ttl = normalize_query(body.decode("utf-8"))
+        body = query.encode("utf-8")
+    digest = hashlib.sha256()
+    for part in (path, params, headers.get("Authorization", ""), headers.get("Accept", ""), content_type):
+        digest.update(part.encode() + b"\0")
+    digest.update(body)
+    return digest.hexdigest(), body, ttl
+
+
+# ------------------------------------------------------------------------------
+# CACHE
+# ------------------------------------------------------------------------------
+class QueryCache:
+    """
+    LRU cache of query responses with per-entry expiry, bounded in bytes.
+    get_or_load() runs one load per key at a time; concurrent callers of the
+    same key wait for it and share the result.
+    """
+
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()     # key -> (expires, response)
+        self.size = 0
+        self.inflight = {}               # key -> [event, response]
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "uncached": 0, "evicted": 0}
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def _remove(self, key):
+        _, response = self.entries.pop(key)
+        self.size -= len(response[2])
+
+    def _put(self, key, response, ttl):
+        if key in self.entries:
+            self._remove(key)
+        if len(response[2]) > self.max_bytes:
+            return
+        self.entries[key] = (time.monotonic() + ttl, response)
+        self.size += len(response[2])
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    def get_or_load(self, key, ttl, load):
+        """
+        The cached response for key, or load() (status, headers, body); only
+        200 responses are cached. Returns (response, "hit"/"coalesced"/"miss").
+        """
+        with self.lock:
+            response = self._get(key)
+            if response is not None:
+                self.stats["hits"] += 1
+                return response, "hit"
+            waiting = self.inflight.get(key)
+            if waiting is None:
+                slot = self.inflight[key] = [threading.Event(), None]
+        if waiting is not None:
+            waiting[0].wait()
+            if waiting[1] is not None:
+                with self.lock:
+                    self.stats["coalesced"] += 1
+                return waiting[1], "coalesced"
+            return load(), "miss"          # the shared load failed; try on our own
+
+        response = None
+        try:
+            response = load()
+        finally:
+            with self.lock:
+                self.stats["misses"] += 1
+                if response is not None and response[0] == 200:
+                    self._put(key, response, ttl)
+                    slot[1] = response
+                del self.inflight[key]
+            slot[0].set()
+        return response, "miss"
+
+
+# ------------------------------------------------------------------------------
+# PROXY
+# ------------------------------------------------------------------------------
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive connections from Grafana
+    upstream = UPSTREAM_URL
+    http = None
+    cache = None
+
+    def log_message(self, format, *args):
+        pass                            # one line per request is too much during a workshop
+
+    def forward(self, method, body):
+        """Send the request to InfluxDB. Returns (status, headers, body)."""
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+        try:
+            resp = self.http.request(method, self.upstream + self.path, headers=headers, data=body, timeout=120)
+        except requests.exceptions.RequestException as e:
+            return 502, [("Content-Type", "text/plain")], f"InfluxDB unreachable: {e}".encode()
+        return resp.status_code, [(k, v) for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS], \
+            resp.content
+
+    def respond(self, response, result=None):
+        status, headers, body = response
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if result:
+            self.send_header("X-Cache", result)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def handle_any(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path, _, params = self.path.partition("?")
+        try:
+            if self.command != "POST" or path != "/api/v2/query":
+                raise ValueError("not a query")
+            key, body, ttl = normalize_request(path, params, self.headers, body)
+        except (ValueError, UnicodeDecodeError):
+            with self.cache.lock:
+                self.cache.stats["uncached"] += 1
+            self.respond(self.forward(self.command, body))
+            return
+        response, result = self.cache.get_or_load(key, ttl, lambda: self.forward("POST", body))
+        self.respond(response, result)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = handle_any
+
+
+def report_stats(cache, interval):
+    """Print the cache figures every `interval` seconds."""
+    while True:
+        time.sleep(interval)
+        with cache.lock:
+            stats, entries, size = dict(cache.stats), len(cache.entries), cache.size
+        queries = stats["hits"] + stats["coalesced"] + stats["misses"]
+        served = (stats["hits"] + stats["coalesced"]) / queries * 100 if queries else 0.0
+        print(f"[proxy] {queries} queries, {served:.0f}% served without InfluxDB (hits {stats['hits']}, "
+              f"coalesced {stats['coalesced']}, misses {stats['misses']}), {stats['uncached']} passed through, "
+              f"{entries} entries / {size / 1e6:.1f} MB cached, {stats['evicted']} evicted")
+
+
+def make_server(host=LISTEN_HOST, port=LISTEN_PORT, upstream=UPSTREAM_URL, cache=None):
+    """A threading HTTP server proxying to `upstream`, with its own cache and connection pool."""
+    handler = type("Handler", (ProxyHandler,), {
+        "upstream": upstream.rstrip("/"),
+        "http": make_session(pool_size=POOL_SIZE, retries=0),
+        "cache": cache or QueryCache(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    server = make_server()
+    print(f"Caching InfluxDB queries on {LISTEN_HOST}:{LISTEN_PORT} for {UPSTREAM_URL}")
+    threading.Thread(target=report_stats, args=(server.RequestHandlerClass.cache, STATS_INTERVAL), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping proxy...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
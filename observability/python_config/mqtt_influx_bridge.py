@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+MQTT -> InfluxDB bridge for the visual container.
+
+Subscribes to the configured MQTT topics, converts every message to InfluxDB
+line protocol and writes them to the configured bucket in gzip-compressed
+batches bounded by size and time. While InfluxDB is unreachable, batches go
+to a bounded spool (memory first, then disk) and are re-sent oldest first
+once writes succeed again. A full input queue blocks the MQTT network thread,
+so backpressure reaches the broker instead of growing memory.
+
+Payloads:
+  - a JSON object: numeric, boolean and string members become fields;
+    optional "time" (ns since epoch, or float seconds) and "tags" (object) members
+  - a bare number: stored as field "value"
+  - a binary batch of telemetry_codec.py: one point per sample, with the
+    measurement and tags of its schema (learned from '<topic>/$schema')
+The measurement is `bridge_measurement` if set, else the first topic level
+(or the schema's measurement); the full topic is stored as tag "topic".
+With `bridge_republish_prefix` set, decoded binary samples are also
+published as JSON on '<prefix>/<topic>' for the Grafana MQTT datasource.
+Requires the paho-mqtt package.
+"""
+from collections import deque
+from http_session import make_session
+from telemetry_codec import SCHEMA_SUFFIX, Decoder, is_batch
+import threading
+import requests
+import queue
+import gzip
+import json
+import math
+import sys
+import os
+import time
+
+# Ensure we run in the script's own directory:
+os.chdir(sys.path[0])
+configfname = "config_data.json"
+
+try:
+    with open(configfname, 'r') as f:
+        config = json.load(f)
+except Exception as e:
+    print("Cannot read config data file:", e)
+    sys.exit(1)
+
+# -------------------------------
+# Configuration Variables
+# -------------------------------
+MQTT_HOST = config["address"]
+MQTT_PORT = config.get("bridge_mqtt_port", 1883)
+MQTT_TOPICS = config.get("bridge_topics", ["#"])
+MQTT_QOS = config.get("bridge_qos", 0)
+
+INFLUXDB_URL = "http://" + config["address"] + ":8086"
+INFLUXDB_ORG = config["influxdb_org"]
+INFLUXDB_BUCKET = config.get("bridge_bucket", config["influxdb_bucket"])
+INFLUXDB_TOKEN = config["influxdb_token"]
+
+MEASUREMENT = config.get("bridge_measurement")          # None: first topic level
+BATCH_SIZE = config.get("bridge_batch_size", 5000)         # lines per write
+FLUSH_INTERVAL = config.get("bridge_flush_interval_s", 1.0)  # max age of a batch
+QUEUE_SIZE = config.get("bridge_queue_size", 100000)       # messages buffered before backpressure
+SPOOL_DIR = config.get("bridge_spool_dir", "bridge_spool")
+SPOOL_MEMORY_BATCHES = config.get("bridge_spool_memory_batches", 64)
+SPOOL_MAX_MB = config.get("bridge_spool_max_mb", 512)
+STATS_INTERVAL = config.get("bridge_stats_interval_s", 10)
+# JSON numbers are written as floats, like Telegraf does, so that 1 and 1.5 do not
+# give one field two types; the fields listed here are written as integers instead.
+INTEGER_FIELDS = frozenset(config.get("bridge_integer_fields", []))
+REPUBLISH_PREFIX = config.get("bridge_republish_prefix", "")  # "": do not republish decoded samples
+
+
+# ------------------------------------------------------------------------------
+# LINE PROTOCOL
+# ------------------------------------------------------------------------------
+_MEASUREMENT_ESCAPES = str.maketrans({",": "\\,", " ": "\\ "})
+_TAG_ESCAPES = str.maketrans({",": "\\,", "=": "\\=", " ": "\\ "})
+
+
+def format_field(value, integer=False):
+    """
+    Format a Python value as a line protocol field value (None if unsupported).
+    Numbers are written as floats unless `integer` is set.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if integer and isinstance(value, (int, float)):
+        return f"{int(value)}i" if math.isfinite(value) else None
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return repr(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return None
+
+
+def to_line(measurement, tags, fields, timestamp_ns, integers=INTEGER_FIELDS):
+    """
+    Build one line protocol line; returns None if there are no valid fields.
+    Fields named in `integers` are written as integers, other numbers as floats.
+    """
+    field_str = ",".join(
+        f"{key.translate(_TAG_ESCAPES)}={formatted}"
+        for key, formatted in ((k, format_field(v, k in integers)) for k, v in fields.items())
+        if formatted is not None
+    )
+    if not field_str:
+        return None
+    tag_str = "".join(
+        f",{str(k).translate(_TAG_ESCAPES)}={str(v).translate(_TAG_ESCAPES)}"
+        for k, v in sorted(tags.items()) if v != ""
+    )
+    return f"{measurement.translate(_MEASUREMENT_ESCAPES)}{tag_str} {field_str} {timestamp_ns}"
+
+
+def to_timestamp_ns(value, default_ns):
+    """Interpret a payload timestamp: ints as ns since epoch, floats as seconds."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default_ns
+    if isinstance(value, float):
+        return int(value * 1e9)
+    return value
+
+
+def payload_to_lines(topic, payload, received_ns, measurement=MEASUREMENT):
+    """Convert one MQTT message to a list of line protocol lines (empty if not convertible)."""
+    try:
+        data = json.loads(payload)
+    except (ValueError, UnicodeDecodeError):
+        return []
+    name = measurement or topic.split("/", 1)[0] or "mqtt"
+    tags = {"topic": topic}
+    if isinstance(data, dict):
+        extra_tags = data.pop("tags", None)
+        if isinstance(extra_tags, dict):
+            tags.update(extra_tags)
+        timestamp_ns = to_timestamp_ns(data.pop("time", None), received_ns)
+        line = to_line(name, tags, data, timestamp_ns)
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        line = to_line(name, tags, {"value": data}, received_ns)
+    else:
+        line = None
+    return [line] if line else []
+
+
+class TelemetryConverter:
+    """
+    Message converter that decodes telemetry_codec batches (and learns their
+    schemas) and hands every other payload to payload_to_lines.
+    republish(topic, samples), if set, is called with the decoded samples.
+    """
+
+    def __init__(self, measurement=MEASUREMENT, republish=None):
+        self.decoder = Decoder()
+        self.measurement = measurement
+        self.republish = republish
+
+    def __call__(self, topic, payload, received_ns):
+        if not (is_batch(payload) or topic.endswith(SCHEMA_SUFFIX)):
+            return payload_to_lines(topic, payload, received_ns, self.measurement)
+        samples = self.decoder.feed(topic, payload)
+        if not samples:
+            return []
+        if self.republish is not None:
+            self.republish(topic, samples)
+        lines = []
+        for name, tags, fields, timestamp_ns in samples:
+            line = to_line(self.measurement or name, dict(tags, topic=topic), fields, timestamp_ns)
+            if line:
+                lines.append(line)
+        return lines
+
+
+# ------------------------------------------------------------------------------
+# SPOOL
+# ------------------------------------------------------------------------------
+class Spool:
+    """
+    Bounded FIFO of compressed batches that could not be written. The newest
+    batches stay in memory; older ones overflow to files in `directory`. When
+    the disk budget is exceeded the oldest batch is dropped.
+    """
+
+    def __init__(self, directory, memory_batches, max_bytes):
+        self.directory = directory
+        self.memory = deque()
+        self.memory_batches = memory_batches
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        self.files = deque(sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".gz")))
+        self.disk_bytes = sum(os.path.getsize(f) for f in self.files)
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.memory) + len(self.files)
+
+    def push(self, body):
+        self.memory.append(body)
+        while len(self.memory) > self.memory_batches:
+            self._to_disk(self.memory.popleft())
+
+    def _to_disk(self, body):
+        self.seq += 1
+        path = os.path.join(self.directory, f"{time.time_ns():020d}-{self.seq:06d}.gz")
+        with open(path, "wb") as f:
+            f.write(body)
+        self.files.append(path)
+        self.disk_bytes += len(body)
+        while self.disk_bytes > self.max_bytes and self.files:
+            oldest = self.files.popleft()
+            self.disk_bytes -= os.path.getsize(oldest)
+            os.remove(oldest)
+            self.dropped += 1
+
+    def persist(self):
+        """Move the in-memory batches to disk (on shutdown)."""
+        while self.memory:
+            self._to_disk(self.memory.popleft())
+
+    def peek(self):
+        """Oldest spooled batch, or None."""
+        if self.files:
+            with open(self.files[0], "rb") as f:
+                return f.read()
+        return self.memory[0] if self.memory else None
+
+    def pop(self):
+        """Remove the batch returned by the last peek()."""
+        if self.files:
+            oldest = self.files.popleft()
+            self.disk_bytes -= os.path.getsize(oldest)
+            os.remove(oldest)
+        elif self.memory:
+            self.memory.popleft()
+
+
+# ------------------------------------------------------------------------------
+# BRIDGE
+# ------------------------------------------------------------------------------
+class Bridge:
+    """Batches converted messages and writes them to InfluxDB from a single writer thread."""
+
+    def __init__(self, influx_url=INFLUXDB_URL, org=INFLUXDB_ORG, bucket=INFLUXDB_BUCKET, token=INFLUXDB_TOKEN,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE,
+                 spool=None, convert=payload_to_lines):
+        self.write_url = f"{influx_url}/api/v2/write"
+        self.params = {"org": org, "bucket": bucket, "precision": "ns"}
+        # No HTTP-level retries: failed batches go to the spool instead of blocking the writer.
+        self.http = make_session(retries=0, headers={"Authorization": f"Token {token}",
+                                                     "Content-Encoding": "gzip",
+                                                     "Content-Type": "text/plain; charset=utf-8"})
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.spool = spool if spool is not None else Spool(SPOOL_DIR, SPOOL_MEMORY_BATCHES, SPOOL_MAX_MB * 1024 * 1024)
+        self.convert = convert
+        self.running = True
+        self.next_retry = 0.0
+        self.stats = {"received": 0, "invalid": 0, "points": 0, "batches": 0,
+                      "bytes_sent": 0, "write_errors": 0, "rejected": 0, "lag_ms": 0.0}
+        self.thread = threading.Thread(target=self.run, name="influx-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, topic, payload):
+        """Queue one message (called from the MQTT network thread; blocks when the queue is full)."""
+        self.queue.put((topic, payload, time.time_ns()))
+
+    def submit_stats(self):
+        """Queue a line with the bridge's own metrics."""
+        self.queue.put((None, None, time.time_ns()))
+
+    def stop(self):
+        """Flush pending messages and keep unsent batches on disk for the next run."""
+        self.running = False
+        self.thread.join()
+        self.spool.persist()
+
+    def write(self, body):
+        """
+        POST one compressed batch. Returns True when the batch is done with:
+        written, or rejected for good (any 4xx but 429, e.g. 400 malformed data
+        or 422 field type conflict / outside retention), which is logged and
+        dropped. Returns False on 429, 5xx and connection errors, to spool it.
+        """
+        try:
+            resp = self.http.post(self.write_url, params=self.params, data=body, timeout=10)
+        except requests.exceptions.RequestException:
+            return False
+        if resp.status_code == 204:
+            return True
+        if 400 <= resp.status_code < 500 and resp.status_code != 429:
+            # Rejected data will never be accepted, don't spool it.
+            self.stats["rejected"] += 1
+            print(f"⚠ InfluxDB rejected a batch ({resp.status_code}), dropping it: {resp.text[:200]}")
+            return True
+        return False
+
+    def flush(self, lines, oldest_ns):
+        body = gzip.compress("\n".join(lines).encode("utf-8"), compresslevel=1)
+        # Drain the spool first to keep the points in order.
+        self.retry_spool()
+        rejected = self.stats["rejected"]
+        if len(self.spool) or not self.write(body):
+            self.stats["write_errors"] += 1
+            self.spool.push(body)
+            return
+        if self.stats["rejected"] != rejected:
+            return
+        self.stats["points"] += len(lines)
+        self.stats["batches"] += 1
+        self.stats["bytes_sent"] += len(body)
+        self.stats["lag_ms"] = (time.time_ns() - oldest_ns) / 1e6
+
+    def run(self):
+        lines, oldest_ns, deadline = [], 0, None
+        get, convert, stats = self.queue.get, self.convert, self.stats
+        while self.running or not self.queue.empty() or lines:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline else 0.5
+            try:
+                topic, payload, received_ns = get(timeout=timeout)
+            except queue.Empty:
+                if not lines and len(self.spool):
+                    self.retry_spool()    # idle: re-send spooled batches
+            else:
+                if topic is None:
+                    converted = [self.stats_line()]
+                else:
+                    stats["received"] += 1
+                    try:
+                        converted = convert(topic, payload, received_ns)
+                    except Exception as e:
+                        # A malformed payload must not stop the writer thread.
+                        print(f"⚠ Cannot convert message on '{topic}': {e!r}")
+                        converted = None
+                    if not converted:
+                        stats["invalid"] += 1
+                if converted:
+                    if not lines:
+                        oldest_ns = received_ns
+                        deadline = time.monotonic() + self.flush_interval
+                    lines.extend(converted)
+            if lines and (len(lines) >= self.batch_size or time.monotonic() >= deadline
+                          or (not self.running and self.queue.empty())):
+                self.flush(lines, oldest_ns)
+                lines, deadline = [], None
+
+    def retry_spool(self):
+        """Re-send spooled batches oldest first; after a failure, wait a few seconds before trying again."""
+        if time.monotonic() < self.next_retry:
+            return
+        while len(self.spool):
+            if not self.write(self.spool.peek()):
+                self.next_retry = time.monotonic() + 5
+                return
+            self.spool.pop()
+
+    def stats_line(self):
+        """Bridge metrics as a line protocol line, written alongside the data."""
+        fields = dict(self.stats, queue_depth=self.queue.qsize(), spooled=len(self.spool), dropped=self.spool.dropped)
+        integers = {k for k, v in fields.items() if isinstance(v, int)}
+        return to_line("mqtt_bridge", {}, fields, time.time_ns(), integers)
+
+
+def report_stats(bridge, interval):
+    """Print throughput/lag every `interval` seconds and store the figures in InfluxDB."""
+    last, last_t = dict(bridge.stats), time.monotonic()
+    while bridge.running:
+        time.sleep(interval)
+        now = time.monotonic()
+        stats = dict(bridge.stats)
+        rate_in = (stats["received"] - last["received"]) / (now - last_t)
+        rate_out = (stats["points"] - last["points"]) / (now - last_t)
+        print(f"[bridge] in {rate_in:,.0f} msg/s, out {rate_out:,.0f} points/s, lag {stats['lag_ms']:.0f} ms, "
+              f"queue {bridge.queue.qsize()}, spooled {len(bridge.spool)}, dropped {bridge.spool.dropped}, "
+              f"invalid {stats['invalid']}, rejected {stats['rejected']}")
+        bridge.submit_stats()
+        last, last_t = stats, now
+
+
+def main():
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        print("Error: the 'paho-mqtt' package is required (pip install paho-mqtt).")
+        sys.exit(1)
+
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="influx-bridge")
+    except AttributeError:        # paho-mqtt < 2.0
+        client = mqtt.Client(client_id="influx-bridge")
+
+    def republish(topic, samples):
+        for _, _, fields, timestamp_ns in samples:
+            client.publish(f"{REPUBLISH_PREFIX}/{topic}", json.dumps(dict(fields, time=timestamp_ns // 1_000_000)))
+
+    bridge = Bridge(convert=TelemetryConverter(republish=republish if REPUBLISH_PREFIX else None)).start()
+
+    def on_connect(client, userdata, flags, *args):
+        print(f"Connected to MQTT broker {MQTT_HOST}:{MQTT_PORT}, subscribing to {MQTT_TOPICS}")
+        client.subscribe([(topic, MQTT_QOS) for topic in MQTT_TOPICS])
+
+    def on_message(client, userdata, msg):
+        if REPUBLISH_PREFIX and msg.topic.startswith(REPUBLISH_PREFIX + "/"):
+            return                    # our own republished samples
+        bridge.submit(msg.topic, msg.payload)
+
+    client.username_pw_set(config["mqtt_user"], config["mqtt_psw"])
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(MQTT_HOST, MQTT_PORT)
+
+    threading.Thread(target=report_stats, args=(bridge, STATS_INTERVAL), daemon=True).start()
+    try:
+        client.loop_forever()
+    except KeyboardInterrupt:
+        print("Stopping bridge...")
+    finally:
+        client.disconnect()
+        bridge.stop()
+
+
+if __name__ == "__main__":
+    main()
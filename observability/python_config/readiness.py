@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Readiness probes for the services of the visual container.
+
+Each wait_for_* function polls its service with exponential backoff until it
+reports ready, and exits the script if that does not happen before the
+deadline. Probes use plain one-off requests so that the retry policy of a
+shared session does not stretch the backoff schedule.
+
+Run as a script to wait for all services at the configured address.
+"""
+import requests
+import socket
+import json
+import sys
+import os
+import time
+
+# Default overall deadline for a service to become ready.
+DEFAULT_TIMEOUT = 120
+# Timeout of a single probe attempt.
+PROBE_TIMEOUT = 2
+
+
+def wait_until(probe, name, timeout=DEFAULT_TIMEOUT, initial_delay=0.1, max_delay=5.0):
+    """
+    Call probe() until it returns True, sleeping with exponential backoff
+    (initial_delay doubling up to max_delay) between attempts.
+    Exits with status 1 if the service is not ready after `timeout` seconds.
+    Returns the time waited.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            if probe():
+                waited = time.monotonic() - start
+                if attempts > 1:
+                    print(f"{name} is ready (after {waited:.1f}s).")
+                return waited
+        except (requests.exceptions.RequestException, OSError, ValueError):
+            pass
+        now = time.monotonic()
+        if now >= deadline:
+            print(f"Error: {name} not ready after {timeout}s ({attempts} attempts).")
+            sys.exit(1)
+        if attempts == 1:
+            print(f"Waiting for {name} to become ready...")
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * 2, max_delay)
+
+
+def wait_for_influxdb(base_url, timeout=DEFAULT_TIMEOUT):
+    """Wait until InfluxDB's /health endpoint reports status 'pass'."""
+    def probe():
+        resp = requests.get(f"{base_url}/health", timeout=PROBE_TIMEOUT)
+        return resp.status_code == 200 and resp.json().get("status") == "pass"
+    return wait_until(probe, f"InfluxDB at {base_url}", timeout)
+
+
+def wait_for_grafana(base_url, timeout=DEFAULT_TIMEOUT):
+    """Wait until Grafana's /api/health endpoint reports its database as 'ok'."""
+    def probe():
+        resp = requests.get(f"{base_url}/api/health", timeout=PROBE_TIMEOUT)
+        return resp.status_code == 200 and resp.json().get("database") == "ok"
+    return wait_until(probe, f"Grafana at {base_url}", timeout)
+
+
+def wait_for_tcp(host, port, name=None, timeout=DEFAULT_TIMEOUT):
+    """Wait until a TCP connection to host:port can be opened (e.g. Mosquitto's websocket port 9001)."""
+    def probe():
+        with socket.create_connection((host, port), timeout=PROBE_TIMEOUT):
+            return True
+    return wait_until(probe, name or f"{host}:{port}", timeout)
+
+
+if __name__ == "__main__":
+    # Ensure we run in the script's own directory:
+    os.chdir(sys.path[0])
+    try:
+        with open("config_data.json", 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print("Cannot read config data file:", e)
+        sys.exit(1)
+    timeout = config.get("readiness_timeout_s", DEFAULT_TIMEOUT)
+    wait_for_influxdb("http://" + config["address"] + ":8086", timeout)
+    wait_for_grafana("http://" + config["address"] + ":3000", timeout)
+    wait_for_tcp(config["address"], 9001, "Mosquitto (websocket)", timeout)
+    print("All services are ready.")
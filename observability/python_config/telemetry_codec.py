@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Compact binary telemetry over MQTT.
+
+JSON samples such as {"time": 1718000000.123456, "rtt_ms": 12.3, ...} cost
+around 100 bytes each on the uplink that is being measured. Here the field
+names and types are sent once per topic, as a schema, and the samples are
+sent in batches of fixed-width records:
+
+  schema    retained JSON message on '<topic>/$schema':
+            {"id", "measurement", "tags", "resolution_ns", "fields": [[name, type, scale], ...]}
+            type is a struct code (b B h H i I q Q e f d ?); with a scale, the
+            value is stored as round(value * scale) and divided on decoding.
+            A missing float field is sent as NaN and left out on decoding; a
+            missing integer or bool field is sent as 0 and cannot be told
+            apart from a real 0, so use a float type for fields that may be
+            missing
+  batch     message on '<topic>':
+            magic 0xB7, flags (bit 0: zlib), schema id (uint32), sample count
+            (uint16), first timestamp (int64, in resolution_ns units), then per
+            sample the time since the previous sample as a varint followed by
+            the packed fields. Timestamps are truncated to resolution_ns; two
+            samples in the same tick get the same timestamp, and InfluxDB keeps
+            only one of them, so pick a resolution finer than the sample rate
+
+0xB7 cannot start UTF-8 text, so batches are told apart from JSON payloads
+by their first byte. With 50 samples per batch a sample typically takes
+10-20 bytes.
+
+Publisher side (UE containers; standard library, plus paho-mqtt for connect()):
+
+    schema = Schema("rtt", [("rtt_ms", "f"), ("seq", "I"), ("rsrp", "h", 10)], tags={"node": "ue-1"})
+    publisher = Publisher(connect("10.0.0.5", 1883, "admin", "secret"), "rtt/ue-1", schema)
+    publisher.publish({"rtt_ms": 12.3, "seq": 17, "rsrp": -95.5})
+    publisher.close()
+
+Visual side: Decoder turns messages back into (measurement, tags, fields,
+timestamp_ns) samples; mqtt_influx_bridge.py uses it for binary payloads.
+
+Run as a script to compare the encoded size with JSON for a sample schema.
+"""
+import threading
+import struct
+import zlib
+import json
+import time
+
+MAGIC = 0xB7
+FLAG_ZLIB = 0x01
+HEADER = struct.Struct("<BBIHq")
+SCHEMA_SUFFIX = "/$schema"
+FIELD_TYPES = set("bBhHiIqQefd?")
+
+
+# ------------------------------------------------------------------------------
+# SCHEMA
+# ------------------------------------------------------------------------------
+class Schema:
+    """Field names, types and scales of one kind of sample, plus static tags."""
+
+    def __init__(self, measurement, fields, tags=None, resolution_ns=1000):
+        self.measurement = measurement
+        self.fields = [(f[0], f[1], f[2] if len(f) > 2 else None) for f in fields]
+        for name, code, _ in self.fields:
+            if code not in FIELD_TYPES:
+                raise ValueError(f"unsupported type '{code}' of field '{name}'")
+        self.tags = dict(tags or {})
+        self.resolution_ns = int(resolution_ns)
+        self.record = struct.Struct("<" + "".join(code for _, code, _ in self.fields))
+        definition = json.dumps([measurement, self.fields, self.tags, self.resolution_ns], sort_keys=True)
+        self.id = zlib.crc32(definition.encode())
+
+    def to_json(self):
+        return json.dumps({"id": self.id, "measurement": self.measurement, "tags": self.tags,
+                           "resolution_ns": self.resolution_ns, "fields": self.fields})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        schema = cls(data["measurement"], data["fields"], data.get("tags"), data.get("resolution_ns", 1000))
+        if schema.id != data["id"]:
+            raise ValueError("schema id does not match its definition")
+        return schema
+
+    def pack(self, sample):
+        values = []
+        for name, code, scale in self.fields:
+            value = sample.get(name)
+            if value is None:
+                value = float("nan") if code in "efd" else 0
+            elif scale:
+                value = round(value * scale)
+            elif code not in "efd?":
+                value = int(value)
+            values.append(value)
+        return self.record.pack(*values)
+
+    def unpack(self, data, offset):
+        values = self.record.unpack_from(data, offset)
+        return {name: (value / scale if scale else value)
+                for (name, _, scale), value in zip(self.fields, values)
+                if value == value}           # NaN: missing value
+
+
+# ------------------------------------------------------------------------------
+# ENCODING
+# ------------------------------------------------------------------------------
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def _read_varint(data, offset):
+    shift = n = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("truncated varint")
+        byte = data[offset]
+        offset += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, offset
+        shift += 7
+
+
+def encode_batch(schema, samples, compress=True):
+    """
+    Encode [(timestamp_ns, sample dict), ...] in time order as one message;
+    raises ValueError for samples out of order. The zlib-compressed body is
+    used only when it is smaller.
+    """
+    if not samples or len(samples) > 0xFFFF:
+        raise ValueError("a batch holds 1 to 65535 samples")
+    ticks = [ts // schema.resolution_ns for ts, _ in samples]
+    body = bytearray()
+    previous = ticks[0]
+    for tick, (_, sample) in zip(ticks, samples):
+        if tick < previous:
+            raise ValueError("samples of a batch must be in time order")
+        body += _varint(tick - previous)
+        body += schema.pack(sample)
+        previous = tick
+    flags = 0
+    if compress:
+        packed = zlib.compress(bytes(body), 9)
+        if len(packed) < len(body):
+            body, flags = packed, FLAG_ZLIB
+    return HEADER.pack(MAGIC, flags, schema.id, len(samples), ticks[0]) + bytes(body)
+
+
+def is_batch(payload):
+    return len(payload) >= HEADER.size and payload[0] == MAGIC
+
+
+class Decoder:
+    """Schemas learned from '<topic>/$schema' messages, and decoding of batches."""
+
+    def __init__(self):
+        self.schemas = {}
+        self.lock = threading.Lock()
+
+    def add_schema(self, schema):
+        with self.lock:
+            self.schemas[schema.id] = schema
+
+    def feed(self, topic, payload):
+        """
+        Handle one MQTT message. Returns a list of (measurement, tags, fields,
+        timestamp_ns), [] for a schema message, or None if the payload is not
+        a batch or its schema is unknown. Raises ValueError for a truncated or
+        corrupt batch.
+        """
+        if topic.endswith(SCHEMA_SUFFIX):
+            try:
+                self.add_schema(Schema.from_json(payload))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠ Invalid telemetry schema on '{topic}': {e}")
+            return []
+        if not is_batch(payload):
+            return None
+        _, flags, schema_id, count, tick = HEADER.unpack_from(payload)
+        schema = self.schemas.get(schema_id)
+        if schema is None:
+            return None
+        body = payload[HEADER.size:]
+        if flags & FLAG_ZLIB:
+            try:
+                body = zlib.decompress(body)
+            except zlib.error as e:
+                raise ValueError(f"corrupt batch body: {e}") from None
+        samples, offset = [], 0
+        for _ in range(count):
+            delta, offset = _read_varint(body, offset)
+            if offset + schema.record.size > len(body):
+                raise ValueError(f"truncated batch: {len(samples)} of {count} samples")
+            tick += delta
+            samples.append((schema.measurement, schema.tags, schema.unpack(body, offset), tick * schema.resolution_ns))
+            offset += schema.record.size
+        return samples
+
+
+# ------------------------------------------------------------------------------
+# PUBLISHER
+# ------------------------------------------------------------------------------
+def connect(host, port=1883, username=None, password=None, client_id=""):
+    """A connected paho-mqtt client with its network loop running (requires paho-mqtt)."""
+    import paho.mqtt.client as mqtt
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    except AttributeError:        # paho-mqtt < 2.0
+        client = mqtt.Client(client_id=client_id)
+    if username:
+        client.username_pw_set(username, password)
+    client.connect(host, port)
+    client.loop_start()
+    return client
+
+
+class Publisher:
+    """
+    Batches samples of one schema and publishes them to `topic` when
+    `batch_size` samples are queued or the oldest is `max_delay` seconds old.
+    The schema is published (retained) on '<topic>/$schema' first.
+    """
+
+    def __init__(self, client, topic, schema, batch_size=50, max_delay=1.0, qos=0, compress=True):
+        self.client = client
+        self.topic = topic
+        self.schema = schema
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.qos = qos
+        self.compress = compress
+        self.pending = []
+        self.deadline = None
+        self.lock = threading.Lock()
+        self.stats = {"samples": 0, "messages": 0, "bytes": 0}
+        self.running = True
+        client.publish(topic + SCHEMA_SUFFIX, schema.to_json(), qos=1, retain=True)
+        self.thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+        self.thread.start()
+
+    def publish(self, sample, timestamp_ns=None):
+        """Queue one sample (a dict of field values), stamped now unless a timestamp is given."""
+        with self.lock:
+            if not self.pending:
+                self.deadline = time.monotonic() + self.max_delay
+            self.pending.append((time.time_ns() if timestamp_ns is None else timestamp_ns, sample))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        self.pending.sort(key=lambda entry: entry[0])     # samples given a timestamp may arrive out of order
+        payload = encode_batch(self.schema, self.pending, self.compress)
+        self.client.publish(self.topic, payload, qos=self.qos)
+        self.stats["samples"] += len(self.pending)
+        self.stats["messages"] += 1
+        self.stats["bytes"] += len(payload)
+        self.pending, self.deadline = [], None
+
+    def _run(self):
+        while self.running:
+            time.sleep(min(self.max_delay, 0.1))
+            with self.lock:
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    self._flush()
+
+    def close(self):
+        """Publish the pending samples and stop the flush thread."""
+        self.running = False
+        self.thread.join()
+        self.flush()
+
+
+if __name__ == "__main__":
+    import random
+    schema = Schema("rtt", [("rtt_ms", "f"), ("seq", "I"), ("rsrp", "h", 10), ("sinr", "h", 10), ("ok", "?")],
+                    tags={"node": "ue-1"})
+    start = time.time_ns()
+    samples = [(start + i * 10_000_000 + random.randint(0, 500_000),
+                {"rtt_ms": random.uniform(8, 30), "seq": i, "rsrp": round(random.uniform(-110, -80), 1),
+                 "sinr": round(random.uniform(0, 30), 1), "ok": True}) for i in range(1000)]
+    as_json = sum(len(json.dumps(dict(s, time=ts / 1e9))) for ts, s in samples)
+    for batch_size in (1, 10, 50, 200):
+        size = sum(len(encode_batch(schema, samples[i:i + batch_size])) for i in range(0, len(samples), batch_size))
+        print(f"batch {batch_size:4d}: {size / len(samples):6.1f} bytes/sample vs JSON {as_json / len(samples):.1f} "
+              f"({as_json / size:.1f}x smaller)")
@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
 
-import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import sys
 import os
+import time
 
-# List your scripts in the order you want them to run:
+os.chdir(sys.path[0])            # Set current directory to script directory
+
+import influxdb_init
+import grafana_init
+import grafana_influxdb_datasource
+import grafana_mqtt_datasource
+import grafana_restore
+from http_session import make_session
+
+# List the scripts you want to run. They run in-process, in dependency order,
+# with independent steps (e.g. InfluxDB setup and the Grafana password change)
+# running concurrently.
 scripts_to_run = [
     "influxdb_init.py",
     "grafana_init.py",
@@ -13,30 +25,92 @@ scripts_to_run = [
     "grafana_restore.py"
 ]
 
-os.chdir(sys.path[0])            # Set current directory to script directory
+# Script -> (entry point taking the service session, service, scripts it depends on).
+# Dependencies on scripts that are not selected are ignored.
+STEPS = {
+    "influxdb_init.py":               (influxdb_init.setup_influxdb_noauth, "influxdb", []),
+    "grafana_init.py":                (grafana_init.main, "grafana", []),
+    "grafana_influxdb_datasource.py": (grafana_influxdb_datasource.main, "grafana",
+                                       ["influxdb_init.py", "grafana_init.py"]),
+    "grafana_mqtt_datasource.py":     (grafana_mqtt_datasource.main, "grafana", ["grafana_init.py"]),
+    "grafana_restore.py":             (grafana_restore.main, "grafana",
+                                       ["grafana_influxdb_datasource.py", "grafana_mqtt_datasource.py"]),
+}
+
+
+def run_step(script_name, sessions):
+    """
+    Run one setup step in this process. Returns (start, end) times.
+    A step that calls sys.exit() propagates SystemExit to the caller.
+    """
+    func, service, _ = STEPS[script_name]
+    print(f"\n=== Running {script_name} ===")
+    start = time.perf_counter()
+    func(sessions[service])
+    end = time.perf_counter()
+    print(f"=== Completed {script_name} ({end - start:.2f}s) ===\n")
+    return start, end
 
 
-def run_script(script_name):
+def run_steps(selected, sessions):
     """
-    Run a Python script in the same directory as this file.
-    Raises an error if the script fails (non-zero exit).
+    Run the selected steps as a dependency graph: every step starts as soon as
+    the steps it depends on have completed. Exits on the first failing step,
+    after letting the steps already running finish.
     """
-    script_path = script_name
-    print(f"\n=== Running {script_path} ===")
-    try:
-        # Call with the same Python interpreter running this file
-        subprocess.run([sys.executable, script_path], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {script_name} exited with return code {e.returncode}")
-        sys.exit(e.returncode)
-    except FileNotFoundError:
-        print(f"Error: Could not find script {script_name} at {script_path}")
-        sys.exit(1)
-    print(f"=== Completed {script_name} ===\n")
+    for script_name in selected:
+        if script_name not in STEPS:
+            print(f"Error: Unknown script {script_name}")
+            sys.exit(1)
+    deps = {name: [d for d in STEPS[name][2] if d in selected] for name in selected}
+    timings = {}
+    done, running, failure = set(), {}, None
+
+    with ThreadPoolExecutor(max_workers=len(selected)) as pool:
+        while len(done) < len(selected):
+            if failure is None:
+                for name in selected:
+                    if name not in done and name not in running.values() and all(d in done for d in deps[name]):
+                        running[pool.submit(run_step, name, sessions)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                    done.add(name)
+                except SystemExit as e:
+                    print(f"Error: {name} exited with return code {e.code}")
+                    failure = failure or (e.code or 1)
+                except Exception as e:
+                    print(f"Error: {name} failed: {e}")
+                    failure = failure or 1
+            if failure is not None and not running:
+                break
+
+    return timings, failure
+
+
+def print_timings(timings, t0, wall):
+    """Print the per-step timing breakdown."""
+    print("Step timings:")
+    for name, (start, end) in sorted(timings.items(), key=lambda kv: kv[1][0]):
+        print(f"  {name:<32} start +{start - t0:6.2f}s  duration {end - start:6.2f}s")
+    total = sum(end - start for start, end in timings.values())
+    print(f"  Wall time {wall:.2f}s (sum of steps {total:.2f}s)")
 
 
 if __name__ == "__main__":
-    for script in scripts_to_run:
-        run_script(script)
+    # One keep-alive session per service, shared by all steps.
+    sessions = {
+        "influxdb": make_session(),
+        "grafana": make_session(pool_size=max(10, grafana_restore.CONCURRENCY)),
+    }
+    t0 = time.perf_counter()
+    timings, failure = run_steps(scripts_to_run, sessions)
+    print_timings(timings, t0, time.perf_counter() - t0)
+    if failure is not None:
+        sys.exit(failure)
 
     print("All scripts executed successfully!")
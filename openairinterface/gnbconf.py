@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+gNB configuration templating and parameter sweeps.
+
+The band-specific configs in this directory (gnb.sa.band*.fr1.106PRB.usrpb210.conf)
+are parsed into a structured model (groups -> dict, lists -> list, arrays ->
+tuple). split() derives the settings all bands share (the base) and, per band,
+the overrides that turn the base back into that band's file:
+
+    python gnbconf.py diff                      # shared base size and per-band overrides
+
+A sweep spec renders a matrix of configs: every band times every combination
+of the swept values, on top of optional fixed overrides.
+
+    {
+      "bands": [41, 78],
+      "set": {"gNBs.0.amf_ip_address.0.ipv4": "192.168.70.132"},
+      "sweep": {
+        "prb": [51, 106],
+        "tdd": [{"periodicity": 5, "dl_slots": 3, "dl_symbols": 6, "ul_slots": 1, "ul_symbols": 4},
+                {"periodicity": 6, "dl_slots": 7, "dl_symbols": 6, "ul_slots": 2, "ul_symbols": 4}],
+        "att_tx": [0, 12],
+        "dl_max_mcs": [10, 28]
+      }
+    }
+
+    python gnbconf.py render sweep.json --output build/gnb
+
+Swept and fixed names are either a parameter of PARAMETERS (prb, tdd,
+att_tx, att_rx, max_rxgain, dl_max_mcs, ul_max_mcs) or a dotted path into
+the model (list indices are numbers). Each variant is written to
+gnb.sa.band<N>.<label>.<hash>.conf, where the hash covers the band file, the
+parameters and the version of this module: a variant that already exists in
+the output directory is not rendered again. matrix.json lists all variants
+with their parameters.
+
+To run a sweep with the topology engine, copy a variant into the gNB
+container and start the softmodem through the perf-meas agent:
+
+    upload(backend, "gnb-sdr-host", variant["path"], "/root/gnb.conf")
+    softmodem_command("/root/gnb.conf")
+"""
+import argparse
+import base64
+import copy
+import glob
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+
+from loguru import logger
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+BAND_FILES = "gnb.sa.band*.fr1.106PRB.usrpb210.conf"
+# part of the cache key, bump it when rendering changes
+VERSION = 1
+
+
+# parsing
+class Int(int):
+    """An integer that remembers how it was written (0xe00, 001, 12345678L)."""
+
+    def __new__(cls, value, text=None):
+        number = super().__new__(cls, value)
+        number.text = text
+        return number
+
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+|\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<hex>[-+]?0[xX][0-9a-fA-F]+L{0,2})
+  | (?P<float>[-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?\d+[eE][-+]?\d+)
+  | (?P<int>[-+]?\d+L{0,2})
+  | (?P<bool>(?i:true|false)\b)
+  | (?P<name>[A-Za-z*][-A-Za-z0-9_*]*)
+  | (?P<punct>[=:;,{}()\[\]])
+""", re.S | re.X)
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match:
+            line = text.count("\n", 0, pos) + 1
+            raise ValueError(f"line {line}: cannot parse {text[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group(), text.count("\n", 0, pos) + 1))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None, None)
+
+    def take(self, expected=None):
+        kind, value, line = self.peek()
+        if kind is None or (expected and value not in expected):
+            raise ValueError(f"line {line}: expected {' or '.join(expected or ['a value'])}, found {value!r}")
+        self.pos += 1
+        return kind, value
+
+    def settings(self, end=None):
+        group = {}
+        while self.peek()[1] != end:
+            _, name = self.take()
+            self.take(("=", ":"))
+            group[name] = self.value()
+            if self.peek()[1] in (";", ","):
+                self.pos += 1
+        return group
+
+    def values(self, end):
+        items = []
+        while self.peek()[1] != end:
+            items.append(self.value())
+            if self.peek()[1] == ",":
+                self.pos += 1
+        self.take((end,))
+        return items
+
+    def value(self):
+        kind, text = self.take()
+        if text == "{":
+            group = self.settings("}")
+            self.take(("}",))
+            return group
+        if text == "(":
+            return self.values(")")
+        if text == "[":
+            return tuple(self.values("]"))
+        if kind == "string":
+            # adjacent strings are concatenated
+            parts = [text]
+            while self.peek()[0] == "string":
+                parts.append(self.take()[1])
+            return "".join(json.loads(p) for p in parts)
+        if kind == "hex":
+            return Int(int(text.rstrip("L"), 16), text)
+        if kind == "int":
+            return Int(int(text.rstrip("L")), text)
+        if kind == "float":
+            return float(text)
+        if kind == "bool":
+            return text.lower() == "true"
+        raise ValueError(f"unexpected {text!r}")
+
+
+def parse(text):
+    """The settings of a libconfig file as a dict."""
+    parser = Parser(text)
+    return parser.settings()
+
+
+def load(path):
+    with open(path, "r") as f:
+        return parse(f.read())
+
+
+# rendering
+def render_value(value, indent):
+    pad = "  " * indent
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Int) and value.text is not None:
+        return value.text
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, tuple):
+        return "[" + ", ".join(render_value(v, 0) for v in value) + "]"
+    if isinstance(value, list):
+        if not any(isinstance(v, (dict, list)) for v in value):
+            return "(" + ", ".join(render_value(v, 0) for v in value) + ")"
+        items = ",\n".join(pad + "  " + render_value(v, indent + 1) for v in value)
+        return "(\n" + items + "\n" + pad + ")"
+    if isinstance(value, dict):
+        return "{\n" + render_settings(value, indent + 1) + pad + "}"
+    raise TypeError(f"cannot render {value!r}")
+
+
+def render_settings(group, indent=0):
+    pad = "  " * indent
+    return "".join(f"{pad}{name} = {render_value(value, indent)};\n" for name, value in group.items())
+
+
+def render(model, header=None):
+    text = render_settings(model)
+    if header:
+        text = "".join(f"# {line}\n" for line in header.splitlines()) + "\n" + text
+    return text
+
+
+# paths, base and overrides
+def _key(node, part):
+    return int(part) if isinstance(node, (list, tuple)) else part
+
+
+def get_path(model, path):
+    node = model
+    for part in path.split("."):
+        node = node[_key(node, part)]
+    return node
+
+
+def set_path(model, path, value):
+    """Set a dotted path; None deletes it. Missing groups are created."""
+    parts = path.split(".")
+    node = model
+    for part in parts[:-1]:
+        key = _key(node, part)
+        if isinstance(node, dict) and key not in node:
+            node[key] = {}
+        node = node[key]
+    key = _key(node, parts[-1])
+    if value is None:
+        if isinstance(node, dict):
+            node.pop(key, None)
+        else:
+            del node[key]
+        return
+    if isinstance(value, list) and isinstance(node, dict) and isinstance(node.get(key), tuple):
+        value = tuple(value)            # arrays given as JSON lists
+    node[key] = value
+
+
+MISSING = object()
+
+
+def common(values):
+    """The part shared by all values: recursively for groups and equally long lists, else equal values."""
+    first = values[0]
+    if all(isinstance(v, dict) for v in values):
+        shared = {}
+        for name in first:
+            if all(name in v for v in values):
+                value = common([v[name] for v in values])
+                if value is not MISSING:
+                    shared[name] = value
+        return shared
+    if all(type(v) is list and len(v) == len(first) for v in values):
+        items = [common([v[i] for v in values]) for i in range(len(first))]
+        return MISSING if any(item is MISSING for item in items) else items
+    return first if all(v == first for v in values[1:]) else MISSING
+
+
+def diff(base, model, path=""):
+    """Overrides (dotted path -> value, None for removed) that turn base into model."""
+    prefix = path + "." if path else ""
+    if isinstance(base, dict) and isinstance(model, dict):
+        changes = {}
+        for name, value in model.items():
+            if name not in base:
+                changes[prefix + name] = value
+            else:
+                changes.update(diff(base[name], value, prefix + name))
+        for name in base:
+            if name not in model:
+                changes[prefix + name] = None
+        return changes
+    if type(base) is list and type(model) is list and len(base) == len(model):
+        changes = {}
+        for i, (b, m) in enumerate(zip(base, model)):
+            changes.update(diff(b, m, f"{prefix}{i}"))
+        return changes
+    return {} if base == model and type(base) is type(model) else {path: model}
+
+
+def apply(model, overrides):
+    model = copy.deepcopy(model)
+    for path, value in overrides.items():
+        set_path(model, path, copy.deepcopy(value))
+    return model
+
+
+def split(models):
+    """(base, {name: overrides}) of several models."""
+    base = common(list(models.values()))
+    return base, {name: diff(base, model) for name, model in models.items()}
+
+
+def load_bands(directory=DIR, pattern=BAND_FILES):
+    """{band: (path, model)} of the band files in `directory`."""
+    bands = {}
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        match = re.search(r"band(\d+)", os.path.basename(path))
+        if match:
+            bands[int(match.group(1))] = (path, load(path))
+    if not bands:
+        raise ValueError(f"no {pattern} in {directory}")
+    return bands
+
+
+# parameters
+def serving_cell(model):
+    return model["gNBs"][0]["servingCellConfigCommon"][0]
+
+
+def location_and_bandwidth(start, length, n=275):
+    """Resource indication value of a BWP (38.214 5.1.2.2.2) with N = 275."""
+    if length - 1 <= n // 2:
+        return n * (length - 1) + start
+    return n * (n - length + 1) + (n - 1 - start)
+
+
+def arfcn_per_prb(arfcn, scs):
+    """NR-ARFCN steps per resource block: 5 kHz raster below 3 GHz, 15 kHz up to 24.25 GHz."""
+    raster = 5 if arfcn < 600000 else 15
+    return 12 * 15 * 2 ** scs // raster
+
+
+def set_prb(model, prb):
+    """
+    Carrier and initial BWP bandwidths. Point A is moved so that the SSB keeps
+    its offset (in resource blocks) from the carrier start, or is centered
+    when the 20-PRB SSB no longer fits at that offset. The CORESET#0 settings
+    are kept.
+    """
+    cell = serving_cell(model)
+    prb = int(prb)
+    step = arfcn_per_prb(cell["absoluteFrequencySSB"], cell["dl_subcarrierSpacing"])
+    offset = (cell["absoluteFrequencySSB"] - cell["dl_absoluteFrequencyPointA"]) // step
+    if not 10 <= offset <= prb - 10:
+        offset = prb // 2
+    cell["dl_carrierBandwidth"] = cell["ul_carrierBandwidth"] = prb
+    cell["initialDLBWPlocationAndBandwidth"] = cell["initialULBWPlocationAndBandwidth"] = \
+        location_and_bandwidth(0, prb)
+    cell["dl_absoluteFrequencyPointA"] = cell["absoluteFrequencySSB"] - offset * step
+
+
+TDD_FIELDS = {
+    "periodicity": "dl_UL_TransmissionPeriodicity",
+    "dl_slots": "nrofDownlinkSlots",
+    "dl_symbols": "nrofDownlinkSymbols",
+    "ul_slots": "nrofUplinkSlots",
+    "ul_symbols": "nrofUplinkSymbols",
+}
+# dl_UL_TransmissionPeriodicity index -> ms
+PERIODICITY_MS = [0.5, 0.625, 1, 1.25, 2, 2.5, 5, 10]
+
+
+def set_tdd(model, pattern):
+    """TDD pattern 1 from a dict with the keys of TDD_FIELDS; checked against the slots of the period."""
+    cell = serving_cell(model)
+    values = {field: int(pattern.get(field, cell[key])) for field, key in TDD_FIELDS.items()}
+    slots = PERIODICITY_MS[values["periodicity"]] * 2 ** cell["referenceSubcarrierSpacing"]
+    special = 1 if values["dl_symbols"] or values["ul_symbols"] else 0
+    if values["dl_slots"] + values["ul_slots"] + special > slots or values["dl_symbols"] + values["ul_symbols"] > 13:
+        raise ValueError(f"TDD pattern {values} does not fit in {slots:g} slots")
+    for field, key in TDD_FIELDS.items():
+        cell[key] = values[field]
+
+
+def setter(path):
+    return lambda model, value: set_path(model, path, value)
+
+
+PARAMETERS = {
+    "prb": set_prb,
+    "tdd": set_tdd,
+    "att_tx": setter("RUs.0.att_tx"),
+    "att_rx": setter("RUs.0.att_rx"),
+    "max_rxgain": setter("RUs.0.max_rxgain"),
+    "dl_max_mcs": setter("MACRLCs.0.dl_max_mcs"),
+    "ul_max_mcs": setter("MACRLCs.0.ul_max_mcs"),
+}
+
+
+def configure(model, params):
+    """A copy of model with the parameters (PARAMETERS names or dotted paths) applied, in order."""
+    model = copy.deepcopy(model)
+    for name, value in params.items():
+        if name in PARAMETERS:
+            PARAMETERS[name](model, value)
+        else:
+            set_path(model, name, value)
+    return model
+
+
+# sweeps
+def matrix(spec):
+    """List of (band, params): every band times every combination of the swept values."""
+    sweep = spec.get("sweep", {})
+    names = list(sweep)
+    combos = itertools.product(*(sweep[name] for name in names))
+    combos = [dict(spec.get("set", {}), **dict(zip(names, combo))) for combo in combos]
+    return [(band, params) for band in spec["bands"] for params in combos]
+
+
+def variant_name(band, params, source_text):
+    key = json.dumps({"version": VERSION, "band": band, "params": params,
+                      "source": hashlib.sha256(source_text.encode()).hexdigest()}, sort_keys=True)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:10]
+    label = "-".join(f"{name}{value}" for name, value in params.items()
+                     if name in PARAMETERS and isinstance(value, (int, float, str)))
+    label = re.sub(r"[^-A-Za-z0-9_.]", "", label)
+    return f"gnb.sa.band{band}.{label + '.' if label else ''}{digest}.conf"
+
+
+def render_sweep(spec, output, directory=DIR):
+    """
+    Render all variants of a sweep spec into `output`, skipping those already
+    rendered. Returns the variants: dicts with band, params, path and cached.
+    """
+    bands = load_bands(directory)
+    missing = [band for band in spec["bands"] if band not in bands]
+    if missing:
+        raise ValueError(f"no config for bands {missing}, available: {sorted(bands)}")
+    base, overrides = split({band: model for band, (_, model) in bands.items()})
+    sources = {}
+    for band, (path, _) in bands.items():
+        with open(path, "r") as f:
+            sources[band] = f.read()
+    os.makedirs(output, exist_ok=True)
+    variants = []
+    for band, params in matrix(spec):
+        path = os.path.join(output, variant_name(band, params, sources[band]))
+        cached = os.path.exists(path)
+        if not cached:
+            model = configure(apply(base, overrides[band]), params)
+            header = f"band {band}, rendered by gnbconf.py from {os.path.basename(bands[band][0])}\n" \
+                     f"parameters: {json.dumps(params)}"
+            with open(path + ".tmp", "w") as f:
+                f.write(render(model, header))
+            os.replace(path + ".tmp", path)
+        variants.append({"band": band, "params": params, "path": path, "cached": cached})
+    with open(os.path.join(output, "matrix.json"), "w") as f:
+        json.dump(variants, f, indent=2)
+    return variants
+
+
+# running a variant
+def upload(backend, container, path, remote_path):
+    """Copy a rendered config into a container through backend.execute."""
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode()
+    result = backend.execute(container, f"sh -c 'echo {data} | base64 -d > {remote_path}'")
+    if result.get("exit_code", 0) != 0:
+        raise Exception(f"{container}: could not write {remote_path}: {result}")
+
+
+def softmodem_command(remote_path, options="--sa -E --usrp-tx-thread-config 1",
+                      build_dir="~/openairinterface5g/cmake_targets/ran_build/build"):
+    return f"cd {build_dir} && ./nr-softmodem -O {remote_path} {options}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Template and sweep the gNB band configs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("diff", help="show the shared base and the per-band overrides")
+    p.add_argument("--directory", default=DIR, help="directory of the band files")
+    p = sub.add_parser("render", help="render the variants of a sweep spec")
+    p.add_argument("spec", help="sweep spec (JSON)")
+    p.add_argument("--output", default="build/gnb", help="directory for the rendered configs")
+    p.add_argument("--directory", default=DIR, help="directory of the band files")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "diff":
+            bands = load_bands(args.directory)
+            base, overrides = split({band: model for band, (_, model) in bands.items()})
+            logger.info(f"{len(bands)} bands, {len(render(base).splitlines())} lines of shared base")
+            print(json.dumps({f"band{band}": changes for band, changes in overrides.items()}, indent=2))
+            return
+        with open(args.spec, "r") as f:
+            spec = json.load(f)
+        variants = render_sweep(spec, args.output, args.directory)
+    except (OSError, ValueError) as e:
+        logger.error(e)
+        sys.exit(1)
+    cached = sum(v["cached"] for v in variants)
+    logger.success(f"{len(variants)} variants in {args.output} ({len(variants) - cached} rendered, {cached} cached)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Bulk subscriber provisioning for the OAI 5G core.
+
+Generates users.conf and the subscriber rows of oai_db.sql for N consecutive
+IMSIs, instead of copying one INSERT statement per UE by hand (see
+gnbcoreinone.md). The rows of a table are written as multi-row INSERT
+statements of `--batch` rows each, so MySQL loads thousands of subscribers in
+one pass. With --csv the rows are written as CSV files plus a load.sql with
+LOAD DATA statements instead.
+
+The SQL output is the template (oai_db.sql by default) with its
+AuthenticationSubscription and SessionManagementSubscriptionData rows replaced
+by the generated ones, so it can be mounted as database/oai_db.sql directly.
+Before anything is written, every row is checked against the CREATE TABLE and
+PRIMARY KEY statements of the template: known columns, NOT NULL columns,
+varchar lengths, valid JSON and unique keys.
+
+Keys: by default every subscriber gets the K and OPc of the existing files,
+which the programmed SIMs and the nrUE use. With --derive-secret, K and OPc
+are derived per IMSI (HMAC-SHA256 of the secret and the IMSI), so the same
+secret always gives the same keys; --keys writes imsi,key,opc to a CSV file
+to program the UEs (e.g. nr-uesoftmodem --uicc0.imsi/--uicc0.key/--uicc0.opc).
+
+Static IPs are assigned in order from --ip-start and must stay inside
+--ip-subnet, the UE subnet of the SMF for the dnn (conf/config.yaml).
+
+Usage:
+    python subscribers.py 2000 --ip-subnet 10.0.0.0/16 --out-db build/oai_db.sql --out-users build/users.conf
+    python subscribers.py 2000 --template oai_db_nrue.sql --dnn oai --no-static-ip --out-db build/oai_db.sql
+    python subscribers.py 5000 --derive-secret lab-secret --keys build/keys.csv --csv build/csv \\
+        --ip-subnet 10.0.0.0/16 --ip-start 10.0.1.2
+"""
+import argparse
+import csv
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import re
+import sys
+
+from loguru import logger
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_KEY = "fec86ba6eb707ed08905757b1bb44b8f"
+DEFAULT_OPC = "C42449363BBAD02B66D16BC975D77CC1"
+
+
+# subscribers
+def imsis(count, first="001010000000001"):
+    """`count` consecutive IMSIs starting at `first`, keeping its length."""
+    width = len(first)
+    start = int(first)
+    if len(str(start + count - 1)) > width:
+        raise ValueError(f"{count} IMSIs starting at {first} do not fit in {width} digits")
+    return [str(start + i).zfill(width) for i in range(count)]
+
+
+def derive_keys(imsi, secret):
+    """(K, OPc) of an IMSI, derived from `secret`: 128-bit hex strings."""
+    key = hmac.new(secret.encode(), b"K" + imsi.encode(), hashlib.sha256).hexdigest()[:32]
+    opc = hmac.new(secret.encode(), b"OPc" + imsi.encode(), hashlib.sha256).hexdigest()[:32].upper()
+    return key, opc
+
+
+def authentication_row(imsi, key, opc):
+    return {
+        "ueid": imsi,
+        "authenticationMethod": "5G_AKA",
+        "encPermanentKey": key,
+        "protectionParameterId": key,
+        "sequenceNumber": json.dumps({"sqn": "000000000000", "sqnScheme": "NON_TIME_BASED",
+                                      "lastIndexes": {"ausf": 0}}),
+        "authenticationManagementField": "8000",
+        "algorithmId": "milenage",
+        "encOpcKey": opc,
+        "encTopcKey": None,
+        "vectorGenerationInHss": None,
+        "n5gcAuthMethod": None,
+        "rgAuthenticationInd": None,
+        "supi": imsi,
+    }
+
+
+def dnn_configuration(session_type, qi, static_ip=None, ambr="1000Mbps"):
+    config = {
+        "pduSessionTypes": {"defaultSessionType": session_type},
+        "sscModes": {"defaultSscMode": "SSC_MODE_1"},
+        "5gQosProfile": {"5qi": qi, "arp": {"priorityLevel": 15, "preemptCap": "NOT_PREEMPT",
+                                            "preemptVuln": "PREEMPTABLE"}, "priorityLevel": 1},
+        "sessionAmbr": {"uplink": ambr, "downlink": ambr},
+    }
+    if static_ip:
+        config["staticIpAddress"] = [{"ipv4Addr": str(static_ip)}]
+    return config
+
+
+def session_row(imsi, plmn, dnn, static_ip=None, sst=1, sd="16777215"):
+    return {
+        "ueid": imsi,
+        "servingPlmnid": plmn,
+        "singleNssai": json.dumps({"sst": sst, "sd": sd}),
+        "dnnConfigurations": json.dumps({dnn: dnn_configuration("IPV4", 6, static_ip),
+                                         "ims": dnn_configuration("IPV4V6", 2)}),
+    }
+
+
+def static_ips(count, subnet, start):
+    """`count` consecutive addresses from `start`, all inside `subnet`."""
+    subnet = ipaddress.ip_network(subnet)
+    first = ipaddress.ip_address(start)
+    last = first + count - 1
+    if first not in subnet or last not in subnet or last == subnet.broadcast_address:
+        raise ValueError(f"{count} static IPs from {first} do not fit in {subnet}")
+    return [first + i for i in range(count)]
+
+
+def generate(count, first="001010000000001", plmn="00101", dnn="openairinterface", secret=None,
+             ip_subnet="10.0.1.0/24", ip_start="10.0.1.2", static_ip=True):
+    """Rows per table ({table: [row, ...]}) and the (imsi, key, opc) of each subscriber."""
+    subscribers = []
+    for imsi in imsis(count, first):
+        key, opc = derive_keys(imsi, secret) if secret else (DEFAULT_KEY, DEFAULT_OPC)
+        subscribers.append((imsi, key, opc))
+    ips = static_ips(count, ip_subnet, ip_start) if static_ip else [None] * count
+    tables = {
+        "AuthenticationSubscription": [authentication_row(*s) for s in subscribers],
+        "SessionManagementSubscriptionData": [session_row(s[0], plmn, dnn, ip)
+                                              for s, ip in zip(subscribers, ips)],
+    }
+    return tables, subscribers
+
+
+# schema
+def parse_schema(sql):
+    """
+    Tables of a MySQL dump: {table: {"columns": {name: (type, length, not_null,
+    has_default)}, "primary_key": [...]}}.
+    """
+    schema = {}
+    for table, body in re.findall(r"CREATE TABLE `(\w+)` \((.*?)\n\)", sql, re.S):
+        columns = {}
+        for line in body.strip().splitlines():
+            match = re.match(r"\s*`(\w+)` (\w+)(?:\((\d+)\))?(.*)", line)
+            if match:
+                name, kind, length, rest = match.groups()
+                columns[name] = (kind.lower(), int(length) if length else None,
+                                 "NOT NULL" in rest, "DEFAULT" in rest or "AUTO_INCREMENT" in rest)
+        schema[table] = {"columns": columns, "primary_key": []}
+    for table, keys in re.findall(r"ALTER TABLE `(\w+)`\s+ADD PRIMARY KEY \(([^)]*)\)", sql):
+        if table in schema:
+            schema[table]["primary_key"] = re.findall(r"`(\w+)`", keys)
+    return schema
+
+
+def validate(tables, schema):
+    """List of problems of the rows against the schema (empty when valid)."""
+    problems = []
+    for table, rows in tables.items():
+        if table not in schema:
+            problems.append(f"{table}: not in the schema")
+            continue
+        columns, key = schema[table]["columns"], schema[table]["primary_key"]
+        required = [c for c, (_, _, not_null, has_default) in columns.items() if not_null and not has_default]
+        seen = set()
+        for n, row in enumerate(rows):
+            where = f"{table} row {n} ({row.get('ueid')})"
+            for column in set(row) - set(columns):
+                problems.append(f"{where}: unknown column {column}")
+            for column in required:
+                if row.get(column) is None:
+                    problems.append(f"{where}: {column} is NOT NULL")
+            for column, value in row.items():
+                if column not in columns or value is None:
+                    continue
+                kind, length = columns[column][:2]
+                if kind == "varchar" and len(str(value)) > length:
+                    problems.append(f"{where}: {column} is longer than {length}")
+                elif kind == "json":
+                    try:
+                        json.loads(value)
+                    except ValueError:
+                        problems.append(f"{where}: {column} is not valid JSON")
+                elif kind in ("tinyint", "int") and not isinstance(value, int):
+                    problems.append(f"{where}: {column} is not an integer")
+            if key:
+                pk = tuple(row.get(c) for c in key)
+                if pk in seen:
+                    problems.append(f"{where}: duplicate primary key {pk}")
+                seen.add(pk)
+    return problems
+
+
+# output
+def sql_value(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def insert_statements(table, rows, batch=1000):
+    """Multi-row INSERT statements of up to `batch` rows each."""
+    if not rows:
+        return ""
+    columns = list(rows[0])
+    head = f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) VALUES\n"
+    statements = []
+    for i in range(0, len(rows), batch):
+        values = ",\n".join("    (" + ", ".join(sql_value(row[c]) for c in columns) + ")"
+                            for row in rows[i:i + batch])
+        statements.append(head + values + ";\n")
+    return "".join(statements)
+
+
+def render_sql(template, tables, batch=1000):
+    """The template with the rows of `tables` replaced by batched INSERT statements."""
+    sql = template
+    for table, rows in tables.items():
+        sql = re.sub(rf"INSERT INTO `{table}` .*?\);[ \t]*\n", "", sql, flags=re.S)
+        end = re.search(rf"CREATE TABLE `{table}` \(.*?\n\)[^;]*;\n", sql, re.S)
+        if end is None:
+            raise ValueError(f"{table} is not in the template")
+        data = f"\n--\n-- Dumping data for table `{table}`\n--\n\n" + insert_statements(table, rows, batch)
+        sql = sql[:end.end()] + data + sql[end.end():]
+    # the template's own (now empty) dumping comments
+    sql = re.sub(r"\n--\n-- Dumping data for table `\w+`\n--\n\n(?=\n|--)", "\n", sql)
+    return sql
+
+
+def render_users(subscribers):
+    """users.conf sections of the subscribers, numbered like the existing file."""
+    sections = []
+    for n, (imsi, _, _) in enumerate(subscribers, start=1):
+        sections.append(f"[{imsi}]\nfullname = user{n}\nhassip = yes\ncontext = users\nhost = dynamic\n"
+                        f"transport=udp\n")
+    return "\n".join(sections)
+
+
+def write_csv(directory, tables):
+    """
+    One CSV file per table and load.sql with a LOAD DATA statement for each;
+    run it from `directory` with `mysql --local-infile=1 oai_db < load.sql`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    load = ["SET autocommit = 0;", "SET unique_checks = 0;"]
+    for table, rows in tables.items():
+        path = os.path.join(directory, f"{table}.csv")
+        columns = list(rows[0])
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            for row in rows:
+                writer.writerow(["NULL" if row[c] is None else row[c] for c in columns])
+        load.append(f"LOAD DATA LOCAL INFILE '{table}.csv' REPLACE INTO TABLE `{table}` "
+                    f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                    f"LINES TERMINATED BY '\\n' ({', '.join(f'`{c}`' for c in columns)});")
+    load += ["COMMIT;", "SET unique_checks = 1;"]
+    with open(os.path.join(directory, "load.sql"), "w") as f:
+        f.write("\n".join(load) + "\n")
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate OAI core subscribers (users.conf and oai_db.sql).")
+    parser.add_argument("count", type=int, help="number of subscribers")
+    parser.add_argument("--first-imsi", default="001010000000001", help="IMSI of the first subscriber")
+    parser.add_argument("--plmn", default="00101", help="serving PLMN id")
+    parser.add_argument("--dnn", default="openairinterface", help="data network name of the default session")
+    parser.add_argument("--derive-secret", help="derive K and OPc per IMSI from this secret")
+    parser.add_argument("--ip-subnet", default="10.0.1.0/24",
+                        help="UE subnet of the dnn (the default /24 holds at most 253 UEs from 10.0.1.2)")
+    parser.add_argument("--ip-start", default="10.0.1.2", help="static IP of the first subscriber")
+    parser.add_argument("--no-static-ip", action="store_true", help="let the SMF assign addresses")
+    parser.add_argument("--template", default=os.path.join(DIR, "oai_db.sql"), help="database dump to extend")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per INSERT statement")
+    parser.add_argument("--out-db", help="write the database dump here")
+    parser.add_argument("--out-users", help="write users.conf here")
+    parser.add_argument("--csv", help="write LOAD DATA CSV files and load.sql into this directory")
+    parser.add_argument("--keys", help="write imsi,key,opc of every subscriber to this CSV file")
+    args = parser.parse_args(argv)
+
+    if not (args.out_db or args.out_users or args.csv or args.keys):
+        parser.error("nothing to write: give --out-db, --out-users, --csv or --keys")
+    try:
+        with open(args.template, "r") as f:
+            template = f.read()
+        tables, subscribers = generate(args.count, args.first_imsi, args.plmn, args.dnn, args.derive_secret,
+                                       args.ip_subnet, args.ip_start, not args.no_static_ip)
+    except (OSError, ValueError) as e:
+        logger.error(e)
+        sys.exit(1)
+
+    problems = validate(tables, parse_schema(template))
+    if problems:
+        for problem in problems[:20]:
+            logger.error(problem)
+        logger.error(f"{len(problems)} problems against the schema of {args.template}, nothing written")
+        sys.exit(1)
+
+    if args.out_db:
+        write(args.out_db, render_sql(template, tables, args.batch))
+        logger.success(f"{args.out_db}: {args.count} subscribers in batches of {args.batch}")
+    if args.out_users:
+        write(args.out_users, render_users(subscribers))
+        logger.success(f"{args.out_users}: {args.count} users")
+    if args.csv:
+        write_csv(args.csv, tables)
+        logger.success(f"{args.csv}: CSV files and load.sql")
+    if args.keys:
+        with open(args.keys, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["imsi", "key", "opc"])
+            writer.writerows(subscribers)
+        logger.success(f"{args.keys}: keys of {args.count} subscribers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Testbed backend used by the orchestration modules.
+
+ChiBackend forwards to the KTH-EXPECA python-chi package (chi.network,
+chi.container and chi.expeca), exactly as the notebooks call it. FakeChi in
+fake_chi.py implements the same methods locally, so the orchestration code can
+be tested and timed offline.
+"""
+
+
+class ChiBackend:
+    """Thin wrapper around python-chi; the modules are imported on first use."""
+
+    def __init__(self):
+        import chi.network
+        import chi.container
+        import chi.expeca
+        self.network = chi.network
+        self.container = chi.container
+        self.expeca = chi.expeca
+
+    # reservations
+    def reserve(self, spec):
+        return self.expeca.reserve(spec)
+
+    def show_reservation_byname(self, name):
+        return self.expeca.show_reservation_byname(name)
+
+    def list_reservations(self, brief=True):
+        return self.expeca.list_reservations(brief=brief)
+
+    def unreserve_byid(self, lease_id):
+        return self.expeca.unreserve_byid(lease_id)
+
+    def get_segment_ids(self, name):
+        return self.expeca.get_segment_ids(name)
+
+    def get_available_publicips(self):
+        return self.expeca.get_available_publicips()
+
+    def get_worker_interfaces(self, worker_name):
+        return self.expeca.get_worker_interfaces(worker_name)
+
+    # networks
+    def get_network(self, name):
+        return self.network.get_network(name)
+
+    def create_network(self, name):
+        return self.network.create_network(name)
+
+    def create_subnet(self, name, network_id, cidr, gateway_ip=None, enable_dhcp=False):
+        return self.network.create_subnet(subnet_name=name, network_id=network_id, cidr=cidr,
+                                          gateway_ip=gateway_ip, enable_dhcp=enable_dhcp)
+
+    def delete_network(self, network_id):
+        return self.network.delete_network(network_id)
+
+    def get_router(self, name):
+        return self.network.get_router(name)
+
+    def create_router(self, name, gw_network_name):
+        return self.network.create_router(name, gw_network_name)
+
+    def add_subnet_to_router(self, router_id, subnet_id):
+        return self.network.add_subnet_to_router(router_id, subnet_id)
+
+    def add_route_to_router(self, router_id, cidr, nexthop):
+        return self.network.add_route_to_router(router_id, cidr, nexthop)
+
+    def delete_router(self, router_id):
+        return self.network.delete_router(router_id)
+
+    def remove_subnet_from_router(self, router_id, subnet_id):
+        return self.network.remove_subnet_from_router(router_id, subnet_id)
+
+    def remove_all_routes_from_router(self, router_id):
+        return self.network.remove_all_routes_from_router(router_id)
+
+    # containers
+    def create_container(self, **kwargs):
+        return self.container.create_container(**kwargs)
+
+    def wait_for_active(self, name):
+        return self.container.wait_for_active(name)
+
+    def get_container_status(self, name):
+        return self.expeca.get_container_status(name)
+
+    def destroy_container(self, name):
+        return self.container.destroy_container(name)
+
+    def wait_until_container_removed(self, name):
+        return self.expeca.wait_until_container_removed(name)
+
+    def execute(self, container_ref, command):
+        return self.container.execute(container_ref=container_ref, command=command)
+
+    def get_logs(self, container_ref):
+        return self.container.get_logs(container_ref)
+
+    # SDRs
+    def restart_sdr(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        return self.expeca.restart_sdr(sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface)
+
+    def make_sdr_mango(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        return self.expeca.make_sdr_mango(sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface)
+
+    def make_sdr_ni(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        return self.expeca.make_sdr_ni(sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface)
+
+    def sdr_tools(self, **kwargs):
+        return self.expeca.sdr_tools(**kwargs)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Notebook environment bootstrap.
+
+Every notebook starts by regex-parsing <project>-openrc.sh, asking for the
+password, and reinstalling python-chi from git. setup() replaces those cells:
+
+    import sys; sys.path.append("orchestration")      # "../orchestration" from a subdirectory
+    import bootstrap
+    bootstrap.setup("demo_project-openrc.sh")
+
+  credentials   The openrc file is parsed once into a profile
+                (~/.cache/expeca/profile-<project>.json, no password in it) and
+                parsed again only when the file changes. Without an openrc file
+                the cached profile is used.
+  token         The password is asked for only when there is no valid Keystone
+                token; the token is cached (mode 600) until shortly before it
+                expires, and exported as OS_AUTH_TYPE=v3token / OS_TOKEN.
+  dependencies  Packages of requirements-notebook.txt that are already
+                installed are not reinstalled. Missing ones are installed from
+                the wheelhouse (~/.cache/expeca/wheelhouse, build it once with
+                `python bootstrap.py wheelhouse`) without network access when
+                it has them, otherwise from the index. moviepy is only
+                uninstalled when it is present.
+
+This module only uses the standard library, since it runs before the
+dependencies are installed. EXPECA_CACHE_DIR overrides the cache directory.
+
+Usage:
+    python bootstrap.py login demo_project-openrc.sh
+    python bootstrap.py wheelhouse [--requirements requirements-notebook.txt]
+    python bootstrap.py install
+"""
+from datetime import datetime
+from getpass import getpass
+import argparse
+import importlib.metadata
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+CACHE_DIR = os.environ.get("EXPECA_CACHE_DIR", os.path.expanduser("~/.cache/expeca"))
+REQUIREMENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements-notebook.txt")
+WHEELHOUSE = os.path.join(CACHE_DIR, "wheelhouse")
+# packages that break the python-chi install on Colab
+CONFLICTING = ["moviepy"]
+# a cached token is renewed when it expires within this many seconds
+TOKEN_MARGIN = 300
+
+
+def parse_openrc(path):
+    """The exported variables of an openrc file, as a dict."""
+    with open(path, "r") as f:
+        content = f.read()
+    pattern = r'export\s+(\w+)\s*=\s*("[^"]+"|[^"\n]+)'
+    return {name: value.strip().strip('"') for name, value in re.findall(pattern, content)}
+
+
+def _write_private(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _project(name):
+    return re.sub(r"-openrc\.sh$", "", os.path.basename(name))
+
+
+def load_profile(openrc=None, project=None):
+    """
+    The credential profile (the openrc variables except OS_PASSWORD). It is
+    read from the cache unless the openrc file is newer than the cached copy.
+    """
+    project = project or (_project(openrc) if openrc else None)
+    if project is None:
+        profiles = sorted(f for f in os.listdir(CACHE_DIR) if f.startswith("profile-")) \
+            if os.path.isdir(CACHE_DIR) else []
+        if len(profiles) != 1:
+            raise Exception("no openrc file given and no single cached profile to use")
+        project = profiles[0][len("profile-"):-len(".json")]
+    path = os.path.join(CACHE_DIR, f"profile-{project}.json")
+    cached = _read_json(path)
+    if openrc and os.path.exists(openrc):
+        mtime = os.path.getmtime(openrc)
+        if not cached or cached.get("mtime") != mtime:
+            env = {k: v for k, v in parse_openrc(openrc).items() if k != "OS_PASSWORD"}
+            cached = {"project": project, "source": os.path.abspath(openrc), "mtime": mtime, "env": env}
+            _write_private(path, cached)
+            print(f"✔ parsed {openrc} into {path}")
+    if not cached:
+        raise Exception(f"no openrc file and no cached profile for {project}")
+    return cached
+
+
+def _expiry(expires_at):
+    return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).timestamp()
+
+
+def request_token(env, password):
+    """Ask Keystone for a project-scoped token. Returns (token, expires_at)."""
+    if env.get("OS_APPLICATION_CREDENTIAL_ID"):
+        identity = {"methods": ["application_credential"],
+                    "application_credential": {"id": env["OS_APPLICATION_CREDENTIAL_ID"],
+                                               "secret": env.get("OS_APPLICATION_CREDENTIAL_SECRET", password)}}
+        auth = {"identity": identity}
+    else:
+        user = {"name": env["OS_USERNAME"], "password": password,
+                "domain": {"name": env.get("OS_USER_DOMAIN_NAME", "Default")}}
+        project = {"id": env["OS_PROJECT_ID"]} if env.get("OS_PROJECT_ID") else \
+            {"name": env["OS_PROJECT_NAME"], "domain": {"name": env.get("OS_PROJECT_DOMAIN_NAME", "Default")}}
+        auth = {"identity": {"methods": ["password"], "password": {"user": user}},
+                "scope": {"project": project}}
+    url = env["OS_AUTH_URL"].rstrip("/")
+    if not url.endswith("/v3"):
+        url += "/v3"
+    request = urllib.request.Request(url + "/auth/tokens", data=json.dumps({"auth": auth}).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        body = json.load(response)
+        return response.headers["X-Subject-Token"], body["token"]["expires_at"]
+
+
+def get_token(profile, password=None):
+    """A cached token that is valid for at least TOKEN_MARGIN seconds, or a new one."""
+    path = os.path.join(CACHE_DIR, f"token-{profile['project']}.json")
+    cached = _read_json(path)
+    if cached and cached.get("auth_url") == profile["env"].get("OS_AUTH_URL") \
+            and _expiry(cached["expires_at"]) - time.time() > TOKEN_MARGIN:
+        return cached["token"], cached["expires_at"]
+    if password is None and not profile["env"].get("OS_APPLICATION_CREDENTIAL_SECRET"):
+        password = getpass("enter your expeca password:")
+    token, expires_at = request_token(profile["env"], password)
+    _write_private(path, {"token": token, "expires_at": expires_at, "auth_url": profile["env"].get("OS_AUTH_URL")})
+    print(f"✔ new token, valid until {expires_at}")
+    return token, expires_at
+
+
+def login(openrc=None, project=None, password=None, use_token=True):
+    """
+    Export the credentials of the profile to os.environ. With use_token, a
+    cached Keystone token is used (the password is asked for only when it has
+    expired); otherwise the password is asked for and exported as OS_PASSWORD,
+    as the notebooks do.
+    """
+    profile = load_profile(openrc, project)
+    os.environ.update(profile["env"])
+    if not use_token:
+        os.environ["OS_PASSWORD"] = password or getpass("enter your expeca password:")
+        return profile
+    token, expires_at = get_token(profile, password)
+    for key in ("OS_PASSWORD", "OS_USERNAME", "OS_USER_DOMAIN_NAME", "OS_APPLICATION_CREDENTIAL_ID",
+                "OS_APPLICATION_CREDENTIAL_SECRET"):
+        os.environ.pop(key, None)
+    os.environ["OS_AUTH_TYPE"] = "v3token"
+    os.environ["OS_TOKEN"] = token
+    remaining = (_expiry(expires_at) - time.time()) / 3600
+    print(f"✔ logged in to {profile['env'].get('OS_PROJECT_NAME', profile['project'])} "
+          f"(token valid for {remaining:.1f} h)")
+    return profile
+
+
+def read_requirements(path=REQUIREMENTS):
+    """Requirement lines of a requirements file, without comments."""
+    with open(path, "r") as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+def _distribution(requirement):
+    """(distribution name, pinned version or None) of a requirement line."""
+    name = re.split(r"[\s<>=!~;@\[]", requirement, maxsplit=1)[0]
+    pinned = re.search(r"==\s*([^\s;]+)", requirement)
+    return name, pinned.group(1) if pinned else None
+
+
+def _from_wheelhouse(requirement):
+    """
+    A requirement as pip resolves it from a wheelhouse: pip ignores --no-index
+    and --find-links for direct references (name @ url) and fetches the URL,
+    so those become the bare name (with extras and environment marker).
+    """
+    spec, _, marker = requirement.partition(";")
+    if "@" not in spec:
+        return requirement
+    bare = spec.split("@", 1)[0].strip()
+    return f"{bare} ;{marker}" if marker else bare
+
+
+def missing_requirements(requirements):
+    """The requirements that are not installed, or installed in another version than pinned."""
+    missing = []
+    for requirement in requirements:
+        name, pinned = _distribution(requirement)
+        try:
+            version = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            missing.append(requirement)
+            continue
+        if pinned and version != pinned:
+            missing.append(requirement)
+    return missing
+
+
+def pip(*args):
+    subprocess.run([sys.executable, "-m", "pip", *args], check=True)
+
+
+def install(requirements=REQUIREMENTS, wheelhouse=WHEELHOUSE):
+    """Install the missing requirements, from the wheelhouse when it has them."""
+    for name in CONFLICTING:
+        try:
+            importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        pip("uninstall", "-q", "-y", name)
+    missing = missing_requirements(read_requirements(requirements))
+    if not missing:
+        print("✔ all dependencies are installed")
+        return []
+    start = time.perf_counter()
+    if os.path.isdir(wheelhouse) and os.listdir(wheelhouse):
+        try:
+            pip("install", "-q", "--no-index", "--find-links", wheelhouse, *map(_from_wheelhouse, missing))
+            print(f"✔ installed {len(missing)} packages from {wheelhouse} in {time.perf_counter() - start:.1f}s")
+            return missing
+        except subprocess.CalledProcessError:
+            print(f"⚠ {wheelhouse} is incomplete, installing from the index")
+    pip("install", "-q", *missing)
+    print(f"✔ installed {len(missing)} packages in {time.perf_counter() - start:.1f}s")
+    return missing
+
+
+def build_wheelhouse(requirements=REQUIREMENTS, wheelhouse=WHEELHOUSE):
+    """Build wheels of all requirements and their dependencies into the wheelhouse."""
+    os.makedirs(wheelhouse, exist_ok=True)
+    pip("wheel", "-q", "-w", wheelhouse, "-r", requirements)
+    print(f"✔ wheelhouse ready in {wheelhouse}")
+
+
+def setup(openrc=None, project=None, password=None, use_token=True, requirements=REQUIREMENTS):
+    """Install the dependencies and log in: the first cells of every notebook."""
+    install(requirements)
+    return login(openrc, project, password, use_token)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare the notebook environment.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("login", help="cache the credential profile and a token")
+    p.add_argument("openrc", nargs="?", help="openrc file (default: the cached profile)")
+    for name in ("wheelhouse", "install"):
+        p = sub.add_parser(name, help="build the wheelhouse" if name == "wheelhouse" else "install the dependencies")
+        p.add_argument("--requirements", default=REQUIREMENTS, help="requirements file")
+        p.add_argument("--wheelhouse", default=WHEELHOUSE, help="wheel directory")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "login":
+            login(args.openrc)
+        elif args.command == "wheelhouse":
+            build_wheelhouse(args.requirements, args.wheelhouse)
+        else:
+            install(args.requirements, args.wheelhouse)
+    except Exception as e:
+        print(f"⚠ {args.command} failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
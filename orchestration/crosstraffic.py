@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Cross-traffic orchestrator for the setup of crosstraffic.md.
+
+All iperf3 servers and clients are started concurrently through the perf-meas
+agent (port 50505) of their containers, see perfmeas.py. The clients wait for a common start
+time, so every flow covers the same interval, and write iperf3 JSON (-J) to a
+file in their container. After the run the files are collected with
+execute("cat ...") and summarized into two CSV files:
+
+  <run>-flows.csv      one row per flow and one "total" row: throughput,
+                       jitter, loss and retransmits
+  <run>-intervals.csv  one row per flow and reporting interval (default 1 s)
+
+Scenario format (see experiments/crosstraffic.json):
+
+    {
+      "server": {"container": "ct-server-node", "ip": "10.70.70.210"},
+      "clients": [{"container": "ct-client-node-01", "port": 53301}, ...],
+      "protocol": "udp",        # or "tcp"
+      "bitrate": "5M",          # offered load per flow (iperf3 -b)
+      "duration": 30,
+      "reverse": false,         # true: server -> clients (iperf3 -R)
+      "start_delay": 5          # seconds between launching and the common start time
+    }
+
+Usage:
+    python crosstraffic.py experiments/crosstraffic.json [--bitrate 20M] [--duration 60] [--output results]
+    python crosstraffic.py experiments/crosstraffic.json --fake --duration 3
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from loguru import logger
+
+from perfmeas import PerfMeasClient
+
+RESULT_DIR = "/tmp"
+
+
+def server_command(port):
+    """One-off iperf3 server (exits after one test, so nothing is left running)."""
+    return f"iperf3 -s -1 -p {port} > /proc/1/fd/1 2>&1"
+
+
+def client_command(scenario, client, start_at, result_file):
+    """iperf3 client that waits until the epoch second `start_at`, then writes JSON to result_file."""
+    args = ["iperf3", "-c", scenario["server"]["ip"], "-p", str(client["port"]),
+            "-t", str(client.get("duration", scenario["duration"])),
+            "-b", str(client.get("bitrate", scenario["bitrate"])),
+            "-i", str(scenario.get("interval", 1)), "-J", "--logfile", result_file]
+    if client.get("protocol", scenario.get("protocol", "udp")) == "udp":
+        args.append("-u")
+    if client.get("reverse", scenario.get("reverse", False)):
+        args.append("-R")
+    wait = f'while [ "$(date +%s)" -lt {int(start_at)} ]; do sleep 0.05; done'
+    return f"rm -f {result_file}; {wait}; {' '.join(args)}"
+
+
+def summarize_flow(flow, result):
+    """Flow summary row from an iperf3 JSON result."""
+    end = result.get("end", {})
+    udp = "sum" in end and "jitter_ms" in end["sum"]
+    row = {"flow": flow, "protocol": "udp" if udp else "tcp"}
+    if udp:
+        s = end["sum"]
+        row.update(seconds=s.get("seconds"), bytes=s.get("bytes"), bits_per_second=s.get("bits_per_second"),
+                   jitter_ms=s.get("jitter_ms"), lost_packets=s.get("lost_packets"),
+                   packets=s.get("packets"), lost_percent=s.get("lost_percent"), retransmits=None)
+    else:
+        sent, received = end.get("sum_sent", {}), end.get("sum_received", {})
+        row.update(seconds=received.get("seconds"), bytes=received.get("bytes"),
+                   bits_per_second=received.get("bits_per_second"), jitter_ms=None, lost_packets=None,
+                   packets=None, lost_percent=None, retransmits=sent.get("retransmits"))
+    return row
+
+
+def flow_intervals(flow, result):
+    """Per-interval rows from an iperf3 JSON result."""
+    rows = []
+    for interval in result.get("intervals", []):
+        s = interval.get("sum", {})
+        rows.append({"flow": flow, "start": s.get("start"), "end": s.get("end"), "bytes": s.get("bytes"),
+                     "bits_per_second": s.get("bits_per_second"), "packets": s.get("packets"),
+                     "retransmits": s.get("retransmits")})
+    return rows
+
+
+def total_row(rows):
+    """Aggregate of the flow rows: summed throughput and loss, packet-weighted mean jitter."""
+    rows = [r for r in rows if r.get("bits_per_second") is not None]
+    total = {"flow": "total", "protocol": ",".join(sorted({r["protocol"] for r in rows}))}
+    total["seconds"] = max((r["seconds"] or 0 for r in rows), default=None)
+    total["bytes"] = sum(r["bytes"] or 0 for r in rows)
+    total["bits_per_second"] = sum(r["bits_per_second"] for r in rows)
+    udp = [r for r in rows if r["packets"]]
+    packets = sum(r["packets"] for r in udp)
+    total["packets"] = packets if udp else None
+    total["lost_packets"] = sum(r["lost_packets"] or 0 for r in udp) if udp else None
+    total["lost_percent"] = 100.0 * total["lost_packets"] / packets if packets else None
+    total["jitter_ms"] = sum(r["jitter_ms"] * r["packets"] for r in udp) / packets if packets else None
+    tcp = [r for r in rows if r["retransmits"] is not None]
+    total["retransmits"] = sum(r["retransmits"] for r in tcp) if tcp else None
+    return total
+
+
+def write_csv(path, rows):
+    if not rows:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class CrossTraffic:
+    """Runs one cross-traffic scenario and collects its results."""
+
+    def __init__(self, scenario, backend, run_id=None):
+        self.scenario = scenario
+        self.backend = backend
+        self.run_id = run_id or time.strftime("ct-%Y%m%d-%H%M%S")
+        self.pool = ThreadPoolExecutor(max_workers=2 * len(scenario["clients"]) + 1)
+
+    def result_file(self, client):
+        return f"{RESULT_DIR}/{self.run_id}-{client['container']}-{client['port']}.json"
+
+    def agent(self, container):
+        return PerfMeasClient(container, self.backend)
+
+    def start(self):
+        """Start all servers (one agent call), then all clients, concurrently. Returns the common start time (epoch s)."""
+        server = self.scenario["server"]["container"]
+        self.agent(server).submit_batch([server_command(c["port"]) for c in self.scenario["clients"]])
+        logger.info(f"started {len(self.scenario['clients'])} iperf3 servers on {server}")
+        start_at = int(time.time() + self.scenario.get("start_delay", 5)) + 1
+        list(self.pool.map(
+            lambda c: self.agent(c["container"]).submit(
+                client_command(self.scenario, c, start_at, self.result_file(c))),
+            self.scenario["clients"]))
+        logger.info(f"started {len(self.scenario['clients'])} iperf3 clients, traffic starts at "
+                    f"{time.strftime('%H:%M:%S', time.localtime(start_at))}")
+        return start_at
+
+    def fetch(self, client, deadline, poll_interval):
+        """Read a client's JSON result, retrying until it is complete or the deadline passes."""
+        path = self.result_file(client)
+        while True:
+            output = self.backend.execute(client["container"], f"cat {path}").get("output") or ""
+            try:
+                result = json.loads(output)
+                if "end" in result:
+                    return result
+            except ValueError:
+                pass
+            if time.time() >= deadline:
+                raise TimeoutError(f"{client['container']}: no complete result in {path}")
+            time.sleep(poll_interval)
+
+    def collect(self, start_at, poll_interval=2.0, grace=30):
+        """Wait for the run to end and gather all results concurrently. Returns {flow: result}."""
+        duration = max(c.get("duration", self.scenario["duration"]) for c in self.scenario["clients"])
+        end_at = start_at + duration
+        time.sleep(max(0, end_at - time.time()))
+
+        def fetch(client):
+            flow = f"{client['container']}:{client['port']}"
+            try:
+                return flow, self.fetch(client, end_at + grace, poll_interval)
+            except Exception as e:
+                logger.error(f"{flow}: {e}")
+                return flow, None
+        return dict(self.pool.map(fetch, self.scenario["clients"]))
+
+    def save(self, results, output_dir):
+        """Write the flow and interval CSV files, and the raw JSON. Returns the flow rows."""
+        os.makedirs(output_dir, exist_ok=True)
+        rows, intervals = [], []
+        for flow, result in results.items():
+            if result is None:
+                continue
+            if "error" in result:
+                logger.error(f"{flow}: iperf3 error: {result['error']}")
+            rows.append(summarize_flow(flow, result))
+            intervals += flow_intervals(flow, result)
+        if rows:
+            rows.append(total_row(rows))
+        base = os.path.join(output_dir, self.run_id)
+        write_csv(base + "-flows.csv", rows)
+        write_csv(base + "-intervals.csv", intervals)
+        with open(base + "-raw.json", "w") as f:
+            json.dump({"scenario": self.scenario, "results": results}, f)
+        logger.info(f"results written to {base}-flows.csv and {base}-intervals.csv")
+        return rows
+
+    def run(self, output_dir="results", poll_interval=2.0):
+        try:
+            start_at = self.start()
+            results = self.collect(start_at, poll_interval)
+        finally:
+            self.pool.shutdown(wait=False)
+        return self.save(results, output_dir), results
+
+
+def print_summary(rows):
+    for r in rows:
+        mbps = (r["bits_per_second"] or 0) / 1e6
+        extra = ""
+        if r["jitter_ms"] is not None:
+            extra = f"  jitter {r['jitter_ms']:.3f} ms  loss {r['lost_percent']:.2f}%"
+        elif r["retransmits"] is not None:
+            extra = f"  retransmits {r['retransmits']}"
+        logger.info(f"  {r['flow']:<28} {mbps:9.2f} Mbps{extra}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a cross-traffic scenario and collect iperf3 results.")
+    parser.add_argument("scenario", help="scenario file")
+    parser.add_argument("--bitrate", help="override the offered load per flow (e.g. 20M)")
+    parser.add_argument("--duration", type=int, help="override the duration in seconds")
+    parser.add_argument("--protocol", choices=["udp", "tcp"], help="override the protocol")
+    parser.add_argument("--output", default="results", help="directory for the result files")
+    parser.add_argument("--fake", action="store_true",
+                        help="run against the local fake testbed (runs in real time, use a short --duration)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.scenario, "r") as f:
+            scenario = json.load(f)
+    except Exception as e:
+        logger.error(f"Cannot read scenario file: {e}")
+        sys.exit(1)
+    for key in ("bitrate", "duration", "protocol"):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+
+    if args.fake:
+        from fake_chi import FakeChi
+        backend = FakeChi(scale=0.01)
+        for container in [scenario["server"]["container"]] + [c["container"] for c in scenario["clients"]]:
+            backend.add_container(container)
+    else:
+        from backend import ChiBackend
+        backend = ChiBackend()
+
+    rows, _ = CrossTraffic(scenario, backend).run(args.output)
+    print_summary(rows)
+    if len(rows) <= len(scenario["clients"]):
+        logger.error("some flows have no results")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
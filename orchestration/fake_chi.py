@@ -0,0 +1,418 @@
+"""
+Local stand-in for the testbed API with configurable latencies.
+
+FakeChi implements the methods of backend.ChiBackend against in-memory state,
+sleeping for a configurable time per call to emulate the testbed. Containers
+become active `boot_s` seconds after creation and are removed `remove_s`
+seconds after destroy_container. Besides "public" and "serverpublic", the
+networks named in `networks` exist from the start. All latencies are multiplied by `scale`, so
+a realistic timing profile can be replayed quickly:
+
+    backend = FakeChi(scale=0.01)     # 100x faster than the default profile
+"""
+import itertools
+import json
+import random
+import re
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+
+# Default per-call latencies in seconds, roughly as observed on the testbed.
+DEFAULT_LATENCIES = {
+    "api": 0.3,                # any plain API call
+    "reserve": 2.0,
+    "create_network": 1.0,
+    "create_router": 1.5,
+    "create_container": 2.0,
+    "boot_s": 30.0,            # creation -> active
+    "destroy_container": 1.0,
+    "remove_s": 15.0,          # destroy -> removed
+    "poll": 1.0,               # polling interval of the wait_* calls
+    "sdr_design": 15.0,        # restart_sdr / make_sdr_mango / make_sdr_ni
+    "sdr_tool_s": 25.0,        # sdr_tools container creation -> key string in its log
+}
+
+
+class FakeChi:
+    def __init__(self, latencies=None, scale=1.0, networks=(), workers=None, public_ips=None, logs=None,
+                 run_agent_commands=False):
+        self.latencies = dict(DEFAULT_LATENCIES, **(latencies or {}))
+        self.scale = scale
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.leases = {}
+        self.networks = {name: {"id": f"net-{name}", "name": name, "subnets": [f"sub-{name}"]}
+                         for name in ("public", "serverpublic", *networks)}
+        self.routers = {}
+        self.containers = {}
+        self.public_ips = list(public_ips or [f"130.237.11.{i}" for i in range(100, 110)])
+        # worker -> {interface: {"connections": [...], "speed": "..."}}
+        self.workers = workers or {
+            f"worker-{i:02d}": {
+                "ens1": {"connections": [], "speed": "10000"},
+                "eno12409": {"connections": [], "speed": "1000"},
+                "eno12419": {"connections": [], "speed": "1000"},
+                "eno12429": {"connections": [], "speed": "1000"},
+            } for i in range(1, 11)
+        }
+        # container name -> list of log lines emitted after the given number of seconds
+        self.scripted_logs = logs or {}
+        self.calls = []
+        self.files = {}       # (container, path) -> (epoch time the file is complete, content)
+        # Run the commands sent to the perf-meas agent on this machine, with the
+        # container's stdout (/proc/1/fd/1) redirected to a file read by get_logs.
+        self.run_agent_commands = run_agent_commands
+        self.stdout_dir = tempfile.mkdtemp(prefix="fake_chi_") if run_agent_commands else None
+
+    def _sleep(self, key):
+        self.calls.append(key)
+        time.sleep(self.latencies.get(key, self.latencies["api"]) * self.scale)
+
+    def _id(self, prefix):
+        return f"{prefix}-{next(self.ids)}"
+
+    # reservations
+    def reserve(self, spec):
+        self._sleep("reserve")
+        with self.lock:
+            name = spec["name"] + "-lease"
+            lease = {"id": self._id("lease"), "name": name,
+                     "reservations": [{"id": self._id("res"), "resource_type": spec["type"]}]}
+            self.leases[name] = lease
+            if spec["type"] == "network":
+                net_name = spec.get("net_name", spec["name"]) + "-net"
+                self.networks[net_name] = {"id": self._id("net"), "name": net_name, "subnets": [self._id("sub")],
+                                           "lease": name}
+        return lease
+
+    def show_reservation_byname(self, name):
+        self._sleep("api")
+        return self.leases.get(name)
+
+    def list_reservations(self, brief=True):
+        self._sleep("api")
+        return [{"name": lease["name"], "id": lease["id"], "reservation_id": lease["reservations"][0]["id"]}
+                for lease in self.leases.values()]
+
+    def unreserve_byid(self, lease_id):
+        self._sleep("api")
+        with self.lock:
+            for name, lease in list(self.leases.items()):
+                if lease["id"] == lease_id:
+                    del self.leases[name]
+            for net_name, net in list(self.networks.items()):
+                if net.get("lease") and net["lease"] not in self.leases:
+                    del self.networks[net_name]
+
+    def get_segment_ids(self, name):
+        self._sleep("api")
+        return {"rj45": "100", "sfp": "101"}
+
+    def get_available_publicips(self):
+        self._sleep("api")
+        with self.lock:
+            used = {c["labels"].get(k, "").split("/")[0] for c in self.containers.values() for k in c["labels"]}
+            return [ip for ip in self.public_ips if ip not in used]
+
+    def get_worker_interfaces(self, worker_name):
+        self._sleep("api")
+        with self.lock:
+            return {worker_name: {k: dict(v, connections=list(v["connections"]))
+                                  for k, v in self.workers[worker_name].items()}}
+
+    # networks
+    def get_network(self, name):
+        self._sleep("api")
+        if name not in self.networks:
+            raise Exception(f"Network {name} not found")
+        return self.networks[name]
+
+    def create_network(self, name):
+        self._sleep("create_network")
+        with self.lock:
+            self.networks[name] = {"id": self._id("net"), "name": name, "subnets": []}
+            return self.networks[name]
+
+    def create_subnet(self, name, network_id, cidr, gateway_ip=None, enable_dhcp=False):
+        self._sleep("api")
+        with self.lock:
+            subnet_id = self._id("sub")
+            for net in self.networks.values():
+                if net["id"] == network_id:
+                    net["subnets"].append(subnet_id)
+            return {"id": subnet_id, "name": name, "cidr": cidr}
+
+    def delete_network(self, network_id):
+        self._sleep("api")
+        with self.lock:
+            for name, net in list(self.networks.items()):
+                if net["id"] == network_id:
+                    del self.networks[name]
+
+    def get_router(self, name):
+        self._sleep("api")
+        if name not in self.routers:
+            raise Exception(f"Router {name} not found")
+        return self.routers[name]
+
+    def create_router(self, name, gw_network_name):
+        self._sleep("create_router")
+        with self.lock:
+            self.routers[name] = {"id": self._id("router"), "name": name, "subnets": [], "routes": []}
+            return self.routers[name]
+
+    def _router_by_id(self, router_id):
+        return next(r for r in self.routers.values() if r["id"] == router_id)
+
+    def add_subnet_to_router(self, router_id, subnet_id):
+        self._sleep("api")
+        with self.lock:
+            self._router_by_id(router_id)["subnets"].append(subnet_id)
+
+    def remove_subnet_from_router(self, router_id, subnet_id):
+        self._sleep("api")
+        with self.lock:
+            self._router_by_id(router_id)["subnets"].remove(subnet_id)
+
+    def add_route_to_router(self, router_id, cidr, nexthop):
+        self._sleep("api")
+        with self.lock:
+            self._router_by_id(router_id)["routes"].append((cidr, nexthop))
+
+    def remove_all_routes_from_router(self, router_id):
+        self._sleep("api")
+        with self.lock:
+            self._router_by_id(router_id)["routes"] = []
+
+    def delete_router(self, router_id):
+        self._sleep("api")
+        with self.lock:
+            for name, router in list(self.routers.items()):
+                if router["id"] == router_id:
+                    del self.routers[name]
+
+    # containers
+    def create_container(self, name, image, reservation_id, environment=None, mounts=None, nets=None, labels=None):
+        self._sleep("create_container")
+        now = time.monotonic()
+        with self.lock:
+            if name in self.containers:
+                raise Exception(f"Container {name} already exists")
+            worker = next((l["name"][:-len("-lease")] for l in self.leases.values()
+                           if l["reservations"][0]["id"] == reservation_id), None)
+            labels = dict(labels or {})
+            for key, value in labels.items():
+                # Several containers may share an interface (e.g. the 5G core functions on ens1f1).
+                if worker in self.workers and key.endswith(".interface") and value in self.workers[worker]:
+                    self.workers[worker][value]["connections"].append(name)
+            self.containers[name] = {
+                "name": name, "image": image, "worker": worker, "labels": labels, "nets": nets or [],
+                "environment": environment or {}, "created": now,
+                "active_at": now + self.latencies["boot_s"] * self.scale, "removed_at": None,
+            }
+        return self.containers[name]
+
+    def _status(self, name):
+        c = self.containers.get(name)
+        if c is None:
+            return None
+        now = time.monotonic()
+        if c["removed_at"] is not None:
+            if now >= c["removed_at"]:
+                self._release(name)
+                return None
+            return "Deleting"
+        return "Running" if now >= c["active_at"] else "Creating"
+
+    def _release(self, name):
+        c = self.containers.pop(name, None)
+        if c and c["worker"] in self.workers:
+            for iface in self.workers[c["worker"]].values():
+                if name in iface["connections"]:
+                    iface["connections"].remove(name)
+
+    def wait_for_active(self, name):
+        while True:
+            self._sleep("poll")
+            with self.lock:
+                if self._status(name) == "Running":
+                    return self.containers[name]
+
+    def get_container_status(self, name):
+        self._sleep("api")
+        with self.lock:
+            return self._status(name)
+
+    def destroy_container(self, name):
+        self._sleep("destroy_container")
+        with self.lock:
+            if name not in self.containers:
+                raise Exception(f"Container {name} not found")
+            self.containers[name]["removed_at"] = time.monotonic() + self.latencies["remove_s"] * self.scale
+
+    def wait_until_container_removed(self, name):
+        while True:
+            self._sleep("poll")
+            with self.lock:
+                if self._status(name) is None:
+                    return
+
+    def add_container(self, name, worker=None):
+        """Register an already running container (e.g. one created outside the fake)."""
+        with self.lock:
+            now = time.monotonic()
+            self.containers[name] = {"name": name, "image": "", "worker": worker, "labels": {}, "nets": [],
+                                     "environment": {}, "created": now, "active_at": now, "removed_at": None}
+
+    def execute(self, container_ref, command):
+        """
+        Runs nothing, but understands the two commands the orchestration sends:
+        a curl POST to the perf-meas agent on port 50505 (iperf3 clients with
+        --logfile get a synthetic JSON result once their run is over) and
+        `cat <file>`.
+        """
+        self._sleep("api")
+        with self.lock:
+            if container_ref not in self.containers:
+                raise Exception(f"Container {container_ref} not found")
+        args = shlex.split(command)
+        if args and args[0] == "cat":
+            ready_at, content = self.files.get((container_ref, args[1]), (0, ""))
+            if time.time() < ready_at:
+                content = content[:len(content) // 2]      # still being written
+            return {"exit_code": 0 if content else 1, "output": content}
+        if args and args[0] == "curl" and "-d" in args:
+            self._agent(container_ref, json.loads(args[args.index("-d") + 1])["cmd"])
+            return {"exit_code": 0, "output": "Command received and started in the background.\n"}
+        return {"exit_code": 0, "output": ""}
+
+    def _agent(self, container, cmd):
+        if self.run_agent_commands:
+            # Append, as several commands share the container's stdout.
+            cmd = re.sub(r">>? */proc/1/fd/1", ">> " + self._stdout(container), cmd)
+            subprocess.Popen(["sh", "-c", cmd],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        match = re.search(r"iperf3 -c .*--logfile (\S+)", cmd)
+        if not match:
+            return
+        opts = dict(re.findall(r"(-[tbi]) (\S+)", cmd))
+        start = re.search(r"-lt (\d+)", cmd)
+        start_at = int(start.group(1)) if start else time.time()
+        duration = int(opts.get("-t", 10))
+        result = fake_iperf3_result(duration, opts.get("-b", "1M"), " -u" in cmd, float(opts.get("-i", 1)))
+        with self.lock:
+            self.files[(container, match.group(1))] = (start_at + duration, json.dumps(result))
+
+    def get_logs(self, container_ref):
+        self._sleep("api")
+        with self.lock:
+            c = self.containers.get(container_ref)
+            if c is None:
+                raise Exception(f"Container {container_ref} not found")
+            age = (time.monotonic() - c["created"]) / self.scale if self.scale else float("inf")
+        logs = "".join(line + "\n" for at, line in self.scripted_logs.get(container_ref, []) if at <= age)
+        if self.run_agent_commands and os.path.exists(self._stdout(container_ref)):
+            with open(self._stdout(container_ref), "r", errors="replace") as f:
+                logs += f.read()
+        return logs
+
+    def _stdout(self, container):
+        return os.path.join(self.stdout_dir, container + ".log")
+
+    # SDRs
+    def _reset_sdr(self, container, line, worker_net_interface):
+        """
+        Like the chi.expeca reset functions: run the reset in `container` (one
+        name for all SDRs, shared by concurrent resets), print `line` once the
+        SDR is up after `sdr_design` seconds, then remove the container.
+        """
+        with self.lock:
+            c = self.containers.get(container)
+            if c is None:
+                now = time.monotonic()
+                c = self.containers[container] = {
+                    "name": container, "image": "sdr-tools", "worker": None,
+                    "labels": {"networks.1.interface": worker_net_interface}, "nets": [], "environment": {},
+                    "created": now, "active_at": now, "removed_at": None, "resets": 0}
+                self.scripted_logs[container] = []
+            c["resets"] += 1
+            age = (time.monotonic() - c["created"]) / self.scale if self.scale else 0.0
+            self.scripted_logs[container].append((age + self.latencies["sdr_design"], line))
+        try:
+            self._sleep("sdr_design")
+            time.sleep(self.latencies["remove_s"] * self.scale)      # wait_until_container_removed
+        finally:
+            with self.lock:
+                c["resets"] -= 1
+                if not c["resets"]:
+                    self._release(container)
+
+    def restart_sdr(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        self._reset_sdr("reboot-sdr", f"{sdr_name} mango is up again.", worker_net_interface)
+
+    def make_sdr_mango(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        self._reset_sdr("make-sdr-mango", f"{sdr_name} design has been changed to mango", worker_net_interface)
+
+    def make_sdr_ni(self, sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface):
+        self._reset_sdr("make-sdr-ni", f"{sdr_name} design has been changed to ni", worker_net_interface)
+
+    def sdr_tools(self, sdr_name, sdr_net_id, environment, waiting_iter, waiting_sec, key_str,
+                  verbose, worker_reservation_id, worker_net_interface):
+        """Like chi.expeca.sdr_tools: run a <sdr>-tools container and check its log every waiting_sec."""
+        name = sdr_name + "-tools"
+        line = f"{environment.get('SERVICE', '')}: {key_str}"
+        with self.lock:
+            self.scripted_logs[name] = [(self.latencies["sdr_tool_s"], line)]
+        self.create_container(name=name, image="sdr-tools", reservation_id=worker_reservation_id,
+                              environment=environment, labels={"networks.1.interface": worker_net_interface})
+        try:
+            for _ in range(waiting_iter):
+                time.sleep(waiting_sec * self.scale)
+                if key_str and key_str in self.get_logs(name):
+                    return
+            if key_str:
+                raise Exception(f"{name} did not report '{key_str}'")
+        finally:
+            with self.lock:
+                self._release(name)
+
+
+def parse_bitrate(text):
+    """iperf3 -b value ("5M", "1G", "800K", "100000") in bits per second."""
+    units = {"K": 1e3, "M": 1e6, "G": 1e9}
+    text = str(text).upper()
+    return float(text[:-1]) * units[text[-1]] if text[-1] in units else float(text)
+
+
+def fake_iperf3_result(duration, bitrate, udp, interval=1.0):
+    """A plausible iperf3 -J client result for a flow at the given offered load."""
+    bps = parse_bitrate(bitrate)
+    intervals, steps = [], max(1, int(duration / interval))
+    for i in range(steps):
+        rate = bps * random.uniform(0.97, 1.0)
+        s = {"start": i * interval, "end": (i + 1) * interval, "seconds": interval,
+             "bytes": int(rate * interval / 8), "bits_per_second": rate}
+        if udp:
+            s["packets"] = int(s["bytes"] / 1448)
+        else:
+            s["retransmits"] = random.randint(0, 3)
+        intervals.append({"streams": [], "sum": s})
+    total_bytes = sum(i["sum"]["bytes"] for i in intervals)
+    rate = total_bytes * 8 / duration
+    if udp:
+        packets = sum(i["sum"]["packets"] for i in intervals)
+        lost = int(packets * random.uniform(0, 0.01))
+        end = {"sum": {"start": 0, "end": duration, "seconds": duration, "bytes": total_bytes,
+                       "bits_per_second": rate, "jitter_ms": random.uniform(0.1, 2.0),
+                       "lost_packets": lost, "packets": packets, "lost_percent": 100.0 * lost / packets if packets else 0}}
+    else:
+        end = {"sum_sent": {"seconds": duration, "bytes": total_bytes, "bits_per_second": rate,
+                            "retransmits": sum(i["sum"]["retransmits"] for i in intervals)},
+               "sum_received": {"seconds": duration, "bytes": total_bytes, "bits_per_second": rate * 0.999}}
+    return {"start": {"test_start": {"protocol": "UDP" if udp else "TCP", "duration": duration}},
+            "intervals": intervals, "end": end}
@@ -0,0 +1,90 @@
+"""
+Dependency-graph executor shared by the orchestration modules.
+
+run_graph runs a set of named steps on a thread pool; every step starts as
+soon as all the steps it depends on have completed.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+
+from loguru import logger
+
+
+def run_graph(steps, concurrency=16, keep_going=False):
+    """
+    Run `steps`, a dict name -> (func, [dependency names]). Dependencies on names
+    that are not in `steps` are ignored.
+
+    Returns (timings, results, failures): timings maps name -> (start, end)
+    perf_counter times, results maps name -> return value and failures maps
+    name -> exception. By default no new step is started after the first
+    failure; with keep_going=True only the steps depending on a failed step
+    are skipped.
+    """
+    deps = {name: [d for d in step_deps if d in steps] for name, (_, step_deps) in steps.items()}
+    _check_acyclic(deps)
+    timings, results, failures = {}, {}, {}
+    done, skipped, running = set(), set(), {}
+
+    def timed(name):
+        func = steps[name][0]
+        start = time.perf_counter()
+        result = func()
+        return start, time.perf_counter(), result
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while True:
+            if keep_going or not failures:
+                for name in steps:
+                    if name in done or name in skipped or name in failures or name in running.values():
+                        continue
+                    if any(d in failures or d in skipped for d in deps[name]):
+                        skipped.add(name)
+                        logger.warning(f"skipping {name}: a dependency failed")
+                    elif all(d in done for d in deps[name]):
+                        running[pool.submit(timed, name)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    start, end, results[name] = future.result()
+                    timings[name] = (start, end)
+                    done.add(name)
+                except Exception as e:
+                    logger.error(f"{name} failed: {e}")
+                    failures[name] = e
+
+    return timings, results, failures
+
+
+def _check_acyclic(deps):
+    """Raise ValueError if the dependency graph has a cycle."""
+    state = {}
+    for root in deps:
+        if root in state:
+            continue
+        state[root] = "visiting"
+        stack = [(root, iter(deps[root]))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = "done"
+                stack.pop()
+            elif state.get(child) == "visiting":
+                raise ValueError(f"dependency cycle through {child}")
+            elif state.get(child) is None:
+                state[child] = "visiting"
+                stack.append((child, iter(deps[child])))
+
+
+def print_timings(timings, t0, wall, title="Step timings"):
+    """Log the per-step timing breakdown, in start order."""
+    logger.info(f"{title}:")
+    width = max((len(name) for name in timings), default=0)
+    for name, (start, end) in sorted(timings.items(), key=lambda kv: kv[1][0]):
+        logger.info(f"  {name:<{width}}  start +{start - t0:7.2f}s  duration {end - start:7.2f}s")
+    total = sum(end - start for start, end in timings.values())
+    logger.info(f"  wall time {wall:.2f}s (sum of steps {total:.2f}s)")
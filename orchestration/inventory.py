@@ -0,0 +1,217 @@
+"""
+Cached inventory of the testbed.
+
+The notebooks, and every step of a topology, ask the testbed for the same
+things over and over: show_reservation_byname per lease, get_segment_ids,
+get_available_publicips and get_worker_interfaces per container. Inventory
+fetches each of them once, keeps them indexed in memory and refreshes an
+entry only when it is older than `ttl` seconds:
+
+  leases        by lease name and by worker (one list_reservations call)
+  segments      segment name -> segment id, per network (never refreshed)
+  public IPs    the free public addresses
+  interfaces    the free interfaces of each worker, with their speed
+
+Changes made through this process are applied to the cache directly
+(record_lease, forget_lease), so no refetch is needed after a reserve or an
+unreserve. Public IPs and interfaces are handed out under a lock and stay
+taken until released, also across refreshes, so containers launched in
+parallel never get the same address or interface.
+
+    inventory = Inventory(backend, ttl=60)
+    inventory.prefetch(["worker-07", "worker-08"])
+    inventory.reservation_id("worker-07")
+    ip = inventory.allocate_public_ip()
+    ens, = inventory.allocate_interfaces("worker-07", ["10000"])
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from loguru import logger
+
+
+def lease_name(name):
+    return name + "-lease"
+
+
+def lease_reservation_id(lease):
+    """Reservation id of a lease, from show_reservation_byname or from a brief list_reservations entry."""
+    if lease.get("reservations"):
+        return lease["reservations"][0]["id"]
+    return lease["reservation_id"]
+
+
+class Inventory:
+    """Indexed, TTL-refreshed cache of leases, segments, public IPs and worker interfaces."""
+
+    def __init__(self, backend, ttl=60, claimed=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.fetching = {}                    # key -> lock held while the entry is fetched
+        self.entries = {}                     # key -> (fetch time, value)
+        self.claimed = {w: set(i) for w, i in (claimed or {}).items()}  # worker -> interfaces reserved by name
+        self.taken_ips = set()
+        self.taken_interfaces = {}            # worker -> interfaces handed out
+
+    # cache
+    def _get(self, key, fetch, ttl=None):
+        """The cached value of `key`, fetched again when it is older than ttl (False: never)."""
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (ttl is False or time.monotonic() - entry[0] < ttl):
+                return entry[1]
+            fetch_lock = self.fetching.setdefault(key, threading.Lock())
+        with fetch_lock:
+            # another thread may have fetched it while we waited
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and (ttl is False or time.monotonic() - entry[0] < ttl):
+                    return entry[1]
+            value = fetch()
+            with self.lock:
+                self.entries[key] = (time.monotonic(), value)
+            return value
+
+    def invalidate(self, key=None):
+        """Drop one entry ("leases", "public_ips", ("interfaces", worker), ...) or everything."""
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def prefetch(self, workers=()):
+        """
+        Fetch the leases, the public IPs and the interfaces of `workers`
+        concurrently. A failed fetch is only logged; it is retried on first use.
+        """
+        calls = [("leases", self.leases), ("public ips", self.public_ips)]
+        calls += [(f"interfaces of {w}", lambda w=w: self.free_interfaces(w)) for w in workers]
+
+        def fetch(call):
+            label, func = call
+            try:
+                func()
+            except Exception as e:
+                logger.warning(f"could not fetch the {label}: {e}")
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            list(pool.map(fetch, calls))
+
+    # leases
+    def leases(self):
+        """Lease name -> lease, for all leases of the project."""
+        def fetch():
+            leases = {lease["name"]: lease for lease in self.backend.list_reservations(brief=True)}
+            logger.info(f"{len(leases)} leases in the project.")
+            return leases
+        return self._get("leases", fetch)
+
+    def lease(self, name):
+        """The lease called `name`, or None."""
+        return self.leases().get(name)
+
+    def worker_lease(self, worker):
+        """The lease of a worker (or of any reserved resource), by resource name."""
+        return self.lease(lease_name(worker))
+
+    def reservation_id(self, name):
+        lease = self.worker_lease(name)
+        if not lease:
+            raise Exception(f"No reservation for {name}")
+        return lease_reservation_id(lease)
+
+    def record_lease(self, lease):
+        """Add a lease this process created."""
+        leases = self.leases()
+        with self.lock:
+            leases[lease["name"]] = lease
+
+    def forget_lease(self, name):
+        """Remove a lease this process released."""
+        leases = self.leases()
+        with self.lock:
+            leases.pop(name, None)
+
+    # segments
+    def segment_ids(self, name):
+        """Segment name -> segment id of a network resource. Segments do not change, so this is never refetched."""
+        return self._get(("segments", name), lambda: self.backend.get_segment_ids(name), ttl=False)
+
+    def segment_id(self, name, segment):
+        return self.segment_ids(name)[segment]
+
+    # public IPs
+    def _fetch_public_ips(self):
+        ips = list(self.backend.get_available_publicips())
+        logger.info(f"Available public ips: {ips}.")
+        return ips
+
+    def public_ips(self):
+        """Free public IPs, not counting the ones handed out by allocate_public_ip."""
+        ips = self._get("public_ips", self._fetch_public_ips)
+        with self.lock:
+            return [ip for ip in ips if ip not in self.taken_ips]
+
+    def allocate_public_ip(self):
+        for refresh in (False, True):
+            if refresh:
+                # addresses may have been freed since the pool was fetched
+                self.invalidate("public_ips")
+            ips = self._get("public_ips", self._fetch_public_ips)
+            with self.lock:
+                free = [ip for ip in ips if ip not in self.taken_ips]
+                if free:
+                    self.taken_ips.add(free[0])
+                    return free[0]
+        raise Exception("No public IP available")
+
+    def release_public_ip(self, ip):
+        with self.lock:
+            self.taken_ips.discard(ip)
+
+    # interfaces
+    def _fetch_interfaces(self, worker):
+        interfaces = list(self.backend.get_worker_interfaces(worker).values())[0]
+        free = {name: str(info.get("speed", "")) for name, info in interfaces.items() if not info["connections"]}
+        logger.info(f"Available interfaces on {worker}: {list(free)}")
+        return free
+
+    def _available(self, worker, free):
+        unavailable = self.claimed.get(worker, set()) | self.taken_interfaces.get(worker, set())
+        return {name: speed for name, speed in free.items() if name not in unavailable}
+
+    def free_interfaces(self, worker):
+        """Interface -> speed of the free interfaces of `worker`, not counting claimed or allocated ones."""
+        free = self._get(("interfaces", worker), lambda: self._fetch_interfaces(worker))
+        with self.lock:
+            return self._available(worker, free)
+
+    def allocate_interfaces(self, worker, speeds):
+        """
+        Take one free interface of `worker` per entry of `speeds` (a required
+        speed such as "10000", or None for any), all or none. Speed-constrained
+        entries are served first so that an unconstrained one does not take
+        the only 10 Gbps port.
+        """
+        if not speeds:
+            return []
+        free = self._get(("interfaces", worker), lambda: self._fetch_interfaces(worker))
+        with self.lock:
+            free = self._available(worker, free)
+            taken = [None] * len(speeds)
+            order = sorted(range(len(speeds)), key=lambda i: speeds[i] is None)
+            for i in order:
+                match = next((name for name, s in free.items()
+                              if name not in taken and (speeds[i] is None or s == str(speeds[i]))), None)
+                if match is None:
+                    raise Exception(f"Did not find proper interfaces on {worker}")
+                taken[i] = match
+            self.taken_interfaces.setdefault(worker, set()).update(taken)
+            return taken
+
+    def release_interfaces(self, worker, interfaces):
+        with self.lock:
+            self.taken_interfaces.get(worker, set()).difference_update(interfaces)
@@ -0,0 +1,104 @@
+"""
+Log-based readiness checks for containers.
+
+wait_for_log tails a container's output and returns as soon as a line matches
+a regular expression, instead of sleeping for a fixed time and checking once.
+wait_for_logs watches several containers concurrently. Only the part of the
+log that is new since the previous poll is searched.
+
+    from logwatch import wait_for_logs
+    matches = wait_for_logs(backend, {
+        "sdr-04-tools": r"mango is running ap with ip",
+        "sdr-09-tools": r"mango is running sta with ip",
+    }, timeout=60)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import re
+import time
+
+from loguru import logger
+
+
+class LogTail:
+    """Incremental reader of a container log that only returns unseen lines."""
+
+    def __init__(self, backend, container):
+        self.backend = backend
+        self.container = container
+        self.offset = 0
+        self.partial = ""
+
+    def read(self):
+        """Complete lines added since the last call."""
+        text = self.backend.get_logs(self.container) or ""
+        if isinstance(text, bytes):
+            text = text.decode(errors="replace")
+        if len(text) < self.offset:
+            # The log was rotated or the container restarted: start over.
+            self.offset, self.partial = 0, ""
+        chunk = self.partial + text[self.offset:]
+        self.offset = len(text)
+        lines = chunk.split("\n")
+        self.partial = lines.pop()
+        return lines
+
+
+def wait_for_log(backend, container, pattern, timeout=60, poll_interval=0.5, max_interval=2.0, stop=None):
+    """
+    Poll the logs of `container` until a line matches `pattern` (a regular
+    expression or compiled pattern). The poll interval starts at poll_interval
+    and grows up to max_interval. Returns the re.Match, or raises TimeoutError
+    after `timeout` seconds. A container that does not exist yet is retried
+    until the deadline. `stop` (a threading.Event) ends the wait early, after
+    one more poll, for a container whose run is known to be over.
+    """
+    regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+    tail = LogTail(backend, container)
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = poll_interval
+    stopped = False
+    while True:
+        try:
+            for line in tail.read():
+                match = regex.search(line)
+                if match:
+                    logger.success(f"{container} is ready after {time.monotonic() - start:.1f}s: {line.strip()}")
+                    return match
+        except Exception as e:
+            logger.debug(f"cannot read the logs of {container}: {e}")
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutError(f"{container}: no log line matching '{regex.pattern}' after {timeout}s")
+        if stop is not None and stopped:
+            raise TimeoutError(f"{container}: finished without a log line matching '{regex.pattern}'")
+        stopped = stop is not None and stop.is_set()
+        if stopped:
+            continue
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 1.5, max_interval)
+
+
+def wait_for_logs(backend, patterns, timeout=60, poll_interval=0.5, max_interval=2.0):
+    """
+    Watch several containers concurrently. `patterns` maps container name ->
+    pattern. Returns a dict container -> re.Match; raises TimeoutError naming
+    every container that did not match before the deadline.
+    """
+    if not patterns:
+        return {}
+
+    def watch(item):
+        container, pattern = item
+        try:
+            return container, wait_for_log(backend, container, pattern, timeout, poll_interval, max_interval)
+        except TimeoutError as e:
+            logger.error(str(e))
+            return container, None
+
+    with ThreadPoolExecutor(max_workers=len(patterns)) as pool:
+        matches = dict(pool.map(watch, patterns.items()))
+    missing = [container for container, match in matches.items() if match is None]
+    if missing:
+        raise TimeoutError(f"not ready after {timeout}s: {', '.join(missing)}")
+    return matches
@@ -0,0 +1,182 @@
+"""
+Client for the perf-meas agent (samiemostafavi/perf-meas) on port 50505.
+
+The agent takes {"cmd": "..."} as a JSON POST and runs the command in the
+background with a shell. The notebooks reach it with
+chi.container.execute(..., "curl ... http://localhost:50505/"), one API round
+trip and one curl process per command. PerfMeasClient offers two transports:
+
+  direct  POST to http://<host>:50505/ over one keep-alive session, for hosts
+          reachable from where this runs (e.g. over edge-net or an SSH tunnel
+          to a local port). Costs a few milliseconds per command.
+  exec    the curl-through-execute path of the notebooks, for containers that
+          are only reachable through the testbed API.
+
+submit_batch hands many commands to the agent in a single call. run and
+run_many also stream the commands' output: every output line is tagged with a
+per-command id and written to the container's stdout, which is tailed
+incrementally through the container logs (logwatch.LogTail), and an exit
+marker ends each command's stream.
+
+    client = PerfMeasClient("end-node", backend, host="10.70.70.3")
+    client.submit("iperf3 -s -p 53301 > /proc/1/fd/1 2>&1")
+    for line in client.run("ping -c 5 10.70.70.210"):
+        print(line)
+"""
+import itertools
+import json
+import re
+import shlex
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from logwatch import LogTail
+
+AGENT_PORT = 50505
+EXIT_MARKER = "__perfmeas_exit__"
+
+
+def agent_command(cmd, url=f"http://localhost:{AGENT_PORT}/"):
+    """The execute() command that hands `cmd` to the agent, JSON-encoded and shell-quoted."""
+    body = json.dumps({"cmd": cmd})
+    return f"curl -s -X POST -H 'Content-Type: application/json' -d {shlex.quote(body)} {url}"
+
+
+def batch_command(cmds, parallel=True):
+    """
+    One shell command that runs all `cmds`: concurrently (each in the
+    background, then wait) or one after the other.
+    """
+    if parallel:
+        return " ".join(f"( {cmd} ) &" for cmd in cmds) + " wait"
+    return "; ".join(f"( {cmd} )" for cmd in cmds)
+
+
+def make_session(pool_size=4):
+    """Keep-alive session for the direct transport. POSTs are not retried, commands must run once."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    return session
+
+
+class PerfMeasClient:
+    """Sends commands to the perf-meas agent of one container and streams their output back."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, container, backend=None, host=None, port=AGENT_PORT, session=None, timeout=10):
+        if host is None and backend is None:
+            raise ValueError("either a backend (exec transport) or a host (direct transport) is needed")
+        self.container = container
+        self.backend = backend
+        self.url = f"http://{host}:{port}/" if host else None
+        self.session = session or (make_session() if host else None)
+        self.timeout = timeout
+        self.tail = None
+        self.lock = threading.Lock()
+        self.pending = {}          # tag -> list of output lines received before they were asked for
+
+    # submission
+    def submit(self, cmd):
+        """Hand one shell command to the agent. Returns the agent's reply."""
+        if self.url:
+            resp = self.session.post(self.url, json={"cmd": cmd}, timeout=self.timeout)
+            if resp.status_code != 200:
+                raise Exception(f"{self.container}: agent returned {resp.status_code}: {resp.text}")
+            return resp.text
+        result = self.backend.execute(self.container, agent_command(cmd))
+        if result.get("exit_code", 0) != 0:
+            raise Exception(f"{self.container}: agent call failed: {result}")
+        return result.get("output", "")
+
+    def submit_batch(self, cmds, parallel=True):
+        """Hand all `cmds` to the agent in one call."""
+        if cmds:
+            return self.submit(batch_command(cmds, parallel))
+
+    # streaming
+    def tagged(self, cmd, tag):
+        """`cmd` with every output line prefixed by [tag], followed by an exit marker line."""
+        return (f"{{ ( {cmd} ) ; echo \"{EXIT_MARKER} $?\" ; }} 2>&1 "
+                f"| sed -u 's/^/[{tag}] /' > /proc/1/fd/1")
+
+    def start(self, cmds, parallel=True):
+        """Submit `cmds` with tagged output. Returns their tags, in order."""
+        if self.backend is None:
+            raise ValueError("streaming output needs a backend to read the container logs")
+        with self.lock:
+            if self.tail is None:
+                self.tail = LogTail(self.backend, self.container)
+                self.tail.read()           # only output from now on
+        tags = [f"pm{next(self._ids)}" for _ in cmds]
+        self.submit_batch([self.tagged(cmd, tag) for cmd, tag in zip(cmds, tags)], parallel)
+        return tags
+
+    def poll(self):
+        """Read new log lines and sort the tagged ones by tag."""
+        with self.lock:
+            for line in self.tail.read():
+                match = re.match(r"\[(pm\d+)\] (.*)", line)
+                if match:
+                    self.pending.setdefault(match.group(1), []).append(match.group(2))
+
+    def stream(self, tag, timeout=60, poll_interval=0.2, max_interval=1.0):
+        """
+        Yield the output lines of the command with `tag` as they appear. Returns
+        its exit code (StopIteration.value); raises TimeoutError after `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        interval = poll_interval
+        while True:
+            self.poll()
+            with self.lock:
+                lines = self.pending.pop(tag, [])
+            for line in lines:
+                if line.startswith(EXIT_MARKER):
+                    return int(line.split()[-1])
+                yield line
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{self.container}: no exit marker for {tag} after {timeout}s")
+            if not lines:
+                time.sleep(min(interval, max(0, deadline - time.monotonic())))
+                interval = min(interval * 1.5, max_interval)
+            else:
+                interval = poll_interval
+
+    def run(self, cmd, timeout=60):
+        """Run one command and yield its output lines as they arrive."""
+        tag, = self.start([cmd])
+        return (yield from self.stream(tag, timeout))
+
+    def run_many(self, cmds, parallel=True, timeout=60):
+        """
+        Run many commands with one agent call and collect their output.
+        Returns a list of (exit code, output lines), in the order of `cmds`;
+        the exit code is None for a command that did not finish in time.
+        """
+        tags = self.start(cmds, parallel)
+        results = {}
+        deadline = time.monotonic() + timeout
+        interval = 0.2
+        while len(results) < len(tags):
+            self.poll()
+            with self.lock:
+                for tag in tags:
+                    lines = self.pending.get(tag, [])
+                    if lines and lines[-1].startswith(EXIT_MARKER):
+                        results[tag] = (int(lines[-1].split()[-1]), lines[:-1])
+                        del self.pending[tag]
+            if len(results) == len(tags):
+                break
+            if time.monotonic() >= deadline:
+                with self.lock:
+                    for tag in tags:
+                        results.setdefault(tag, (None, self.pending.pop(tag, [])))
+                break
+            time.sleep(interval)
+            interval = min(interval * 1.5, 1.0)
+        return [results[tag] for tag in tags]
@@ -0,0 +1,159 @@
+"""
+Parallel SDR bring-up.
+
+The notebooks change SDR designs one SDR at a time with a time.sleep(10) in
+between, and call chi.expeca.sdr_tools with waiting_iter/waiting_sec values
+that check the tools container's log only every 10 seconds. The functions
+here run the operations for all SDRs concurrently: reset_sdrs watches the
+output of the reset containers for the line that says the SDR is up (see
+logwatch.py) instead of sleeping, and sdr_tools checks for its key string
+every `poll` seconds until `timeout`, so each step returns shortly after the
+SDR is ready.
+
+Example (the AP/STA setup of tecosa_demo_1.ipynb):
+
+    import sys; sys.path.append("orchestration")
+    from backend import ChiBackend
+    from sdr import reset_sdrs, configure_sdrs
+
+    backend = ChiBackend()
+    reset_sdrs(backend, ["sdr-04", "sdr-09"], worker10_reservation_id, "ens1", action="mango")
+    configure_sdrs(backend, [
+        {"sdr": "sdr-04", "key_str": "mango is running ap with ip",
+         "environment": {"SERVICE": "start_mango", "DESIGN": "mango", "SDR": "sdr-04", "SIDE": "ap",
+                         "CONFIG": "{\\"mac_addr\\":\\"40:d8:55:04:20:19\\"}", "JSON_PATH": "sdrs.json"}},
+        {"sdr": "sdr-09", "key_str": "mango is running sta with ip",
+         "environment": {"SERVICE": "start_mango", "DESIGN": "mango", "SDR": "sdr-09", "SIDE": "sta",
+                         "CONFIG": "{\\"mac_addr\\":\\"40:d8:55:04:20:12\\"}", "JSON_PATH": "sdrs.json"}},
+    ], worker10_reservation_id, "ens1")
+"""
+from concurrent.futures import ThreadPoolExecutor
+import math
+import re
+import threading
+import time
+
+from loguru import logger
+
+from logwatch import wait_for_log
+
+# backend method per reset action
+RESET_ACTIONS = {
+    "restart": "restart_sdr",
+    "mango": "make_sdr_mango",
+    "ni": "make_sdr_ni",
+}
+# container the backend method runs the reset in, and the line it prints once
+# the SDR is up ({sdr} is replaced by the SDR name)
+RESET_CONTAINERS = {
+    "restart": "reboot-sdr",
+    "mango": "make-sdr-mango",
+    "ni": "make-sdr-ni",
+}
+RESET_READY = {
+    "restart": r"{sdr} \w+ is up again",
+    "mango": r"{sdr} design has been changed to mango",
+    "ni": r"{sdr} design has been changed to ni",
+}
+
+
+def run_concurrently(calls):
+    """
+    Run the (label, func) pairs concurrently. Returns a dict label -> seconds
+    taken; raises an Exception naming the failed labels after all have finished.
+    """
+    def timed(call):
+        label, func = call
+        start = time.perf_counter()
+        try:
+            func()
+            return label, time.perf_counter() - start, None
+        except Exception as e:
+            logger.error(f"{label} failed: {e}")
+            return label, time.perf_counter() - start, e
+
+    with ThreadPoolExecutor(max_workers=max(1, len(calls))) as pool:
+        results = list(pool.map(timed, calls))
+    for label, seconds, error in results:
+        if error is None:
+            logger.success(f"{label} done in {seconds:.1f}s")
+    failed = [label for label, _, error in results if error is not None]
+    if failed:
+        raise Exception(f"failed: {', '.join(failed)}")
+    return {label: seconds for label, seconds, _ in results}
+
+
+def reset_sdrs(backend, sdr_names, worker_reservation_id, worker_net_interface, action="restart", net_suffix="-net",
+               ready=None, timeout=300):
+    """
+    Restart the SDRs, or load the mango/ni design on them, all at the same time.
+    While a reset runs, the output of its reset container is watched for
+    `ready` (a regular expression, {sdr} is replaced by the SDR name; default
+    RESET_READY[action]). An SDR whose reset ends without that line, or that
+    does not report it within `timeout` seconds, fails the call, so
+    configure_sdrs never starts sdr_tools against an SDR that is still loading
+    its design.
+    """
+    method = getattr(backend, RESET_ACTIONS[action])
+    container = RESET_CONTAINERS[action]
+    ready = ready or RESET_READY[action]
+
+    def reset(sdr_name, sdr_net_id):
+        finished = threading.Event()
+
+        def run():
+            try:
+                method(sdr_name, sdr_net_id, worker_reservation_id, worker_net_interface)
+            finally:
+                finished.set()
+
+        # The reset containers of all SDRs share one name, so each SDR watches
+        # it for its own line rather than through one wait_for_logs entry.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(run)
+            try:
+                wait_for_log(backend, container, ready.replace("{sdr}", re.escape(sdr_name)), timeout=timeout,
+                             stop=finished)
+            finally:
+                future.result()
+
+    calls = []
+    for sdr_name in sdr_names:
+        sdr_net_id = backend.get_network(sdr_name + net_suffix)["id"]
+        calls.append((f"{RESET_ACTIONS[action]}({sdr_name})",
+                      lambda sdr_name=sdr_name, sdr_net_id=sdr_net_id: reset(sdr_name, sdr_net_id)))
+    return run_concurrently(calls)
+
+
+def configure_sdrs(backend, jobs, worker_reservation_id, worker_net_interface,
+                   timeout=40, poll=2, net_suffix="-net", verbose=False):
+    """
+    Run one sdr_tools job per entry of `jobs` concurrently. A job is a dict with
+    "sdr", "environment" and "key_str"; it may override "timeout". A job with a
+    key string returns as soon as the string shows up in the tools container's
+    log (checked every `poll` seconds); a job without one waits for its timeout,
+    as sdr_tools does.
+    """
+    calls = []
+    for job in jobs:
+        sdr_name = job["sdr"]
+        sdr_net_id = backend.get_network(sdr_name + net_suffix)["id"]
+        job_timeout = job.get("timeout", timeout)
+        if job.get("key_str"):
+            waiting_iter, waiting_sec = max(1, math.ceil(job_timeout / poll)), poll
+        else:
+            waiting_iter, waiting_sec = 1, job_timeout
+        kwargs = dict(
+            sdr_name=sdr_name,
+            sdr_net_id=sdr_net_id,
+            environment=job["environment"],
+            waiting_iter=waiting_iter,
+            waiting_sec=waiting_sec,
+            key_str=job.get("key_str", ""),
+            verbose=job.get("verbose", verbose),
+            worker_reservation_id=worker_reservation_id,
+            worker_net_interface=worker_net_interface,
+        )
+        service = job["environment"].get("SERVICE", "sdr_tools")
+        calls.append((f"{service}({sdr_name})", lambda kwargs=kwargs: backend.sdr_tools(**kwargs)))
+    return run_concurrently(calls)
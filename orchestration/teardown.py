@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Parallel teardown of a topology spec (the format of topology.py).
+
+The resources are removed in reverse-dependency tiers: first the containers
+nothing depends on (e.g. the UE), then the containers they depended on (gNB,
+then the core functions, then the database), then the routers, the networks
+created by the spec and finally the leases. Everything within a tier is
+removed concurrently, and removal of a container tier is awaited with one
+polling loop over all its containers instead of one
+wait_until_container_removed call per container.
+
+Usage:
+    python teardown.py topologies/oai_core.json [--keep-leases] [--poll 2] [--timeout 600]
+    python teardown.py topologies/oai_core.json --fake --scale 0.05
+
+With --fake the topology is first created on the fake testbed, then torn down.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import sys
+import time
+
+from loguru import logger
+
+from graph import print_timings
+from inventory import Inventory
+from topology import Topology, load_spec, lease_name, make_backend
+
+# Status of a container whose poll failed; truthy, so it stays pending.
+POLL_FAILED = object()
+
+
+def container_tiers(containers):
+    """
+    Group the containers of a spec into removal tiers. A container's tier is one
+    more than the highest tier of the containers depending on it, so every
+    container is removed after everything that depends on it.
+    """
+    names = [c["name"] for c in containers]
+    dependents = {name: [] for name in names}
+    for c in containers:
+        for dep in c.get("depends_on", []):
+            dep = dep.split(":", 1)[1] if dep.startswith("container:") else dep
+            if dep in dependents:
+                dependents[dep].append(c["name"])
+
+    level = {}
+
+    def tier_of(name, visiting=()):
+        if name not in level:
+            if name in visiting:
+                raise ValueError(f"dependency cycle through {name}")
+            level[name] = 1 + max((tier_of(d, visiting + (name,)) for d in dependents[name]), default=-1)
+        return level[name]
+
+    tiers = {}
+    for name in names:
+        tiers.setdefault(tier_of(name), []).append(name)
+    return [tiers[i] for i in sorted(tiers)]
+
+
+class Teardown:
+    """Removes the resources of a topology spec tier by tier."""
+
+    def __init__(self, spec, backend, concurrency=16, poll_interval=2.0, timeout=600, keep_leases=False,
+                 inventory=None):
+        self.spec = spec
+        self.backend = backend
+        self.inventory = inventory or Inventory(backend)
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.keep_leases = keep_leases
+        self.failures = {}
+
+    def tiers(self):
+        """List of (tier name, removal function, items), in removal order."""
+        tiers = [(f"containers-{i}", self.remove_containers, names)
+                 for i, names in enumerate(container_tiers(self.spec["containers"]), start=1)]
+        tiers.append(("routers", self.remove_routers, self.spec["routers"]))
+        tiers.append(("networks", self.remove_networks, self.spec["networks"]))
+        if not self.keep_leases:
+            tiers.append(("leases", self.remove_leases, self.spec["reservations"]))
+        return [tier for tier in tiers if tier[2]]
+
+    def guarded(self, key, func, *args):
+        """Run one removal; failures are recorded and the teardown continues."""
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f"{key}: {e}")
+            self.failures[key] = e
+            return None
+
+    # containers
+    def destroy_container(self, name):
+        if not self.backend.get_container_status(name):
+            logger.info(f"{name} does not exist.")
+            return None
+        self.backend.destroy_container(name)
+        return name
+
+    def poll_status(self, name):
+        """Status of a container, or POLL_FAILED if it could not be read (it is polled again)."""
+        try:
+            return self.backend.get_container_status(name)
+        except Exception as e:
+            logger.warning(f"container:{name}: status poll failed: {e}")
+            return POLL_FAILED
+
+    def wait_removed(self, names):
+        """Poll the status of all `names` each round until every container is gone."""
+        pending = list(names)
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            statuses = list(self.pool.map(self.poll_status, pending))
+            for name, status in zip(pending, statuses):
+                if not status:
+                    logger.success(f"{name} removed.")
+            pending = [name for name, status in zip(pending, statuses) if status]
+            if pending:
+                if time.monotonic() >= deadline:
+                    for name in pending:
+                        self.failures[f"container:{name}"] = TimeoutError(f"{name} not removed after {self.timeout}s")
+                    logger.error(f"not removed after {self.timeout}s: {', '.join(pending)}")
+                    return
+                time.sleep(self.poll_interval)
+
+    def remove_containers(self, names):
+        destroyed = self.pool.map(lambda name: self.guarded(f"container:{name}", self.destroy_container, name), names)
+        self.wait_removed([name for name in destroyed if name])
+
+    # routers, networks and leases
+    def remove_router(self, router):
+        name = router["name"]
+        try:
+            existing = self.backend.get_router(name)
+        except Exception:
+            logger.info(f"could not find {name}.")
+            return
+        self.backend.remove_all_routes_from_router(existing["id"])
+        for subnet in router.get("subnets", []):
+            self.backend.remove_subnet_from_router(existing["id"], self.backend.get_network(subnet)["subnets"][0])
+        self.backend.delete_router(existing["id"])
+        logger.success(f"deleted the {name} router")
+
+    def remove_routers(self, routers):
+        list(self.pool.map(lambda r: self.guarded(f"router:{r['name']}", self.remove_router, r), routers))
+
+    def remove_network(self, network):
+        name = network["name"]
+        try:
+            existing = self.backend.get_network(name)
+        except Exception:
+            logger.info(f"could not find {name}.")
+            return
+        self.backend.delete_network(existing["id"])
+        logger.success(f"deleted the {name}")
+
+    def remove_networks(self, networks):
+        list(self.pool.map(lambda n: self.guarded(f"network:{n['name']}", self.remove_network, n), networks))
+
+    def remove_lease(self, reservation):
+        lease = self.inventory.worker_lease(reservation["name"])
+        if not lease:
+            logger.info(f"{lease_name(reservation['name'])} does not exist.")
+            return
+        self.backend.unreserve_byid(lease["id"])
+        self.inventory.forget_lease(lease["name"])
+        logger.success(f"released {lease_name(reservation['name'])}")
+
+    def remove_leases(self, reservations):
+        list(self.pool.map(lambda r: self.guarded(f"reservation:{r['name']}", self.remove_lease, r), reservations))
+
+    def run(self):
+        """Tear everything down. Returns (timings, failures); timings maps tier -> (start, end)."""
+        timings = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.pool:
+            for name, remove, items in self.tiers():
+                label = f"{name} ({len(items)})"
+                logger.info(f"removing {label}")
+                start = time.perf_counter()
+                remove(items)
+                timings[label] = (start, time.perf_counter())
+        return timings, self.failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tear down an experiment topology described by a JSON spec.")
+    parser.add_argument("spec", help="topology spec file")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum number of concurrent removals")
+    parser.add_argument("--poll", type=float, default=2.0, help="seconds between container status polls")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for a container tier")
+    parser.add_argument("--keep-leases", action="store_true", help="do not release the reservations")
+    parser.add_argument("--fake", action="store_true", help="create the topology on the fake testbed, then remove it")
+    parser.add_argument("--scale", type=float, default=1.0, help="latency scale of the fake testbed")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec)
+    except Exception as e:
+        logger.error(f"Cannot read topology spec: {e}")
+        sys.exit(1)
+
+    backend = make_backend(spec, args.fake, args.scale)
+    poll, timeout = args.poll, args.timeout
+    inventory = Inventory(backend)
+    if args.fake:
+        _, _, failures = Topology(spec, backend, inventory).apply(args.concurrency)
+        if failures:
+            sys.exit(1)
+        poll, timeout = poll * args.scale, timeout * args.scale
+
+    teardown = Teardown(spec, backend, args.concurrency, poll, timeout, args.keep_leases, inventory)
+    t0 = time.perf_counter()
+    timings, failures = teardown.run()
+    print_timings(timings, t0, time.perf_counter() - t0, title="Teardown tiers")
+    if failures:
+        logger.error(f"{len(failures)} removals failed: {', '.join(failures)}")
+        sys.exit(1)
+    logger.info("stopped and removed everything")
+
+
+if __name__ == "__main__":
+    main()
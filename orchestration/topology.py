@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Declarative topology engine.
+
+A topology spec (JSON) lists the reservations, networks, routers and
+containers of an experiment. apply() turns it into a dependency graph and runs
+it with graph.run_graph, so independent reservations and containers are
+created, and awaited, concurrently instead of one create_container /
+wait_for_active pair after the other.
+
+Spec format (see topologies/ for complete examples):
+
+    {
+      "reservations": [
+        {"type": "device", "name": "worker-07", "duration": {"days": 1, "hours": 0}},
+        {"type": "network", "name": "adv-02", "net_name": "adv-02", "segment_id": "131", ...},
+        {"type": "network", "name": "ep5g", "net_name": "ep5g-vip", "segment": "rj45", ...}
+      ],
+      "networks": [
+        {"name": "5gcn-net", "subnet": {"cidr": "192.168.70.128/26", "gateway": null}}
+      ],
+      "routers": [
+        {"name": "edge-router", "external": "public", "subnets": ["edge-net", "ep5g-vip-net"],
+         "routes": [{"cidr": "172.16.0.0/16", "nexthop": "10.30.111.10"}]}
+      ],
+      "containers": [
+        {"name": "ct-server-node", "image": "samiemostafavi/perf-meas", "worker": "worker-07",
+         "environment": {"SERVER_DIR": "/tmp/"},
+         "nets": [{"network": "serverpublic", "ip": "public"},
+                  {"network": "edge-net", "ip": "10.70.70.210/24", "routes": "172.16.0.0/16-10.70.70.1",
+                   "interface": "ens1"}],
+         "labels": {"capabilities.privileged": "true"},
+         "depends_on": []}
+      ]
+    }
+
+A network reservation with net_name X provides the network "X-net", and
+"segment" is resolved to a segment_id with get_segment_ids. For every entry of
+a container's "nets" the networks.N.interface/ip/gateway/routes labels are
+generated: "ip": "public" takes a free public IP (with the /27 prefix and the
+public gateway), and a missing "interface" takes a free interface of the
+worker, optionally of a given "speed". Networks, routers and containers that
+already exist are reused.
+
+Usage:
+    python topology.py topologies/crosstraffic.json [--fake [--scale 0.01]] [--concurrency 16]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from graph import run_graph, print_timings
+from inventory import Inventory, lease_name
+
+PUBLIC_PREFIX = "/27"
+PUBLIC_GATEWAY = "130.237.11.97"
+
+
+def reservation_network(reservation):
+    """Name of the network provided by a network reservation, None for devices."""
+    if reservation["type"] != "network":
+        return None
+    return reservation.get("net_name", reservation["name"]) + "-net"
+
+
+def load_spec(path):
+    with open(path, "r") as f:
+        spec = json.load(f)
+    for key in ("reservations", "networks", "routers", "containers"):
+        spec.setdefault(key, [])
+    return spec
+
+
+class Topology:
+    """Builds and runs the creation graph of a topology spec."""
+
+    def __init__(self, spec, backend, inventory=None):
+        self.spec = spec
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.networks = {}
+        claimed = {}
+        for c in spec["containers"]:
+            for net in c.get("nets", []):
+                if "interface" in net:
+                    claimed.setdefault(c["worker"], set()).add(net["interface"])
+        self.inventory = inventory or Inventory(backend)
+        for worker, interfaces in claimed.items():
+            self.inventory.claimed.setdefault(worker, set()).update(interfaces)
+
+    # graph construction
+    def steps(self):
+        """The creation graph: dict node -> (func, dependencies)."""
+        steps = {}
+        provided = {}                         # network name -> node that makes it available
+        for r in self.spec["reservations"]:
+            node = f"reservation:{r['name']}"
+            steps[node] = (lambda r=r: self.reserve(r), [])
+            if reservation_network(r):
+                provided[reservation_network(r)] = node
+        for n in self.spec["networks"]:
+            node = f"network:{n['name']}"
+            steps[node] = (lambda n=n: self.create_network(n), [])
+            provided[n["name"]] = node
+        for r in self.spec["routers"]:
+            deps = [provided[s] for s in r.get("subnets", []) if s in provided]
+            steps[f"router:{r['name']}"] = (lambda r=r: self.create_router(r), deps)
+        for c in self.spec["containers"]:
+            deps = [f"reservation:{c['worker']}"]
+            deps += [provided[net["network"]] for net in c.get("nets", []) if net["network"] in provided]
+            deps += [d if ":" in d else f"container:{d}" for d in c.get("depends_on", [])]
+            steps[f"container:{c['name']}"] = (lambda c=c: self.create_container(c), deps)
+        return steps
+
+    # steps
+    def reserve(self, reservation):
+        name = reservation["name"]
+        lease = self.inventory.worker_lease(name)
+        if lease:
+            logger.info(f"{lease_name(name)} already exists.")
+        else:
+            request = {k: v for k, v in reservation.items() if k != "segment"}
+            if "segment" in reservation:
+                request["segment_id"] = self.inventory.segment_id(name, reservation["segment"])
+            lease = self.backend.reserve(request)
+            self.inventory.record_lease(lease)
+            logger.success(f"reserved {name}.")
+        return lease
+
+    def network(self, name):
+        """Look up a network by name, once."""
+        with self.lock:
+            if name in self.networks:
+                return self.networks[name]
+        net = self.backend.get_network(name)
+        with self.lock:
+            self.networks[name] = net
+        return net
+
+    def reservation_id(self, name):
+        return self.inventory.reservation_id(name)
+
+    def create_network(self, network):
+        name = network["name"]
+        try:
+            net = self.backend.get_network(name)
+            logger.info(f"{name} already exists.")
+        except Exception:
+            net = self.backend.create_network(name)
+            subnet = network.get("subnet")
+            if subnet:
+                created = self.backend.create_subnet(
+                    subnet.get("name", name + "-subnet"), net["id"], subnet["cidr"],
+                    gateway_ip=subnet.get("gateway"), enable_dhcp=subnet.get("dhcp", False),
+                )
+                net = dict(net, subnets=[created["id"]])
+            logger.success(f"{name} is created.")
+        with self.lock:
+            self.networks[name] = net
+        return net
+
+    def create_router(self, router):
+        name = router["name"]
+        try:
+            existing = self.backend.get_router(name)
+            logger.info(f"{name} already exists.")
+            return existing
+        except Exception:
+            pass
+        created = self.backend.create_router(name, router.get("external", "public"))
+        for subnet in router.get("subnets", []):
+            self.backend.add_subnet_to_router(created["id"], self.network(subnet)["subnets"][0])
+        for route in router.get("routes", []):
+            self.backend.add_route_to_router(created["id"], route["cidr"], route["nexthop"])
+        logger.success(f"{name} router is created.")
+        return created
+
+    def container_args(self, container):
+        """
+        Keyword arguments of create_container, with the networks.N.* labels filled in,
+        and the interfaces and public IPs allocated for it (released again on failure).
+        """
+        nets, labels, public_ips = [], {}, []
+        container_nets = container.get("nets", [])
+        auto = [net for net in container_nets if not net.get("interface")]
+        interfaces = self.inventory.allocate_interfaces(container["worker"], [net.get("speed") for net in auto])
+        allocated = iter(interfaces)
+        try:
+            for i, net in enumerate(container_nets, start=1):
+                nets.append({"network": self.network(net["network"])["id"]})
+                prefix = f"networks.{i}."
+                labels[prefix + "interface"] = net.get("interface") or next(allocated)
+                ip = net.get("ip")
+                if ip == "public":
+                    public_ips.append(self.inventory.allocate_public_ip())
+                    labels[prefix + "ip"] = public_ips[-1] + PUBLIC_PREFIX
+                    labels[prefix + "gateway"] = net.get("gateway", PUBLIC_GATEWAY)
+                elif ip:
+                    labels[prefix + "ip"] = ip
+                if ip != "public" and net.get("gateway"):
+                    labels[prefix + "gateway"] = net["gateway"]
+                if net.get("routes"):
+                    labels[prefix + "routes"] = net["routes"]
+            reservation_id = self.reservation_id(container["worker"])
+        except Exception:
+            self.release(container["worker"], interfaces, public_ips)
+            raise
+        labels.update(container.get("labels", {}))
+        args = {
+            "name": container["name"],
+            "image": container["image"],
+            "reservation_id": reservation_id,
+            "environment": container.get("environment", {}),
+            "mounts": container.get("mounts", []),
+            "nets": nets,
+            "labels": labels,
+        }
+        return args, interfaces, public_ips
+
+    def release(self, worker, interfaces, public_ips):
+        """Return the interfaces and public IPs of a container that could not be created to the inventory."""
+        self.inventory.release_interfaces(worker, interfaces)
+        for ip in public_ips:
+            self.inventory.release_public_ip(ip)
+
+    def create_container(self, container):
+        name = container["name"]
+        if self.backend.get_container_status(name):
+            logger.info(f"{name} already exists.")
+            return {"name": name, "existing": True}
+        args, interfaces, public_ips = self.container_args(container)
+        public_ip = public_ips[-1] if public_ips else None
+        start = time.perf_counter()
+        try:
+            self.backend.create_container(**args)
+            created = time.perf_counter()
+            self.backend.wait_for_active(name)
+        except Exception:
+            self.release(container["worker"], interfaces, public_ips)
+            raise
+        active = time.perf_counter()
+        reachable = f", reachable at {public_ip}" if public_ip else ""
+        logger.success(f"created {name} container{reachable} "
+                       f"(create {created - start:.1f}s, boot {active - created:.1f}s).")
+        return {"name": name, "public_ip": public_ip, "labels": args["labels"],
+                "create_s": created - start, "boot_s": active - created}
+
+    def apply(self, concurrency=16):
+        """Create the whole topology. Returns (timings, results, failures) of run_graph."""
+        self.inventory.prefetch(sorted({c["worker"] for c in self.spec["containers"]}))
+        return run_graph(self.steps(), concurrency)
+
+
+def external_networks(spec):
+    """Networks the spec uses but neither reserves nor creates (e.g. edge-net)."""
+    own = {reservation_network(r) for r in spec["reservations"]} | {n["name"] for n in spec["networks"]}
+    used = {net["network"] for c in spec["containers"] for net in c.get("nets", [])}
+    used |= {s for r in spec["routers"] for s in r.get("subnets", [])}
+    return sorted(used - own)
+
+
+def make_backend(spec, fake=False, scale=1.0):
+    if fake:
+        from fake_chi import FakeChi
+        return FakeChi(scale=scale, networks=external_networks(spec))
+    from backend import ChiBackend
+    return ChiBackend()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create an experiment topology from a JSON spec.")
+    parser.add_argument("spec", help="topology spec file")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum number of concurrent steps")
+    parser.add_argument("--fake", action="store_true", help="run against the local fake testbed")
+    parser.add_argument("--scale", type=float, default=1.0, help="latency scale of the fake testbed")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec)
+    except Exception as e:
+        logger.error(f"Cannot read topology spec: {e}")
+        sys.exit(1)
+
+    topology = Topology(spec, make_backend(spec, args.fake, args.scale))
+    t0 = time.perf_counter()
+    timings, results, failures = topology.apply(args.concurrency)
+    print_timings(timings, t0, time.perf_counter() - t0)
+    if failures:
+        logger.error(f"{len(failures)} steps failed: {', '.join(failures)}")
+        sys.exit(1)
+    logger.success("topology created.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Streaming analysis of latency and throughput measurements.
+
+Measurement files are read in chunks of columns (NumPy arrays), so runs of
+100M+ samples are processed with bounded memory. Every statistic is computed
+with vectorized NumPy operations on whole chunks and merged across chunks:
+
+  - count, loss (NaN samples), mean, std, min, max
+  - quantiles from a log-spaced histogram (relative error below 0.25 %), with
+    exact values for the tails from the k smallest/largest samples
+  - CDF (from the histogram)
+  - inter-arrival statistics of the sample timestamps
+  - per-window aggregates (count, mean, min, max, optional quantiles)
+
+Supported inputs (format taken from the file name):
+
+  *.csv / *.txt      delimited text with a header row (or one value per line)
+  *.parquet          Parquet, read in row batches (needs pyarrow)
+  <dir>/meta.json    a columnar store written by to_columns(): one raw
+                     float64 file per column, memory-mapped
+  *.json             irtt client output (round_trips) or iperf3 -J output
+
+Convert a large text or JSON result once to the columnar store, then analyze
+that (memory-mapped, several times faster than parsing text):
+
+    python latency_analysis.py convert run.csv run.cols
+    python latency_analysis.py analyze run.cols --value rtt --time t --window 1 --output run-summary
+
+Delays are expected in milliseconds and timestamps in seconds; irtt
+nanoseconds are converted on load.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+CHUNK = 1 << 20                 # rows per chunk
+TAIL_SAMPLES = 10000            # k smallest/largest samples kept for exact tail quantiles
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999, 0.9999, 0.99999)
+
+
+# ----------------------------------------------------------------------------
+# Readers: each yields dicts column name -> float64 array of at most `chunk` rows
+# ----------------------------------------------------------------------------
+
+def iter_text(path, columns=None, chunk=CHUNK, delimiter=None):
+    """Chunks of a delimited text file with a header row, or of a file with one number per line."""
+    with open(path, "r") as f:
+        first = f.readline()
+        if delimiter is None:
+            delimiter = "," if "," in first else None
+        fields = first.strip().split(delimiter)
+        try:
+            [float(x) for x in fields]
+            header, pending = [f"c{i}" for i in range(len(fields))], [first]
+        except ValueError:
+            header, pending = [h.strip() for h in fields], []
+        wanted = [header.index(c) for c in columns] if columns else list(range(len(header)))
+        names = [header[i] for i in wanted]
+        lines = itertools.chain(pending, f)
+        while True:
+            block = list(itertools.islice(lines, chunk))
+            if not block:
+                return
+            data = np.loadtxt(block, delimiter=delimiter, usecols=wanted, ndmin=2, dtype=np.float64)
+            yield {name: data[:, i] for i, name in enumerate(names)}
+
+
+def iter_parquet(path, columns=None, chunk=CHUNK):
+    """Chunks of a Parquet file, one row batch at a time."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Reading Parquet files needs pyarrow (pip install pyarrow).")
+        sys.exit(1)
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk, columns=columns):
+        yield {name: batch.column(i).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+               for i, name in enumerate(batch.schema.names)}
+
+
+def iter_columns(path, columns=None, chunk=CHUNK):
+    """Chunks of a columnar store written by to_columns(); the column files are memory-mapped."""
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    names = columns or meta["columns"]
+    maps = {name: np.memmap(os.path.join(path, name + ".f64"), dtype=np.float64, mode="r", shape=(meta["rows"],))
+            for name in names}
+    for start in range(0, meta["rows"], chunk):
+        yield {name: np.asarray(m[start:start + chunk]) for name, m in maps.items()}
+
+
+def load_irtt(result):
+    """Columns of an irtt client JSON result: send time (s), rtt/send/receive delay (ms); NaN for lost packets."""
+    trips = result.get("round_trips", [])
+    n = len(trips)
+    out = {name: np.full(n, np.nan) for name in ("t", "rtt", "send_delay", "receive_delay")}
+    for i, trip in enumerate(trips):
+        wall = trip.get("timestamps", {}).get("client", {}).get("send", {}).get("wall")
+        if wall is not None:
+            out["t"][i] = wall / 1e9
+        delay = trip.get("delay", {})
+        for key, name in (("rtt", "rtt"), ("send", "send_delay"), ("receive", "receive_delay")):
+            if key in delay:
+                out[name][i] = delay[key] / 1e6
+    return out
+
+
+def load_iperf3(result):
+    """Per-interval columns of an iperf3 -J result: interval start (s), throughput (Mbit/s), packets."""
+    sums = [interval.get("sum", {}) for interval in result.get("intervals", [])]
+    return {
+        "t": np.array([s.get("start", np.nan) for s in sums], dtype=np.float64),
+        "mbps": np.array([s.get("bits_per_second", np.nan) / 1e6 for s in sums], dtype=np.float64),
+        "packets": np.array([s.get("packets", np.nan) for s in sums], dtype=np.float64),
+    }
+
+
+def iter_json(path, columns=None, chunk=CHUNK):
+    """Chunks of an irtt or iperf3 JSON result. These files are parsed whole; convert large ones once."""
+    with open(path, "r") as f:
+        result = json.load(f)
+    data = load_irtt(result) if "round_trips" in result else load_iperf3(result)
+    if columns:
+        data = {name: data[name] for name in columns}
+    rows = len(next(iter(data.values()))) if data else 0
+    for start in range(0, rows, chunk):
+        yield {name: values[start:start + chunk] for name, values in data.items()}
+
+
+def iter_chunks(path, columns=None, chunk=CHUNK):
+    """Chunks of any supported input, chosen by its name."""
+    if os.path.isdir(path):
+        return iter_columns(path, columns, chunk)
+    if path.endswith(".parquet"):
+        return iter_parquet(path, columns, chunk)
+    if path.endswith(".json"):
+        return iter_json(path, columns, chunk)
+    return iter_text(path, columns, chunk)
+
+
+def to_columns(chunks, path):
+    """Write chunks to a columnar store (one raw float64 file per column plus meta.json). Returns the row count."""
+    os.makedirs(path, exist_ok=True)
+    files, rows = {}, 0
+    try:
+        for data in chunks:
+            for name, values in data.items():
+                if name not in files:
+                    files[name] = open(os.path.join(path, name + ".f64"), "wb")
+                np.ascontiguousarray(values, dtype=np.float64).tofile(files[name])
+            rows += len(next(iter(data.values())))
+    finally:
+        for f in files.values():
+            f.close()
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"columns": list(files), "rows": rows, "dtype": "float64"}, f)
+    return rows
+
+
+def to_parquet(chunks, path):
+    """Write chunks to a Parquet file (needs pyarrow). Returns the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Writing Parquet files needs pyarrow (pip install pyarrow).")
+        sys.exit(1)
+    writer, rows = None, 0
+    try:
+        for data in chunks:
+            table = pa.table(data)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+# ----------------------------------------------------------------------------
+# Accumulators
+# ----------------------------------------------------------------------------
+
+class LogHistogram:
+    """Fixed log-spaced bins from `lo` to `hi` with `per_decade` bins per decade, plus under/overflow bins."""
+
+    def __init__(self, lo=1e-3, hi=1e6, per_decade=1000):
+        self.lo, self.hi, self.per_decade = lo, hi, per_decade
+        self.nbins = int(round(np.log10(hi / lo) * per_decade))
+        self.counts = np.zeros(self.nbins + 2, dtype=np.int64)      # [underflow, bins..., overflow]
+
+    def index(self, values):
+        idx = np.floor(np.log10(np.maximum(values, self.lo * 1e-3) / self.lo) * self.per_decade).astype(np.int64) + 1
+        return np.clip(idx, 0, self.nbins + 1)
+
+    def add(self, values):
+        self.counts += np.bincount(self.index(values), minlength=self.nbins + 2)
+
+    def edges(self):
+        return self.lo * 10.0 ** (np.arange(self.nbins + 1) / self.per_decade)
+
+    def midpoints(self):
+        e = self.edges()
+        return np.sqrt(e[:-1] * e[1:])
+
+    def quantiles(self, qs, total):
+        """Quantiles from the bins (geometric bin midpoints); NaN where they fall in under/overflow."""
+        cum = np.cumsum(self.counts)
+        ranks = np.ceil(np.asarray(qs) * total).astype(np.int64).clip(1, max(total, 1))
+        idx = np.searchsorted(cum, ranks)
+        mids = np.concatenate(([np.nan], self.midpoints(), [np.nan]))
+        return mids[idx]
+
+
+class SampleStats:
+    """Running statistics of one stream of samples; NaN samples are counted as lost."""
+
+    def __init__(self, tail=TAIL_SAMPLES, **histogram):
+        self.count = 0
+        self.lost = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.hist = LogHistogram(**histogram)
+        self.tail = tail
+        self.lowest = np.empty(0)
+        self.highest = np.empty(0)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = values[~np.isnan(values)]
+        self.lost += len(values) - len(valid)
+        if not len(valid):
+            return
+        self.count += len(valid)
+        self.sum += float(valid.sum())
+        self.sumsq += float(np.dot(valid, valid))
+        self.min = min(self.min, float(valid.min()))
+        self.max = max(self.max, float(valid.max()))
+        self.hist.add(valid)
+        self.lowest = self._keep(np.concatenate((self.lowest, valid)), smallest=True)
+        self.highest = self._keep(np.concatenate((self.highest, valid)), smallest=False)
+
+    def _keep(self, values, smallest):
+        if len(values) <= self.tail:
+            return values
+        if smallest:
+            return np.partition(values, self.tail - 1)[:self.tail]
+        return np.partition(values, len(values) - self.tail)[-self.tail:]
+
+    def quantiles(self, qs):
+        """Nearest-rank quantiles: exact in the tails kept, from the histogram elsewhere."""
+        qs = np.asarray(qs, dtype=np.float64)
+        out = self.hist.quantiles(qs, self.count)
+        if not self.count:
+            return np.full(len(qs), np.nan)
+        ranks = np.ceil(qs * self.count).astype(np.int64).clip(1, self.count)      # 1-based
+        lowest, highest = np.sort(self.lowest), np.sort(self.highest)
+        low = ranks <= len(lowest)
+        out[low] = lowest[ranks[low] - 1]
+        from_top = self.count - ranks                                              # 0 = the maximum
+        high = from_top < len(highest)
+        out[high] = highest[len(highest) - 1 - from_top[high]]
+        return out
+
+    def cdf(self, points=1000):
+        """(x, F(x)) at up to `points` histogram edges, for plotting."""
+        if not self.count:
+            return np.empty(0), np.empty(0)
+        cum = np.cumsum(self.hist.counts[1:-1]) + self.hist.counts[0]
+        x = self.hist.edges()[1:]
+        used = np.flatnonzero(self.hist.counts[1:-1])
+        x, cum = x[used[0]:used[-1] + 1], cum[used[0]:used[-1] + 1]
+        step = max(1, len(x) // points)
+        return x[::step], cum[::step] / self.count
+
+    def summary(self, qs=DEFAULT_QUANTILES):
+        mean = self.sum / self.count if self.count else np.nan
+        var = self.sumsq / self.count - mean * mean if self.count else np.nan
+        total = self.count + self.lost
+        result = {
+            "count": self.count, "lost": self.lost,
+            "loss_ratio": self.lost / total if total else np.nan,
+            "mean": mean, "std": float(np.sqrt(max(var, 0.0))) if self.count else np.nan,
+            "min": self.min if self.count else np.nan, "max": self.max if self.count else np.nan,
+        }
+        result.update({f"p{q * 100:g}": float(v) for q, v in zip(qs, self.quantiles(qs))})
+        return result
+
+
+class InterArrival:
+    """Statistics of the gaps (ms) between consecutive timestamps (s), across chunk boundaries."""
+
+    def __init__(self):
+        self.stats = SampleStats(lo=1e-4)
+        self.last = None
+
+    def add(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        t = t[~np.isnan(t)]
+        if not len(t):
+            return
+        if self.last is not None:
+            t = np.concatenate(([self.last], t))
+        self.last = t[-1]
+        self.stats.add(np.diff(t) * 1e3)
+
+
+class WindowStats:
+    """
+    Per-window aggregates of samples over fixed time windows (seconds from the
+    first timestamp): count, lost, mean, min, max and, if `quantiles` are given,
+    quantiles from a coarse per-window histogram (100 bins per decade).
+
+    The histograms are sparse: only the occupied (window, bin) pairs are kept,
+    so memory grows with the number of windows times the bins each one uses
+    (typically a few dozen), not with all 902 bins of every window.
+
+    Timestamps are expected in time order: the first timestamp seen starts the
+    first window, and later samples before it are counted in the first window
+    (`early` counts them).
+    """
+
+    def __init__(self, window, quantiles=()):
+        self.window = window
+        self.quantiles = tuple(quantiles)
+        self.t0 = None
+        self.early = 0
+        self.count = np.zeros(0, dtype=np.int64)
+        self.lost = np.zeros(0, dtype=np.int64)
+        self.sum = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.hist = LogHistogram(per_decade=100) if quantiles else None
+        # Sorted keys window * (nbins + 2) + bin and their counts, plus the chunks not merged yet.
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending = []
+
+    def _grow(self, n):
+        if n <= len(self.count):
+            return
+        extra = max(n, 2 * len(self.count)) - len(self.count)
+        self.count = np.concatenate((self.count, np.zeros(extra, dtype=np.int64)))
+        self.lost = np.concatenate((self.lost, np.zeros(extra, dtype=np.int64)))
+        self.sum = np.concatenate((self.sum, np.zeros(extra)))
+        self.min = np.concatenate((self.min, np.full(extra, np.inf)))
+        self.max = np.concatenate((self.max, np.full(extra, -np.inf)))
+
+    def _merge(self):
+        """Merge the pending (keys, counts) chunks into the sorted keys and counts."""
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [k for k, _ in self.pending])
+        counts = np.concatenate([self.counts] + [c for _, c in self.pending])
+        self.pending = []
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+    def add(self, t, values):
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(t)
+        t, values = t[keep], values[keep]
+        if not len(t):
+            return
+        if self.t0 is None:
+            self.t0 = float(t.min())
+        w = np.floor((t - self.t0) / self.window).astype(np.int64)
+        self.early += int(np.count_nonzero(w < 0))
+        w = np.maximum(w, 0)
+        self._grow(int(w.max()) + 1)
+        lost = np.isnan(values)
+        np.add.at(self.lost, w[lost], 1)
+        w, values = w[~lost], values[~lost]
+        self.count += np.bincount(w, minlength=len(self.count))
+        self.sum += np.bincount(w, weights=values, minlength=len(self.count))
+        np.minimum.at(self.min, w, values)
+        np.maximum.at(self.max, w, values)
+        if self.hist and len(w):
+            keys, counts = np.unique(w * (self.hist.nbins + 2) + self.hist.index(values), return_counts=True)
+            self.pending.append((keys, counts))
+            # Merging costs the size of everything kept; do it once the pending chunks are as large.
+            if sum(len(k) for k, _ in self.pending) >= len(self.keys):
+                self._merge()
+
+    def rows(self):
+        """One dict per window up to the last window with data."""
+        n = int(np.flatnonzero(self.count + self.lost)[-1]) + 1 if (self.count + self.lost).any() else 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum[:n] / self.count[:n]
+        if self.hist:
+            self._merge()
+            nb = self.hist.nbins + 2
+            cum = np.cumsum(self.counts)
+            # Samples of all windows before each window.
+            before = np.concatenate(([0], cum))[np.searchsorted(self.keys, np.arange(n) * nb)]
+            mids = np.concatenate(([np.nan], self.hist.midpoints(), [np.nan]))
+            qvals = {}
+            for q in self.quantiles:
+                ranks = before + np.ceil(q * self.count[:n]).clip(1).astype(np.int64)
+                idx = np.searchsorted(cum, ranks).clip(0, max(len(self.keys) - 1, 0))
+                bins = self.keys[idx] % nb if len(self.keys) else np.zeros(n, dtype=np.int64)
+                qvals[q] = np.where(self.count[:n] > 0, mids[bins], np.nan)
+        rows = []
+        for i in range(n):
+            has = self.count[i] > 0
+            row = {"window_start": self.t0 + i * self.window, "count": int(self.count[i]), "lost": int(self.lost[i]),
+                   "mean": float(mean[i]) if has else None,
+                   "min": float(self.min[i]) if has else None, "max": float(self.max[i]) if has else None}
+            if self.hist:
+                row.update({f"p{q * 100:g}": float(qvals[q][i]) if has else None for q in self.quantiles})
+            rows.append(row)
+        return rows
+
+
+def analyze(chunks, value, time_column=None, window=None, quantiles=DEFAULT_QUANTILES, window_quantiles=()):
+    """
+    Run all statistics over a stream of chunks. Returns (summary dict,
+    SampleStats of `value`, WindowStats or None).
+    """
+    stats = SampleStats()
+    gaps = InterArrival() if time_column else None
+    windows = WindowStats(window, window_quantiles) if time_column and window else None
+    for data in chunks:
+        stats.add(data[value])
+        if gaps:
+            gaps.add(data[time_column])
+        if windows:
+            windows.add(data[time_column], data[value])
+    summary = {value: stats.summary(quantiles)}
+    if gaps:
+        summary["inter_arrival_ms"] = gaps.stats.summary(quantiles)
+    return summary, stats, windows
+
+
+def write_rows(path, rows):
+    if not rows:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming latency/throughput analysis.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="convert a result to a columnar store (directory) or .parquet")
+    convert.add_argument("input")
+    convert.add_argument("output")
+    convert.add_argument("--columns", help="comma-separated columns to keep")
+
+    run = sub.add_parser("analyze", help="compute statistics of one column")
+    run.add_argument("input")
+    run.add_argument("--value", required=True, help="column with the samples (e.g. rtt)")
+    run.add_argument("--time", help="column with the timestamps in seconds (enables inter-arrival and windows)")
+    run.add_argument("--window", type=float, help="window length in seconds for per-window aggregates")
+    run.add_argument("--quantiles", default=",".join(str(q) for q in DEFAULT_QUANTILES))
+    run.add_argument("--window-quantiles", default="", help="quantiles per window, e.g. 0.5,0.99")
+    run.add_argument("--output", help="prefix for <prefix>.json, <prefix>-cdf.csv and <prefix>-windows.csv")
+    run.add_argument("--chunk", type=int, default=CHUNK, help="rows per chunk")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        columns = args.columns.split(",") if args.columns else None
+        chunks = iter_chunks(args.input, columns)
+        rows = to_parquet(chunks, args.output) if args.output.endswith(".parquet") else to_columns(chunks, args.output)
+        print(f"✔ Wrote {rows} rows to {args.output}")
+        return
+
+    columns = [args.value] + ([args.time] if args.time else [])
+    quantiles = [float(q) for q in args.quantiles.split(",") if q]
+    window_quantiles = [float(q) for q in args.window_quantiles.split(",") if q]
+    summary, stats, windows = analyze(iter_chunks(args.input, columns, args.chunk), args.value, args.time,
+                                      args.window, quantiles, window_quantiles)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        x, F = stats.cdf()
+        write_rows(args.output + "-cdf.csv", [{"x": float(a), "cdf": float(b)} for a, b in zip(x, F)])
+        if windows:
+            write_rows(args.output + "-windows.csv", windows.rows())
+        print(f"✔ Results written to {args.output}.json")
+    if windows and windows.early:
+        print(f"⚠ {windows.early} samples were earlier than the first timestamp and were counted in the first "
+              f"window; sort the input by --time for exact windows.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()